@@ -1,219 +1,120 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context
+import atexit
+import base64
+import hashlib
+import itertools
+import os
 import random
 import json
+import threading
 import time
+import urllib.parse
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Any
-
-app = Flask(__name__)
+from functools import lru_cache
+from typing import Optional, Callable, Dict, Iterator, List, Any, Sequence, Tuple, Union
 
+import code_templates
+import code_tokens
+import corpus
+import difficulty
+import idempotency
+import keystroke_analysis
+import markov
+import metrics
+import percentiles
+import practice
+import races
+import replay
+import startup
+from content_pool import pool_from_env
+from difficulty import DifficultyIndex
+from idempotency import RecentKeys
+from languages import LanguageData, registry_from_env
+from markov import MarkovModel
+from percentiles import PercentileIndex, SketchStore
+from practice import ProfileIndex, WordIndex
+from races import RaceHub
+from response_cache import cache_from_env, negotiate
+from word_pools import SENTENCE_ENDINGS, WordPool, generate_sentences, get_word_pool
+from leaderboard import LeaderboardIndex, PARTITION_FIELDS, WINDOWS
+from result_store import ResultStore, store_from_env
 
+app = Flask(__name__)
 
 
-COMMON_WORDS = [
-    'the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i', 'it', 'for', 'not', 'on', 'with', 
-    'he', 'as', 'you', 'do', 'at', 'this', 'but', 'his', 'by', 'from', 'they', 'we', 'say', 'her', 
-    'she', 'or', 'an', 'will', 'my', 'one', 'all', 'would', 'there', 'their', 'what', 'so', 'up', 
-    'out', 'if', 'about', 'who', 'get', 'which', 'go', 'me', 'when', 'make', 'can', 'like', 'time', 
-    'no', 'just', 'him', 'know', 'take', 'people', 'into', 'year', 'your', 'good', 'some', 'could', 
-    'them', 'see', 'other', 'than', 'then', 'now', 'look', 'only', 'come', 'its', 'over', 'think', 
-    'also', 'back', 'after', 'use', 'two', 'how', 'our', 'work', 'first', 'well', 'way', 'even', 
-    'new', 'want', 'because', 'any', 'these', 'give', 'day', 'most', 'us'
-]
-
-TECH_WORDS = [
-    'algorithm', 'database', 'function', 'variable', 'class', 'object', 'method', 'interface', 
-    'protocol', 'framework', 'library', 'module', 'package', 'dependency', 'configuration', 
-    'deployment', 'server', 'client', 'network', 'encryption', 'authentication', 'authorization', 
-    'session', 'cache', 'memory', 'processor', 'storage', 'bandwidth', 'latency', 'scalability', 
-    'performance', 'optimization', 'debugging', 'testing', 'integration', 'monitoring', 'logging', 
-    'analytics', 'machine', 'learning', 'artificial', 'intelligence', 'neural', 'data', 'science', 
-    'statistics', 'probability', 'cloud', 'virtualization', 'container', 'microservice', 'api', 
-    'rest', 'graphql', 'websocket', 'http', 'https'
-]
-
-PROGRAMMING_WORDS = [
-    'function', 'variable', 'constant', 'array', 'object', 'class', 'method', 'property', 
-    'parameter', 'argument', 'return', 'void', 'null', 'undefined', 'boolean', 'integer', 
-    'float', 'string', 'character', 'pointer', 'loop', 'condition', 'statement', 'expression', 
-    'operator', 'assignment', 'comparison', 'logical', 'bitwise', 'arithmetic', 'scope', 
-    'namespace', 'module', 'import', 'export', 'require', 'include', 'extend', 'implement', 
-    'inherit', 'override', 'overload', 'polymorphism', 'encapsulation', 'abstraction', 
-    'inheritance', 'composition', 'aggregation', 'association', 'dependency'
-]
 
 
 class ContentGenerator:
     """Handles content generation for typing tests"""
     
     @staticmethod
-    def generate_random_sentence(min_words: int = 5, max_words: int = 20, word_list: Optional[List[str]] = None) -> str:
-        """Generate a random sentence with proper capitalization and punctuation"""
+    def _as_pool(word_list: Optional[Union[List[str], WordPool]]) -> WordPool:
         if word_list is None:
-            word_list = COMMON_WORDS
+            return get_word_pool('common')
+        if isinstance(word_list, WordPool):
+            return word_list
+        return WordPool('custom', word_list)
+
+    @staticmethod
+    @metrics.timed('generate_random_sentence')
+    def generate_random_sentence(min_words: int = 5, max_words: int = 20,
+                                 word_list: Optional[Union[List[str], WordPool]] = None,
+                                 rng: Optional[random.Random] = None) -> str:
+        """Generate a random sentence with proper capitalization and punctuation"""
+        pool = ContentGenerator._as_pool(word_list)
+        rng = rng or random
         
-        word_count = random.randint(min_words, max_words)
-        words = random.choices(word_list, k=word_count)
+        word_count = rng.randint(min_words, max_words)
+        words = pool.sample(word_count, rng)
         words[0] = words[0].capitalize()
-        
-        sentence_types = [
-            lambda w: ' '.join(w) + '.',
-            lambda w: ' '.join(w) + '!',
-            lambda w: ' '.join(w) + '?',
-            lambda w: ' '.join(w) + '...',
-        ]
-        
-        sentence_generator = random.choice(sentence_types)
-        return sentence_generator(words)
+        return ' '.join(words) + rng.choice(SENTENCE_ENDINGS)
+
+    @staticmethod
+    @metrics.timed('generate_sentences')
+    def generate_sentences(n: int, min_words: int = 5, max_words: int = 20,
+                           word_list: Optional[Union[List[str], WordPool]] = None,
+                           rng: Optional[random.Random] = None) -> List[str]:
+        """Generate many sentences at once; all word indices are drawn in a single bulk call"""
+        return generate_sentences(n, min_words, max_words, ContentGenerator._as_pool(word_list), rng)
 
     @staticmethod
-    def generate_random_paragraph(num_sentences: int = 3, word_list: Optional[List[str]] = None) -> str:
+    @metrics.timed('generate_random_paragraph')
+    def generate_random_paragraph(num_sentences: int = 3, word_list: Optional[Union[List[str], WordPool]] = None,
+                                  rng: Optional[random.Random] = None) -> str:
         """Generate a random paragraph with multiple sentences"""
-        sentences = []
-        for _ in range(num_sentences):
-            sentences.append(ContentGenerator.generate_random_sentence(word_list=word_list))
-        return ' '.join(sentences)
+        return ' '.join(ContentGenerator.generate_sentences(num_sentences, word_list=word_list, rng=rng))
 
     @staticmethod
-    def generate_random_code_snippet(language: str = 'python', complexity: str = 'medium') -> str:
-        """Generate random code snippets with random variable names and logic"""
-        
-        var_names = [
-            'data', 'result', 'value', 'item', 'element', 'object', 'array', 'list', 'dict', 'set',
-            'count', 'index', 'position', 'length', 'size', 'total', 'sum', 'average', 'maximum', 'minimum',
-            'user', 'name', 'email', 'password', 'token', 'session', 'config', 'settings', 'options', 'params',
-            'temp', 'current', 'previous', 'next', 'first', 'last', 'start', 'end', 'begin', 'finish'
-        ]
-        
-        func_names = [
-            'process', 'calculate', 'compute', 'generate', 'create', 'build', 'construct', 'initialize', 'setup', 'configure',
-            'validate', 'check', 'verify', 'test', 'analyze', 'parse', 'format', 'transform', 'convert', 'extract',
-            'filter', 'sort', 'search', 'find', 'locate', 'get', 'fetch', 'retrieve', 'load', 'save'
-        ]
-        
-        if language == 'python':
-            templates = [
-                f'''def {random.choice(func_names)}({random.choice(var_names)}):
-    {random.choice(var_names)} = []
-    for {random.choice(var_names)} in {random.choice(var_names)}:
-        if {random.choice(var_names)} > 0:
-            {random.choice(var_names)}.append({random.choice(var_names)})
-    return {random.choice(var_names)}''',
-                
-                f'''class {random.choice(var_names).capitalize()}:
-    def __init__(self, {random.choice(var_names)}):
-        self.{random.choice(var_names)} = {random.choice(var_names)}
-    
-    def {random.choice(func_names)}(self):
-        return self.{random.choice(var_names)} * 2''',
-                
-                f'''{random.choice(var_names)} = {{}}
-for {random.choice(var_names)} in range(10):
-    {random.choice(var_names)}[{random.choice(var_names)}] = {random.choice(var_names)} * {random.choice(var_names)}''',
-                
-                f'''def {random.choice(func_names)}({random.choice(var_names)}, {random.choice(var_names)}):
-    try:
-        {random.choice(var_names)} = {random.choice(var_names)} / {random.choice(var_names)}
-        return {random.choice(var_names)}
-    except Exception as {random.choice(var_names)}:
-        return None'''
-            ]
-        
-        elif language == 'javascript':
-            templates = [
-                f'''const {random.choice(var_names)} = ({random.choice(var_names)}) => {{
-    const {random.choice(var_names)} = [];
-    for (let {random.choice(var_names)} = 0; {random.choice(var_names)} < {random.choice(var_names)}.length; {random.choice(var_names)}++) {{
-        {random.choice(var_names)}.push({random.choice(var_names)}[{random.choice(var_names)}]);
-    }}
-    return {random.choice(var_names)};
-}};''',
-                
-                f'''class {random.choice(var_names).capitalize()} {{
-    constructor({random.choice(var_names)}) {{
-        this.{random.choice(var_names)} = {random.choice(var_names)};
-    }}
-    
-    {random.choice(func_names)}() {{
-        return this.{random.choice(var_names)} * 2;
-    }}
-}}''',
-                
-                f'''const {random.choice(var_names)} = new Map();
-{random.choice(var_names)}.forEach(({random.choice(var_names)}, {random.choice(var_names)}) => {{
-    {random.choice(var_names)}.set({random.choice(var_names)}, {random.choice(var_names)});
-}});''',
-                
-                f'''async function {random.choice(func_names)}({random.choice(var_names)}) {{
-    try {{
-        const {random.choice(var_names)} = await fetch({random.choice(var_names)});
-        return await {random.choice(var_names)}.json();
-    }} catch ({random.choice(var_names)}) {{
-        console.error({random.choice(var_names)});
-        return null;
-    }}
-}}'''
-            ]
-        
-        elif language == 'java':
-            templates = [
-                f'''public class {random.choice(var_names).capitalize()} {{
-    private List<Integer> {random.choice(var_names)};
-    
-    public {random.choice(var_names).capitalize()}() {{
-        this.{random.choice(var_names)} = new ArrayList<>();
-    }}
-    
-    public void {random.choice(func_names)}(List<Integer> {random.choice(var_names)}) {{
-        for (Integer {random.choice(var_names)} : {random.choice(var_names)}) {{
-            if ({random.choice(var_names)} > 0) {{
-                this.{random.choice(var_names)}.add({random.choice(var_names)});
-            }}
-        }}
-    }}
-    
-    public List<Integer> get{random.choice(var_names).capitalize()}() {{
-        return new ArrayList<>(this.{random.choice(var_names)});
-    }}
-}}''',
-                
-                f'''public class {random.choice(var_names).capitalize()} {{
-    private String {random.choice(var_names)};
-    private int {random.choice(var_names)};
-    
-    public {random.choice(var_names).capitalize()}(String {random.choice(var_names)}) {{
-        this.{random.choice(var_names)} = {random.choice(var_names)};
-        this.{random.choice(var_names)} = 0;
-    }}
-    
-    public String {random.choice(func_names)}() {{
-        return this.{random.choice(var_names)} + " - " + this.{random.choice(var_names)};
-    }}
-}}''',
-                
-                f'''Map<String, Integer> {random.choice(var_names)} = new HashMap<>();
-for (int {random.choice(var_names)} = 0; {random.choice(var_names)} < 10; {random.choice(var_names)}++) {{
-    {random.choice(var_names)}.put("key" + {random.choice(var_names)}, {random.choice(var_names)} * 2);
-}}''',
-                
-                f'''public Optional<String> {random.choice(func_names)}(String {random.choice(var_names)}) {{
-    try {{
-        if ({random.choice(var_names)} != null && !{random.choice(var_names)}.isEmpty()) {{
-            return Optional.of({random.choice(var_names)}.toUpperCase());
-        }}
-        return Optional.empty();
-    }} catch (Exception {random.choice(var_names)}) {{
-        System.err.println("Error: " + {random.choice(var_names)}.getMessage());
-        return Optional.empty();
-    }}
-}}'''
-            ]
-        
-        else:
-            templates = [f'''def {random.choice(func_names)}({random.choice(var_names)}):
-    return {random.choice(var_names)} * 2''']
-        
-        return random.choice(templates)
+    @metrics.timed('generate_random_paragraphs')
+    def generate_random_paragraphs(count: int, num_sentences: int = 3,
+                                   word_list: Optional[Union[List[str], WordPool]] = None,
+                                   rng: Optional[random.Random] = None) -> List[str]:
+        """Generate several paragraphs in one pass, drawing all their sentences together"""
+        sentences = ContentGenerator.generate_sentences(count * num_sentences, word_list=word_list, rng=rng)
+        return [' '.join(sentences[i:i + num_sentences]) for i in range(0, len(sentences), num_sentences)]
+
+    @staticmethod
+    @metrics.timed('generate_natural_paragraphs')
+    def generate_natural_paragraphs(count: int, num_sentences: int, model: MarkovModel,
+                                    rng: Optional[random.Random] = None) -> List[str]:
+        """Generate paragraphs that read like the curated texts by walking a trained Markov model"""
+        sentences = model.generate_sentences(count * num_sentences, rng)
+        return [' '.join(sentences[i:i + num_sentences]) for i in range(0, len(sentences), num_sentences)]
+
+    @staticmethod
+    @metrics.timed('generate_practice_text')
+    def generate_practice_text(word_count: int, index: WordIndex, targets: List[Tuple[str, float]],
+                               rng: Optional[random.Random] = None) -> Tuple[str, List[str]]:
+        """Generate a drill of words containing the weak characters and bigrams; returns it with the targets used"""
+        words, used = index.practice_words(targets, word_count, rng)
+        return ' '.join(words), used
+
+    @staticmethod
+    @metrics.timed('generate_random_code_snippet')
+    def generate_random_code_snippet(language: str = 'python', complexity: Optional[str] = None,
+                                     rng: Optional[random.Random] = None) -> str:
+        """Generate random code snippets with random variable names and logic, from a difficulty band if given"""
+        return code_templates.generate_snippet(language, rng, complexity)
 
 
 
@@ -423,6 +324,7 @@ public class AsyncTaskProcessor {
     ]
 }
 
+# Built-in languages; further ones are discovered in data/languages and loaded on first use
 LANGUAGES = {
     'english': {
         'name': 'English',
@@ -430,142 +332,898 @@ LANGUAGES = {
     }
 }
 
-@app.route('/')
-def index():
-    """Main page route"""
-    return render_template('index.html')
+language_registry = registry_from_env(
+    {code: LanguageData(code, data['name'], data['texts']) for code, data in LANGUAGES.items()}
+)
 
+# Difficulty of the built-in snippets; other collections are scored as they load (see LanguageData, corpus.py)
+CODE_SNIPPET_DIFFICULTY = {
+    lang: DifficultyIndex.of(snippet['code'] for snippet in snippets) for lang, snippets in CODE_SNIPPETS.items()
+}
 
-@app.route('/api/text')
-def get_text():
-    """Get text based on various parameters"""
-    try:
-        content_type = request.args.get('type', 'text')
-        language = request.args.get('language', 'english')
-        category = request.args.get('category', 'tech')
-        difficulty = request.args.get('difficulty', 'medium')
-        random_mode = request.args.get('random', 'false').lower() == 'true'
-        duration = int(request.args.get('duration', 30)) if request.args.get('duration') else 30  # Default to 30 seconds
+CATEGORY_NAMES = {
+    'tech': 'Technology',
+    'science': 'Science',
+    'philosophy': 'Philosophy',
+}
+
+CODE_LANGUAGE_NAMES = {
+    'python': 'Python',
+    'javascript': 'JavaScript',
+    'java': 'Java',
+}
+
+# Length tiers: how much random content each duration bucket gets
+RANDOM_PARAGRAPHS_BY_BUCKET = {
+    60: 15,  # Increased from 8 to 15 for ~100+ words
+    30: 5,
+    15: 3,
+}
+
+RANDOM_SNIPPETS_BY_BUCKET = {
+    60: 3,
+    30: 2,
+    15: 1,
+}
+
+
+def duration_bucket(duration: int) -> int:
+    """Map a test duration onto the length tier used to size its text"""
+    if duration >= 60:  # 1 minute or more
+        return 60
+    if duration >= 30:  # 30 seconds
+        return 30
+    return 15  # 15 seconds or less
+
+
+def split_band(variant: str) -> Tuple[str, Optional[str]]:
+    """A pool variant and the difficulty band it carries as a '#<band>' suffix, if any"""
+    name, _, band = variant.partition('#')
+    return name, band or None
+
+
+def resolve_word_pool(word_key: str) -> WordPool:
+    """Pool for a word key: a registered pool name, or '<language>:<kind>' for a registry language's own words
+
+    A '#<band>' suffix narrows it to that difficulty band.
+    """
+    word_key, band = split_band(word_key)
+    language, _, kind = word_key.rpartition(':')
+    if language:
+        pool = language_registry.word_pool(language, kind) or get_word_pool(kind)
+    else:
+        pool = get_word_pool(word_key)
+    return pool.band(band)
+
+
+def generate_paragraph_texts(word_key: str, bucket: int, count: int = 1,
+                             rng: Optional[random.Random] = None) -> List[str]:
+    """Build random prose long enough that users don't run out of words for the bucket"""
+    return ContentGenerator.generate_random_paragraphs(count, RANDOM_PARAGRAPHS_BY_BUCKET[bucket],
+                                                       resolve_word_pool(word_key), rng)
+
+
+_markov_models: Dict[str, Optional[MarkovModel]] = {}
+_markov_lock = threading.Lock()
+
+
+def markov_sources(language: str) -> List[Union[str, Sequence[str]]]:
+    """Training sources for a language's Markov model: corpus file paths and in-memory passage lists"""
+    sources: List[Union[str, Sequence[str]]] = []
+    for category, _ in text_categories(language):
+        texts = corpus.get_corpus(language, category)
+        if texts is not None:
+            sources.append(texts.text_path)
+            continue
+        texts = language_registry.texts(language, category)
+        if texts:
+            sources.append(texts)
+    return sources
+
+
+def get_markov_model(language: str) -> Optional[MarkovModel]:
+    """The language's Markov model, loaded from disk (or trained) on first use; None without texts"""
+    if language not in language_registry:
+        return None
+    if language not in _markov_models:
+        with _markov_lock:
+            if language not in _markov_models:
+                sources = markov_sources(language)
+                _markov_models[language] = markov.load_or_train(language, sources) if sources else None
+    return _markov_models[language]
+
+
+def generate_markov_paragraphs(language: str, num_sentences: int, count: int = 1,
+                               rng: Optional[random.Random] = None) -> List[str]:
+    """Random prose in the style of a language's curated texts"""
+    model = get_markov_model(language)
+    if model is None:
+        raise ValueError(f'No texts to generate {language} prose from')
+    return ContentGenerator.generate_natural_paragraphs(count, num_sentences, model, rng)
+
+
+def generate_code_text(lang: str, bucket: int, rng: Optional[random.Random] = None) -> str:
+    """Build random code, with more snippets for longer durations; a '#<band>' suffix on lang picks the difficulty"""
+    lang, band = split_band(lang)
+    code_snippets = []
+    for _ in range(RANDOM_SNIPPETS_BY_BUCKET[bucket]):
+        code_snippets.append(ContentGenerator.generate_random_code_snippet(lang, band, rng))
+    return '\n\n'.join(code_snippets)
+
+
+# Random texts are pre-generated per (content_type, word list / code language, bucket)
+content_pool = pool_from_env()
+
+# Curated (non-random) responses are cached as encoded bytes per exact combination of passages
+response_cache = cache_from_env()
+
+race_hub = RaceHub()
+
+_result_store: Optional[ResultStore] = None
+
+
+def get_result_store() -> ResultStore:
+    """Open the result store on first use so cold starts don't touch the disk"""
+    global _result_store
+    if _result_store is None:
+        _result_store = store_from_env()
+    return _result_store
+
+
+_leaderboard_index: Optional[LeaderboardIndex] = None
+_leaderboard_lock = threading.Lock()
+
+
+def get_leaderboard_index() -> LeaderboardIndex:
+    """Build the top-K leaderboards from persisted results the first time they are needed"""
+    global _leaderboard_index
+    if _leaderboard_index is None:
+        with _leaderboard_lock:
+            if _leaderboard_index is None:
+                index = LeaderboardIndex(k=int(os.environ.get('TYPEXI_LEADERBOARD_SIZE', 100)))
+                index.rebuild(get_result_store().iter_results())
+                _leaderboard_index = index
+    return _leaderboard_index
+
+
+_practice_profiles: Optional[ProfileIndex] = None
+_practice_lock = threading.Lock()
+
+
+def get_practice_profiles() -> ProfileIndex:
+    """Build every user's error profile from persisted results the first time one is needed"""
+    global _practice_profiles
+    if _practice_profiles is None:
+        with _practice_lock:
+            if _practice_profiles is None:
+                profiles = ProfileIndex()
+                profiles.rebuild(result for result in get_result_store().iter_results() if not result.get('flags'))
+                _practice_profiles = profiles
+    return _practice_profiles
+
+
+_percentile_index: Optional[PercentileIndex] = None
+_percentile_lock = threading.Lock()
+
+
+def get_percentile_index() -> PercentileIndex:
+    """Load the shared percentile sketches (building them from persisted results the very first time)"""
+    global _percentile_index
+    if _percentile_index is None:
+        with _percentile_lock:
+            if _percentile_index is None:
+                store = get_result_store()
+                index = PercentileIndex(SketchStore(store.path),
+                                        sync_interval=float(os.environ.get('TYPEXI_PERCENTILE_SYNC', 5)))
+                index.open(lambda: (result for result in store.iter_results() if not result.get('flags')))
+                # Whatever arrived since the last background sync goes out when the worker exits
+                atexit.register(index.close)
+                _percentile_index = index
+    return _percentile_index
+
+
+_recent_keys: Optional[RecentKeys] = None
+_recent_keys_lock = threading.Lock()
+
+
+def get_recent_keys() -> RecentKeys:
+    """The recently saved idempotency keys, seeded with the newest stored ones the first time"""
+    global _recent_keys
+    if _recent_keys is None:
+        with _recent_keys_lock:
+            if _recent_keys is None:
+                keys = RecentKeys(capacity=int(os.environ.get('TYPEXI_IDEMPOTENCY_KEYS', 1_000_000)),
+                                  lru_size=int(os.environ.get('TYPEXI_IDEMPOTENCY_LRU', 10_000)))
+                keys.load(get_result_store().recent_keys(keys.lru_size))
+                _recent_keys = keys
+    return _recent_keys
+
+
+MAX_BATCH_TEXTS = 20
+
+# Seeded responses never change, so they are memoized as encoded bytes and cached downstream for a year
+SEEDED_CACHE_SIZE = int(os.environ.get('TYPEXI_SEEDED_CACHE_SIZE', 1024))
+SEEDED_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def encode_json(payload: Any) -> bytes:
+    """Canonical JSON encoding, so equal payloads are byte-identical"""
+    return json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def make_etag(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def cached_json_response(body: bytes, etag: str, cache_control: str) -> Response:
+    """Serve pre-encoded JSON with a strong ETag, answering matching conditional requests with 304"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+@lru_cache(maxsize=SEEDED_CACHE_SIZE)
+def seeded_text_body(params_key: tuple, count: Optional[int]) -> Tuple[bytes, str]:
+    """Encoded body and ETag for a seeded /api/text (count None) or /api/text/batch request"""
+    params = dict(params_key)
+    if count is None:
+        body = encode_json(build_text_payload(params))
+    else:
+        texts = build_text_payloads(params, count)
+        body = encode_json({'texts': texts, 'count': len(texts)})
+    return body, make_etag(body)
+
+
+def seeded_text_response(params: Dict[str, Any], count: Optional[int] = None) -> Response:
+    body, etag = seeded_text_body(tuple(sorted(params.items())), count)
+    return cached_json_response(body, etag, SEEDED_CACHE_CONTROL)
+
+
+def read_text_params(args) -> Dict[str, Any]:
+    """Parse the query parameters shared by the text endpoints"""
+    duration = int(args.get('duration', 30)) if args.get('duration') else 30  # Default to 30 seconds
+    return {
+        'content_type': args.get('type', 'text'),
+        'language': args.get('language', 'english'),
+        'category': args.get('category', 'tech'),
+        # None serves every difficulty; a band narrows curated and random texts to that third of the collection
+        'difficulty': difficulty.parse_band(args.get('difficulty')),
+        'code_language': args.get('code_language', 'python'),
+        'random': args.get('random', 'false').lower() == 'true',
+        # Random prose: independent words from a word list, or a Markov chain trained on the curated texts
+        'generator': 'markov' if args.get('generator') == 'markov' else 'words',
+        'continuous': args.get('continuous', 'false').lower() == 'true',
+        # Practice texts drill the user's most-missed keys; the user is the client's anonymous id
+        'practice': args.get('practice', 'false').lower() == 'true' and args.get('type') != 'code',
+        # Code texts can come with their token classes (see code_tokens) so the client needn't tokenize them
+        'tokens': args.get('tokens', 'false').lower() == 'true' and args.get('type') == 'code',
+        'user': args.get('user') or None,
+        'seed': args.get('seed') or None,
+        'duration': duration,
+        'bucket': duration_bucket(duration),
+    }
+
+
+def params_rng(params: Dict[str, Any]) -> Optional[random.Random]:
+    """A private generator for seeded requests; None means use the shared module-level one"""
+    return random.Random(params['seed']) if params['seed'] is not None else None
+
+
+def random_pool_key(params: Dict[str, Any]) -> tuple:
+    """Pool bucket for a random request: (content_type, word list / code language, duration bucket)
+
+    The difficulty band, when there is one, rides on the variant as a '#<band>' suffix.
+    Markov prose has no bands: its sentences follow the model, not a word list.
+    """
+    band = f"#{params['difficulty']}" if params['difficulty'] else ''
+    if params['content_type'] == 'code':
+        lang = params['code_language']
+        # Unknown languages all share the generator's fallback templates, so they share a bucket
+        return ('code', code_templates.resolve_language(lang) + band, params['bucket'])
+    if params['generator'] == 'markov':
+        language = params['language'] if params['language'] in language_registry else 'english'
+        return ('markov', language, params['bucket'])
+    kind = 'tech' if params['category'] == 'tech' else 'common'
+    if language_registry.has_words(params['language']):
+        kind = f"{params['language']}:{kind}"
+    return ('text', kind + band, params['bucket'])
+
+
+def pooled(key: tuple) -> bool:
+    """Whether a pool key is served from the content pool
+
+    Texts in a registry language's own words are generated on demand: a pool
+    bucket would keep refilling, and so reloading, a language after eviction.
+    """
+    return ':' not in key[1]
+
+
+def generate_random_texts(key: tuple, count: int, rng: Optional[random.Random] = None) -> List[str]:
+    """Generate `count` random texts for a pool key in one pass"""
+    content_type, variant, bucket = key
+    if content_type == 'code':
+        return [generate_code_text(variant, bucket, rng) for _ in range(count)]
+    if content_type == 'markov':
+        # Same sentence count as word-list prose, so the text lasts the bucket
+        return generate_markov_paragraphs(variant, RANDOM_PARAGRAPHS_BY_BUCKET[bucket], count, rng)
+    return generate_paragraph_texts(variant, bucket, count, rng)
+
+
+def random_text_payload(params: Dict[str, Any], text: str) -> Dict[str, Any]:
+    if params['content_type'] == 'code':
+        lang = params['code_language']
+        payload = {
+            'text': text,
+            'type': 'code',
+            'language': lang,
+            'description': f'Random {lang} code',
+            'random': True
+        }
+        if params['tokens']:
+            payload['tokens'] = code_tokens.token_runs([text], lang, memoize=False)
+        return payload
+    return {
+        'text': text,
+        'type': 'text',
+        'language': params['language'],
+        'category': params['category'],
+        'random': True,
+        'generator': params['generator'],
+    }
+
+
+CURATED_SNIPPETS_BY_BUCKET = {60: 3, 30: 2, 15: 1}
+CURATED_TEXTS_BY_BUCKET = {60: 5, 30: 2, 15: 1}  # Increased from 3 to 5 for 1 minute or more
+
+
+def curated_texts(language: str, category: str) -> Sequence[str]:
+    """Passages for a language and category
+
+    An installed on-disk corpus takes precedence, then the language's own texts,
+    then the built-in English collection for the category (KeyError if none).
+    """
+    texts = corpus.get_corpus(language, category)
+    if texts is None:
+        texts = language_registry.texts(language, category)
+    if texts is None:
+        texts = TEXT_COLLECTIONS[category]
+    return texts
+
+
+def curated_snippets(language: str, code_language: str) -> List[Dict[str, str]]:
+    """Curated snippets for a code language, preferring a version localized for the language"""
+    return language_registry.snippets(language, code_language) or CODE_SNIPPETS[code_language]
+
+
+def curated_text_difficulty(language: str, category: str) -> DifficultyIndex:
+    """Difficulty index of the passages curated_texts() serves for a language and category"""
+    texts = corpus.get_corpus(language, category)
+    if texts is not None:
+        return texts.difficulty
+    return language_registry.text_difficulty(language, category) or \
+        language_registry.text_difficulty('english', category) or DifficultyIndex.of(TEXT_COLLECTIONS[category])
+
+
+def curated_snippet_difficulty(language: str, code_language: str) -> DifficultyIndex:
+    """Difficulty index of the snippets curated_snippets() serves"""
+    return language_registry.snippet_difficulty(language, code_language) or CODE_SNIPPET_DIFFICULTY[code_language]
+
+
+def pick_curated(count: int, k: int, index: Optional[DifficultyIndex], band: Optional[str],
+                 rng: random.Random) -> Tuple[int, ...]:
+    """k distinct item positions out of count, from the difficulty band when there is one"""
+    if band is None:
+        return tuple(rng.sample(range(count), min(k, count)))
+    return index.sample(band, k, rng)
+
+
+def curated_selection(params: Dict[str, Any], rng: Optional[random.Random] = None) -> Tuple[Optional[tuple], Callable[[], Dict[str, Any]]]:
+    """Pick which curated texts or code snippets to serve, combining several for longer durations
+    
+    Returns a key naming the exact combination (there are only finitely many) and
+    a function that builds its payload, so callers can cache by combination. The
+    key is None for combinations that are not worth caching.
+    """
+    rng = rng or random
+    bucket = params['bucket']
+    band = params['difficulty']
     
-        if content_type == 'code':
-            lang = request.args.get('code_language', 'python')
+    if params['content_type'] == 'code':
+        lang = params['code_language']
+        localized = language_registry.snippets(params['language'], lang)
+        snippets = localized or CODE_SNIPPETS.get(lang)
+        if snippets:
+            # Select multiple snippets for longer durations
+            index = curated_snippet_difficulty(params['language'], lang) if band else None
+            indices = pick_curated(len(snippets), CURATED_SNIPPETS_BY_BUCKET[bucket], index, band, rng)
             
-            if random_mode:
-                # Generate longer code for longer durations
-                if duration >= 60:  # 1 minute or more
-                    num_snippets = 3
-                elif duration >= 30:  # 30 seconds
-                    num_snippets = 2
-                else:  # 15 seconds or less
-                    num_snippets = 1
-                
-                code_snippets = []
-                for _ in range(num_snippets):
-                    code_snippets.append(ContentGenerator.generate_random_code_snippet(lang, difficulty))
-                
-                code = '\n\n'.join(code_snippets)
-                return jsonify({
-                    'text': code,
+            def build() -> Dict[str, Any]:
+                payload = {
+                    'text': '\n\n'.join([snippets[i]['code'] for i in indices]),
                     'type': 'code',
                     'language': lang,
-                    'description': f'Random {lang} code',
-                    'random': True
-                })
-            else:
-                if lang in CODE_SNIPPETS:
-                    # Select multiple snippets for longer durations
-                    if duration >= 60:  # 1 minute or more
-                        selected_snippets = random.sample(CODE_SNIPPETS[lang], min(3, len(CODE_SNIPPETS[lang])))
-                    elif duration >= 30:  # 30 seconds
-                        selected_snippets = random.sample(CODE_SNIPPETS[lang], min(2, len(CODE_SNIPPETS[lang])))
-                    else:  # 15 seconds or less
-                        selected_snippets = [random.choice(CODE_SNIPPETS[lang])]
-                    
-                    code = '\n\n'.join([snippet['code'] for snippet in selected_snippets])
-                    return jsonify({
-                        'text': code,
-                        'type': 'code',
-                        'language': lang,
-                        'description': f'Multiple {lang} snippets',
-                        'random': False
-                    })
-                else:
-                    snippet = random.choice(CODE_SNIPPETS['python'])
-                    return jsonify({
-                        'text': snippet['code'],
-                        'type': 'code',
-                        'language': 'python',
-                        'description': snippet['description'],
-                        'random': False
-                    })
-
-        
-        if random_mode:
-            if category == 'tech':
-                word_list = TECH_WORDS + COMMON_WORDS
-            else:
-                word_list = COMMON_WORDS
-            
-            # Generate longer text for longer durations to ensure users don't run out of words
-            if duration >= 60:  # 1 minute or more
-                num_paragraphs = 15  # Increased from 8 to 15 for ~100+ words
-            elif duration >= 30:  # 30 seconds
-                num_paragraphs = 5
-            else:  # 15 seconds or less
-                num_paragraphs = 3
-            
-            text = ContentGenerator.generate_random_paragraph(num_paragraphs, word_list)
-            
-            return jsonify({
-                'text': text,
-                'type': 'text',
-                'language': language,
-                'category': category,
-                'random': True
-            })
+                    'description': f'Multiple {lang} snippets',
+                    'random': False
+                }
+                if params['tokens']:
+                    payload['tokens'] = code_tokens.token_runs([snippets[i]['code'] for i in indices], lang)
+                return payload
+            return ('code', params['language'] if localized else None, lang, indices, params['tokens']), build
         
-        # For non-random mode, combine multiple texts to ensure sufficient length
-        if language in LANGUAGES and category in LANGUAGES[language]['texts']:
-            texts = LANGUAGES[language]['texts'][category]
+        if band:
+            index = CODE_SNIPPET_DIFFICULTY['python'].sample(band, 1, rng)[0]
         else:
-            texts = TEXT_COLLECTIONS[category]
+            index = rng.randrange(len(CODE_SNIPPETS['python']))
         
-        # Combine multiple texts for longer durations
-        if duration >= 60:  # 1 minute or more
-            selected_texts = random.sample(texts, min(5, len(texts)))  # Increased from 3 to 5
-            text = ' '.join(selected_texts)
-        elif duration >= 30:  # 30 seconds
-            selected_texts = random.sample(texts, min(2, len(texts)))
-            text = ' '.join(selected_texts)
-        else:  # 15 seconds or less
-            text = random.choice(texts)
-        
-        return jsonify({
-            'text': text,
+        def build() -> Dict[str, Any]:
+            snippet = CODE_SNIPPETS['python'][index]
+            payload = {
+                'text': snippet['code'],
+                'type': 'code',
+                'language': 'python',
+                'description': snippet['description'],
+                'random': False
+            }
+            if params['tokens']:
+                payload['tokens'] = code_tokens.token_runs([snippet['code']], 'python')
+            return payload
+        return ('code', None, None, (index,), params['tokens']), build
+    
+    language = params['language']
+    category = params['category']
+    
+    # For non-random mode, combine multiple texts to ensure sufficient length
+    texts = curated_texts(language, category)
+    index = curated_text_difficulty(language, category) if band else None
+    indices = pick_curated(len(texts), CURATED_TEXTS_BY_BUCKET[bucket], index, band, rng)
+    
+    def build() -> Dict[str, Any]:
+        return {
+            'text': ' '.join([texts[i] for i in indices]),
             'type': 'text',
             'language': language,
             'category': category,
             'random': False
-        })
+        }
+    if isinstance(texts, corpus.Corpus):
+        return None, build  # Combinations from a large corpus almost never repeat; not worth caching
+    return ('text', language, category, indices), build
+
+
+def curated_text_payload(params: Dict[str, Any], rng: Optional[random.Random] = None) -> Dict[str, Any]:
+    return curated_selection(params, rng)[1]()
+
+
+def curated_text_response(params: Dict[str, Any]) -> Response:
+    """Serve a curated combination from the pre-encoded cache, compressed to suit Accept-Encoding"""
+    key, build = curated_selection(params)
+    if key is None:
+        return jsonify(build())
+    variants = response_cache.get_or_build(key, lambda: encode_json(build()))
+    body, encoding = negotiate(variants, request.accept_encodings)
+    response = Response(body, mimetype='application/json')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def build_text_payload(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Response body for /api/text"""
+    return build_text_payloads(params, 1)[0]
+
+
+def build_text_payloads(params: Dict[str, Any], count: int) -> List[Dict[str, Any]]:
+    """Several independent /api/text bodies; random ones come from the pool or one bulk generation pass
+
+    Seeded requests draw everything from one Random(seed) and skip the pool, so the
+    same parameters always produce the same texts.
+    """
+    rng = params_rng(params)
+    if params['continuous']:
+        return [continuous_text_payload(params, rng) for _ in range(count)]
+    if params['practice']:
+        return [practice_text_payload(params, rng) for _ in range(count)]
+    if params['random']:
+        key = random_pool_key(params)
+        if rng is not None or not pooled(key):
+            texts = generate_random_texts(key, count, rng)
+        else:
+            texts = content_pool.get_many(key, count, lambda n: generate_random_texts(key, n))
+        return [random_text_payload(params, text) for text in texts]
+    return [curated_text_payload(params, rng) for _ in range(count)]
+
+
+# Practice: words chosen from an inverted index by the user's weak characters and bigrams
+PRACTICE_WORDS_BY_BUCKET = {60: 180, 30: 60, 15: 36}  # About as long as random prose for the bucket
+PRACTICE_CHUNK_WORDS = 36
+
+@startup.artifact('word_index', keys=lambda: [(code,) for code in language_registry.names()])
+def build_word_index(language: str) -> WordIndex:
+    data = language_registry.get(language)
+    word_lists = [pool.words for pool in data.word_pools.values()] or \
+        [get_word_pool(name).words for name in ('common', 'tech_only', 'programming_only')]
+    passages = itertools.chain.from_iterable(data.texts.values())
+    return WordIndex(practice.vocabulary(word_lists, passages))
+
+
+def get_word_index(language: str) -> WordIndex:
+    """Inverted index over a language's word lists and the words of its curated texts, built on first use"""
+    return build_word_index(language if language in language_registry else 'english')
+
+
+def practice_text(language: str, user: Optional[str], word_count: int,
+                  rng: Optional[random.Random] = None) -> Tuple[str, List[str]]:
+    """A drill for the user's weaknesses, or plain random words for users without a profile yet"""
+    profile = get_practice_profiles().get(user)
+    targets = profile.targets() if profile is not None else []
+    return ContentGenerator.generate_practice_text(word_count, get_word_index(language), targets, rng)
+
+
+def practice_text_payload(params: Dict[str, Any], rng: Optional[random.Random] = None) -> Dict[str, Any]:
+    text, targets = practice_text(params['language'], params['user'], PRACTICE_WORDS_BY_BUCKET[params['bucket']], rng)
+    return {
+        'text': text,
+        'type': 'text',
+        'language': params['language'],
+        'category': params['category'],
+        'random': True,
+        'practice': True,
+        'targets': targets,
+    }
+
+
+# Continuation: open-ended tests get their text in chunks addressed by a stateless cursor.
+# Chunk i is generated from its own Random(seed:i), so any chunk can be rebuilt from the cursor
+# alone and the server holds nothing per client between requests.
+CHUNK_SENTENCES = 3
+MAX_STREAM_CHUNKS = 1000
+MAX_SHUFFLED_ITEMS = 4096
+
+
+def encode_cursor(spec: Dict[str, Any]) -> str:
+    raw = json.dumps(spec, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        spec = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if spec['k'] not in ('text', 'markov', 'practice', 'code', 'curated_text', 'curated_code') or int(spec['n']) < 0:
+            raise ValueError
+        difficulty.parse_band(spec.get('d'))
+        difficulty.parse_band(split_band(str(spec['v']))[1])
+        return spec
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def continuation_spec(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Everything needed to regenerate a continuous text: kind, variant, seed and next chunk index
+
+    Random kinds carry the difficulty band in their variant (see random_pool_key),
+    curated ones as 'd'; practice drills ignore it.
+    """
+    if params['practice']:
+        return {'k': 'practice', 'v': params['language'], 'u': params['user'], 'l': params['language'],
+                'c': params['category']}
+    if params['content_type'] == 'code':
+        lang = params['code_language']
+        if params['random']:
+            return {'k': 'code', 'v': random_pool_key(params)[1], 'l': lang}
+        lang = lang if lang in CODE_SNIPPETS else 'python'
+        spec = {'k': 'curated_code', 'v': lang, 'l': lang, 'h': params['language']}
+    elif params['random']:
+        kind, variant, _ = random_pool_key(params)
+        return {'k': kind, 'v': variant, 'l': params['language'], 'c': params['category']}
+    else:
+        curated_texts(params['language'], params['category'])  # KeyError for unknown categories
+        spec = {'k': 'curated_text', 'v': params['category'], 'l': params['language'], 'c': params['category']}
+    if params['difficulty']:
+        spec['d'] = params['difficulty']
+    return spec
+
+
+def chunk_separator(spec: Dict[str, Any]) -> str:
+    return '\n\n' if spec['k'] in ('code', 'curated_code') else ' '
+
+
+def generate_chunk(spec: Dict[str, Any], index: int) -> str:
+    kind = spec['k']
+    if kind == 'curated_text' or kind == 'curated_code':
+        if kind == 'curated_text':
+            items = curated_texts(spec['l'], spec['v'])
+        else:
+            items = curated_snippets(spec.get('h', 'english'), spec['v'])
+        band = difficulty.parse_band(spec.get('d'))
+        if band is None:
+            ids: Sequence[int] = range(len(items))
+        elif kind == 'curated_text':
+            ids = curated_text_difficulty(spec['l'], spec['v']).band_ids(band)
+        else:
+            ids = curated_snippet_difficulty(spec.get('h', 'english'), spec['v']).band_ids(band)
+        if len(ids) > MAX_SHUFFLED_ITEMS:
+            # Too large to shuffle per chunk (an on-disk corpus); repeats are unlikely anyway
+            item = items[ids[random.Random(f"{spec['s']}:{index}").randrange(len(ids))]]
+        else:
+            # Walk the collection in a fresh shuffled order each cycle so passages don't repeat back to back
+            cycle, offset = divmod(index, len(ids))
+            order = list(ids)
+            random.Random(f"{spec['s']}:{cycle}").shuffle(order)
+            item = items[order[offset]]
+        return item if kind == 'curated_text' else item['code']
+
+    rng = random.Random(f"{spec['s']}:{index}")
+    if kind == 'code':
+        lang, band = split_band(spec['v'])
+        return ContentGenerator.generate_random_code_snippet(lang, band, rng)
+    if kind == 'markov':
+        return generate_markov_paragraphs(spec['v'], CHUNK_SENTENCES, rng=rng)[0]
+    if kind == 'practice':
+        # Drawn from the profile as it is now, so later chunks follow results saved since the test began
+        return practice_text(spec['v'], spec.get('u'), PRACTICE_CHUNK_WORDS, rng)[0]
+    return ContentGenerator.generate_random_paragraph(CHUNK_SENTENCES, resolve_word_pool(spec['v']), rng=rng)
+
+
+def iter_chunks(spec: Dict[str, Any]) -> Iterator[str]:
+    """Lazily yield chunks from the cursor position onwards; never materializes more than one chunk"""
+    for index in itertools.count(int(spec['n'])):
+        yield generate_chunk(spec, index)
+
+
+def initial_chunk_count(spec: Dict[str, Any], bucket: int) -> int:
+    """Chunks in the first response, matching the length the fixed-size endpoint would return"""
+    if spec['k'] in ('text', 'markov'):
+        return RANDOM_PARAGRAPHS_BY_BUCKET[bucket]
+    if spec['k'] == 'practice':
+        return PRACTICE_WORDS_BY_BUCKET[bucket] // PRACTICE_CHUNK_WORDS
+    if spec['k'] == 'code':
+        return RANDOM_SNIPPETS_BY_BUCKET[bucket]
+    if spec['k'] == 'curated_code':
+        return CURATED_SNIPPETS_BY_BUCKET[bucket]
+    return CURATED_TEXTS_BY_BUCKET[bucket]
+
+
+def continuation_payload(spec: Dict[str, Any], count: int, tokens: bool = False,
+                         leading: bool = False) -> Dict[str, Any]:
+    """Take `count` chunks from the cursor and return them with the cursor for what follows
+
+    With leading, the text starts with the chunk separator, ready to append to what came before.
+    With tokens, code chunks come with their token runs; curated snippets' runs are memoized.
+    """
+    separator = chunk_separator(spec)
+    chunks = list(itertools.islice(iter_chunks(spec), count))
+    payload = {
+        'text': (separator if leading else '') + separator.join(chunks),
+        'cursor': encode_cursor(dict(spec, n=int(spec['n']) + count)),
+    }
+    if tokens and spec['k'] in ('code', 'curated_code'):
+        payload['tokens'] = code_tokens.token_runs(chunks, spec['l'], separator,
+                                                   memoize=spec['k'] == 'curated_code', leading=leading)
+    return payload
+
+
+def continuous_text_payload(params: Dict[str, Any], rng: Optional[random.Random] = None) -> Dict[str, Any]:
+    spec = dict(continuation_spec(params), s=(rng or random).getrandbits(48), n=0)
+    payload = continuation_payload(spec, initial_chunk_count(spec, params['bucket']), params['tokens'])
+    payload.update({
+        'type': 'code' if spec['k'] in ('code', 'curated_code') else 'text',
+        'language': spec['l'],
+        'random': params['random'],
+        'continuous': True,
+        'separator': chunk_separator(spec),
+    })
+    if 'c' in spec:
+        payload['category'] = spec['c']
+    if spec['k'] == 'practice':
+        payload['practice'] = True
+    return payload
+
+
+# Startup metadata only changes on deploy: encode it once and let clients revalidate by content hash
+METADATA_CACHE_CONTROL = 'public, no-cache'
+
+
+def text_categories(language: str) -> List[Tuple[str, str]]:
+    """(category, display name) for a language, plus any extra categories provided by on-disk corpora
+
+    Built from registry metadata alone, so listing categories never loads a language's texts.
+    """
+    categories = language_registry.categories(language) if language in language_registry else \
+        [(category, None) for category in TEXT_COLLECTIONS]
+    known = {category for category, _ in categories}
+    categories += [(category, None) for category in corpus.categories(language) if category not in known]
+    return [(category, name or CATEGORY_NAMES.get(category, category.title())) for category, name in categories]
+
+
+def build_metadata() -> Dict[str, Any]:
+    """Everything the client needs to populate its selectors"""
+    code_languages = list(CODE_SNIPPETS) + [lang for lang in code_templates.available_languages()
+                                            if lang not in CODE_SNIPPETS]
+    return {
+        'languages': language_registry.names(),
+        'categories': {
+            code: [{'value': category, 'name': name} for category, name in text_categories(code)]
+            for code in language_registry.names()
+        },
+        'code_languages': [{'value': lang, 'name': CODE_LANGUAGE_NAMES.get(lang, lang.title())}
+                           for lang in code_languages],
+        'token_classes': list(code_tokens.CLASSES),
+    }
+
+
+@startup.artifact('metadata')
+def metadata_bodies() -> Dict[str, Any]:
+    """Pre-encoded bodies for the metadata endpoints: bootstrap metadata and its ETag, languages, categories"""
+    metadata = encode_json(build_metadata())
+    return {
+        'metadata': metadata,
+        'metadata_etag': make_etag(metadata),
+        'languages': encode_json({'languages': language_registry.names()}),
+        'categories': {
+            code: encode_json({'categories': [category for category, _ in text_categories(code)]})
+            for code in language_registry.names()
+        },
+    }
+
+
+DEFAULT_CATEGORIES_BODY = encode_json({'categories': list(TEXT_COLLECTIONS.keys())})
+
+
+# Request metrics: latency per route and parameter tier, response sizes and error counts
+TIERED_ENDPOINTS = frozenset({'get_text', 'get_text_batch'})
+
+
+def metrics_params(req) -> str:
+    """Bounded label describing which generation path a text request takes"""
+    if req.endpoint not in TIERED_ENDPOINTS:
+        return ''
+    return params_label(req.query_string)
+
+
+@lru_cache(maxsize=1024)
+def params_label(query_string: bytes) -> str:
+    # Parsed here rather than read from request.args: MultiDict misses raise internally and cost microseconds
+    args: Dict[str, str] = {}
+    for name, value in urllib.parse.parse_qsl(query_string.decode('latin-1')):
+        args.setdefault(name, value)
+    try:
+        bucket = duration_bucket(int(args.get('duration') or 30))
+    except ValueError:
+        bucket = 0
+    return ','.join((
+        'type=' + ('code' if args.get('type') == 'code' else 'text'),
+        'random=' + str(args.get('random', '').lower() == 'true').lower(),
+        'generator=' + ('markov' if args.get('generator') == 'markov' else 'words'),
+        'continuous=' + str(args.get('continuous', '').lower() == 'true').lower(),
+        'practice=' + str(args.get('practice', '').lower() == 'true').lower(),
+        'seeded=' + str(bool(args.get('seed'))).lower(),
+        f'bucket={bucket}',
+    ))
+
+
+# The hooks resolve the request proxy once: each proxy lookup costs about as much as recording a metric
+@app.before_request
+def start_request_metrics():
+    if metrics.ENABLED:
+        environ = request._get_current_object().environ
+        environ['typexi.profile'] = metrics.profiler.start()
+        environ['typexi.started'] = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response: Response) -> Response:
+    req = request._get_current_object()
+    started = req.environ.pop('typexi.started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    profile = req.environ.pop('typexi.profile', None)
+    if profile is not None:
+        metrics.profiler.stop(profile)
+    rule = req.url_rule
+    metrics.observe_request(rule.rule if rule is not None else 'unmatched', req.method, metrics_params(req),
+                            response.status_code, elapsed, None if response.is_streamed else response.content_length)
+    return response
+
+
+@app.route('/')
+def index():
+    """Main page route"""
+    return render_template('index.html')
+
+
+@app.route('/api/text')
+def get_text():
+    """Get text based on various parameters"""
+    try:
+        params = read_text_params(request.args)
+        # Practice texts follow a profile that changes with every result, so they are never cached as immutable
+        if params['seed'] is not None and not params['practice']:
+            return seeded_text_response(params)
+        if not params['random'] and not params['continuous'] and not params['practice']:
+            return curated_text_response(params)
+        return jsonify(build_text_payload(params))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/text/batch')
+def get_text_batch():
+    """Get several independent texts at once so the client can prefetch upcoming tests"""
+    try:
+        params = read_text_params(request.args)
+        count = max(1, min(int(request.args.get('count', 5)), MAX_BATCH_TEXTS))
+        if params['seed'] is not None and not params['practice']:
+            return seeded_text_response(params, count)
+        texts = build_text_payloads(params, count)
+        return jsonify({'texts': texts, 'count': len(texts)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/text/more')
+def get_text_more():
+    """Continue a continuous text from its cursor; the returned text starts with the chunk separator"""
+    try:
+        spec = decode_cursor(request.args.get('cursor', ''))
+        chunks = max(1, min(int(request.args.get('chunks', 1)), MAX_BATCH_TEXTS))
+        tokens = request.args.get('tokens', 'false').lower() == 'true'
+        payload = continuation_payload(spec, chunks, tokens, leading=True)
+        if spec['k'] == 'practice':
+            # Practice chunks follow the user's live error profile, so no cache may keep them
+            response = jsonify(payload)
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+        # Any other cursor fully determines the chunk, so those continuations are as cacheable as seeded texts
+        body = encode_json(payload)
+        return cached_json_response(body, make_etag(body), SEEDED_CACHE_CONTROL)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/api/text/stream')
+def stream_text():
+    """Stream continuation chunks as NDJSON, one {"text", "cursor"} object per line"""
+    try:
+        spec = decode_cursor(request.args.get('cursor', ''))
+        chunks = max(1, min(int(request.args.get('chunks', 10)), MAX_STREAM_CHUNKS))
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        separator = chunk_separator(spec)
+        start = int(spec['n'])
+        for offset, chunk in enumerate(itertools.islice(iter_chunks(spec), chunks), start=1):
+            cursor = encode_cursor(dict(spec, n=start + offset))
+            yield json.dumps({'text': separator + chunk, 'cursor': cursor}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+# Bounds on the generator endpoints' sizes, which the client picks; the UI asks for far less
+MAX_RANDOM_WORDS = 1000
+MAX_SENTENCE_WORDS = 100
+MAX_PARAGRAPH_SENTENCES = 50
 
 
 @app.route('/api/random-words')
 def get_random_words():
     """Generate random words for custom text creation"""
     try:
-        count = int(request.args.get('count', 10))
+        count = max(1, min(int(request.args.get('count', 10)), MAX_RANDOM_WORDS))
         category = request.args.get('category', 'common')
         
-        if category == 'tech':
-            word_list = TECH_WORDS
-        elif category == 'programming':
-            word_list = PROGRAMMING_WORDS
+        if category in ('tech', 'programming'):
+            pool = get_word_pool(f'{category}_only')
         else:
-            word_list = COMMON_WORDS
+            pool = get_word_pool('common')
         
-        words = random.choices(word_list, k=min(count, len(word_list)))
+        words = pool.sample(min(count, len(pool)))
         return jsonify({'words': words})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -575,16 +1233,10 @@ def get_random_words():
 def generate_sentence():
     """Generate a single random sentence"""
     try:
-        min_words = int(request.args.get('min_words', 5))
-        max_words = int(request.args.get('max_words', 15))
+        min_words = max(1, min(int(request.args.get('min_words', 5)), MAX_SENTENCE_WORDS))
+        max_words = max(1, min(int(request.args.get('max_words', 15)), MAX_SENTENCE_WORDS))
         category = request.args.get('category', 'common')
-        
-        if category == 'tech':
-            word_list = TECH_WORDS + COMMON_WORDS
-        elif category == 'programming':
-            word_list = PROGRAMMING_WORDS + COMMON_WORDS
-        else:
-            word_list = COMMON_WORDS
+        word_list = get_word_pool(category)
         
         sentence = ContentGenerator.generate_random_sentence(min_words, max_words, word_list)
         return jsonify({'sentence': sentence})
@@ -596,15 +1248,9 @@ def generate_sentence():
 def generate_paragraph():
     """Generate a random paragraph"""
     try:
-        num_sentences = int(request.args.get('sentences', 3))
+        num_sentences = max(1, min(int(request.args.get('sentences', 3)), MAX_PARAGRAPH_SENTENCES))
         category = request.args.get('category', 'common')
-        
-        if category == 'tech':
-            word_list = TECH_WORDS + COMMON_WORDS
-        elif category == 'programming':
-            word_list = PROGRAMMING_WORDS + COMMON_WORDS
-        else:
-            word_list = COMMON_WORDS
+        word_list = get_word_pool(category)
         
         paragraph = ContentGenerator.generate_random_paragraph(num_sentences, word_list)
         return jsonify({'paragraph': paragraph})
@@ -616,61 +1262,542 @@ def generate_paragraph():
 def get_categories():
     """Get available categories for a language"""
     language = request.args.get('language', 'english')
-    
-    if language in LANGUAGES:
-        categories = list(LANGUAGES[language]['texts'].keys())
-    else:
-        categories = list(TEXT_COLLECTIONS.keys())
-    
-    return jsonify({'categories': categories})
+    body = metadata_bodies()['categories'].get(language, DEFAULT_CATEGORIES_BODY)
+    return cached_json_response(body, make_etag(body), METADATA_CACHE_CONTROL)
 
 
 @app.route('/api/languages')
 def get_languages():
     """Get available languages"""
+    body = metadata_bodies()['languages']
+    return cached_json_response(body, make_etag(body), METADATA_CACHE_CONTROL)
+
+
+@app.route('/api/bootstrap')
+def get_bootstrap():
+    """Get all startup metadata plus a first text in one round trip
+    
+    The metadata's ETag is a hash of its content. Clients that send it back in
+    If-None-Match get a 304; with text=false the response is metadata only and
+    fully cacheable.
+    """
+    bodies = metadata_bodies()
+    if request.if_none_match.contains(bodies['metadata_etag']) or request.args.get('text', 'true').lower() == 'false':
+        return cached_json_response(bodies['metadata'], bodies['metadata_etag'], METADATA_CACHE_CONTROL)
+    
+    try:
+        params = read_text_params(request.args)
+        text = encode_json(build_text_payload(params))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Splice the pre-encoded metadata in rather than serializing it again
+    body = b'{"meta":' + bodies['metadata'] + b',"meta_etag":' + encode_json(bodies['metadata_etag']) + \
+        b',"text":' + text + b'}'
+    response = Response(body, mimetype='application/json')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+# Bounds every number a result stores; it also keeps out NaN, infinities and integers SQLite can't bind
+MAX_RESULT_NUMBER = 1e12
+
+
+def result_number(data: Dict[str, Any], field: str) -> Union[int, float]:
+    """A numeric field of a submitted result (0 when absent or null); ValueError unless it is a sane number"""
+    value = data.get(field)
+    if value is None:
+        return 0
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not abs(value) <= MAX_RESULT_NUMBER:
+        raise ValueError(f'{field} must be a number')
+    return value
+
+
+def result_label(data: Dict[str, Any], field: str, default: str) -> str:
+    """A setting of a submitted result (default when absent); ValueError unless it is a string"""
+    value = data.get(field, default)
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be a string')
+    return value
+
+
+def build_result(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalize a submitted result; a keystroke log, when present, replaces the client's numbers
+
+    Raises ValueError for anything malformed, so nothing that can't be stored and indexed is saved.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('A result must be an object')
+    result = {
+        'wpm': result_number(data, 'wpm'),
+        'accuracy': result_number(data, 'accuracy'),
+        'time_taken': result_number(data, 'time_taken'),
+        'characters_typed': result_number(data, 'characters_typed'),
+        'errors': result_number(data, 'errors'),
+        'test_type': result_label(data, 'test_type', 'time'),
+        'content_type': result_label(data, 'content_type', 'text'),
+        'language': result_label(data, 'language', 'english'),
+        'category': result_label(data, 'category', 'tech'),
+        'duration': int(result_number(data, 'duration')),
+        'name': str(data.get('name') or 'Anonymous')[:32],
+        'user': str(data['user'])[:64] if data.get('user') else None,
+        'timestamp': int(time.time()),
+        'verified': False
+    }
+    
+    if data.get('keystrokes'):
+        if not isinstance(data.get('text'), str):
+            raise ValueError('A keystroke log needs the text it was typed against')
+        result.update(keystroke_analysis.verify(data['keystrokes'], data['text'], data))
+        result['verified'] = True
+        result['replay'] = True
+    
+    return result
+
+
+def build_replay(data: Dict[str, Any]) -> Optional[bytes]:
+    """The compact replay of a submission's keystroke log, stored next to its result (call after build_result)"""
+    if not data.get('keystrokes'):
+        return None
+    deltas, keys = keystroke_analysis.decode_log(data['keystrokes'])
+    return replay.encode(deltas.tolist(), keys.tolist(), data['text'])
+
+
+def index_result(result: Dict[str, Any]) -> None:
+    """Fold a persisted result into the derived indexes"""
+    if not result.get('flags'):
+        get_leaderboard_index().add(result)
+        get_practice_profiles().add(result)
+        get_percentile_index().add(result)
+
+
+def result_percentiles(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Where a result's WPM and accuracy fall among results with the same settings"""
+    index = get_percentile_index()
+    partition = percentiles.partition_of(result)
+    ranked = {}
+    for metric in percentiles.METRICS:
+        percentile, count = index.rank(partition, metric, float(result.get(metric) or 0))
+        ranked[metric] = round(percentile, 1)
+    ranked['count'] = count
+    return ranked
+
+
+def record_result(result: Dict[str, Any], replay_data: Optional[bytes] = None) -> Dict[str, Any]:
+    """Persist a built result (and its replay) and fold it into the derived indexes"""
+    result['id'] = get_result_store().save(result, replay_data)
+    index_result(result)
+    return result
+
+
+# Batched ingestion: each result carries a client-generated idempotency key, so offline clients can
+# upload what they queued and retry freely. Saving is split around the store call so the ASGI twin
+# can await the commit instead of blocking on it.
+MAX_BATCH_RESULTS = int(os.environ.get('TYPEXI_MAX_BATCH_RESULTS', 100))
+
+PendingResult = Tuple[int, str, Dict[str, Any], Optional[bytes]]
+
+
+def known_result_ids(keys: Sequence[str]) -> Dict[str, int]:
+    """Ids of the results already saved under any of the keys
+
+    Recent keys are answered from memory. Only keys the Bloom filter may have
+    seen are looked up in the database, all in one query.
+    """
+    recent = get_recent_keys()
+    found: Dict[str, int] = {}
+    lookup = []
+    for key in keys:
+        result_id = recent.get(key)
+        if result_id is not None:
+            found[key] = result_id
+        elif recent.might_contain(key):
+            lookup.append(key)
+    if lookup:
+        found.update(get_result_store().ids_for_keys(lookup))
+    return found
+
+
+def prepare_result_batch(items: Any) -> Tuple[List[Dict[str, Any]], List[PendingResult], List[Tuple[int, int]]]:
+    """Settle what can be settled without writing: an outcome per item, the built results still to be
+    stored as (position, key, result, replay), and (position, earlier position) for keys repeated within the batch"""
+    if not isinstance(items, list) or not items:
+        raise ValueError('results must be a non-empty list')
+    if len(items) > MAX_BATCH_RESULTS:
+        raise ValueError(f'At most {MAX_BATCH_RESULTS} results per batch')
+
+    outcomes: List[Dict[str, Any]] = []
+    for item in items:
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('Each result must be an object')
+            outcomes.append({'idempotency_key': idempotency.parse_key(item.get('idempotency_key'))})
+        except ValueError as e:
+            outcomes.append({'status': 'error', 'error': str(e)})
+
+    known = known_result_ids(list({outcome['idempotency_key'] for outcome in outcomes if 'status' not in outcome}))
+    pending: List[PendingResult] = []
+    repeats: List[Tuple[int, int]] = []
+    first: Dict[str, int] = {}
+    for position, (item, outcome) in enumerate(zip(items, outcomes)):
+        if 'status' in outcome:
+            continue
+        key = outcome['idempotency_key']
+        if key in known:
+            outcome.update(status='duplicate', id=known[key])
+        elif key in first:
+            repeats.append((position, first[key]))
+        else:
+            first[key] = position
+            try:
+                pending.append((position, key, build_result(item), build_replay(item)))
+            except Exception as e:
+                outcome.update(status='error', error=str(e))
+    return outcomes, pending, repeats
+
+
+def finish_result_batch(outcomes: List[Dict[str, Any]], pending: List[PendingResult],
+                        repeats: List[Tuple[int, int]], stored: List[Tuple[int, bool]]) -> List[Dict[str, Any]]:
+    """Fold the newly stored results into the indexes and complete every item's outcome"""
+    recent = get_recent_keys()
+    for (position, key, result, _), (result_id, inserted) in zip(pending, stored):
+        result['id'] = result_id
+        if inserted:
+            index_result(result)
+        recent.add(key, result_id)
+        outcomes[position].update(status='created' if inserted else 'duplicate', id=result_id)
+    for position, earlier in repeats:
+        if outcomes[earlier]['status'] == 'error':
+            outcomes[position].update(status='error', error=outcomes[earlier]['error'])
+        else:
+            outcomes[position].update(status='duplicate', id=outcomes[earlier]['id'])
+    return outcomes
+
+
+def record_result_batch(items: Any) -> Tuple[List[Dict[str, Any]], List[PendingResult]]:
+    """Save a batch of keyed results in one transaction; returns the outcomes and the results built"""
+    outcomes, pending, repeats = prepare_result_batch(items)
+    stored = get_result_store().save_many([result for _, _, result, _ in pending], [key for _, key, _, _ in pending],
+                                          [replay_data for _, _, _, replay_data in pending]) if pending else []
+    return finish_result_batch(outcomes, pending, repeats, stored), pending
+
+
+def result_batch_response(outcomes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    counts = {status: sum(1 for outcome in outcomes if outcome['status'] == status)
+              for status in ('created', 'duplicate', 'error')}
+    return {'success': True, 'results': outcomes, 'created': counts['created'],
+            'duplicates': counts['duplicate'], 'errors': counts['error']}
+
+
+def keyed_result_response(outcome: Dict[str, Any], pending: List[PendingResult],
+                          stored: Optional[Dict[str, Any]] = None) -> Any:
+    """/api/result's answer for a single keyed submission; a retry gets the result saved the first time
+
+    Pass that result as `stored` when it was already fetched, so the response doesn't read it again.
+    """
+    if outcome['status'] == 'error':
+        return jsonify({'error': outcome['error']}), 400
+    duplicate = outcome['status'] == 'duplicate'
+    if duplicate:
+        result = stored if stored is not None else get_result_store().get(outcome['id'])
+    else:
+        result = pending[0][2]
     return jsonify({
-        'languages': {code: data['name'] for code, data in LANGUAGES.items()}
+        'success': True,
+        'result': result,
+        'percentiles': result_percentiles(result),
+        'duplicate': duplicate,
+        'message': 'Result already saved' if duplicate else 'Result saved successfully'
     })
 
 
 @app.route('/api/result', methods=['POST'])
 def save_result():
-    """Save typing test result with enhanced data"""
-    data = request.json
-    
-    result = {
-        'wpm': data.get('wpm', 0),
-        'accuracy': data.get('accuracy', 0),
-        'time_taken': data.get('time_taken', 0),
-        'characters_typed': data.get('characters_typed', 0),
-        'errors': data.get('errors', 0),
-        'test_type': data.get('test_type', 'time'),
-        'content_type': data.get('content_type', 'text'),
-        'language': data.get('language', 'english'),
-        'category': data.get('category', 'tech'),
-        'timestamp': int(time.time())
-    }
+    """Save typing test result with enhanced data; with an idempotency_key, retries are saved only once"""
+    try:
+        data = request.json
+        if isinstance(data, dict) and data.get('idempotency_key') is not None:
+            outcomes, pending = record_result_batch([data])
+            return keyed_result_response(outcomes[0], pending)
+        result = record_result(build_result(data), build_replay(data))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
         'success': True,
         'result': result,
+        'percentiles': result_percentiles(result),
         'message': 'Result saved successfully'
     })
 
 
+@app.route('/api/results/batch', methods=['POST'])
+def save_results_batch():
+    """Save up to MAX_BATCH_RESULTS results in one transaction, skipping any whose key was saved before"""
+    try:
+        data = request.json
+        outcomes, _ = record_result_batch(data.get('results') if isinstance(data, dict) else data)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result_batch_response(outcomes))
+
+
+@app.route('/api/result/<int:result_id>')
+def get_result(result_id):
+    """Get a previously saved result"""
+    result = get_result_store().get(result_id)
+    if result is None:
+        return jsonify({'error': 'Result not found'}), 404
+    return jsonify({'result': result})
+
+
+@app.route('/api/replay/<int:result_id>')
+def get_replay(result_id):
+    """Stream a result's keystroke replay as NDJSON: its text and chunk times, then one line per chunk
+
+    `from` and `to` (ms since the test started) limit the chunks to a time range. Only the header and
+    those chunks are read from the store, each as it is sent, so playback can start on the first line.
+    A chunk found corrupt after the stream has started ends it with an {"error"} line.
+    """
+    try:
+        start = int(request.args.get('from', 0))
+        end = int(request.args['to']) if request.args.get('to') else None
+        if start < 0 or (end is not None and end <= start):
+            raise ValueError('Replay range must have 0 <= from < to')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    store = get_result_store()
+    size = store.replay_size(result_id)
+    if size is None:
+        return jsonify({'error': 'Replay not found'}), 404
+    try:
+        header_size = replay.Replay.header_size(store.replay_range(result_id, 0, replay.PREFIX.size))
+        recording = replay.Replay.parse(store.replay_range(result_id, 0, header_size))
+    except ValueError as e:
+        return jsonify({'error': f'Replay is unreadable: {e}'}), 500
+    chunks = recording.select(start, end)
+
+    def generate():
+        yield json.dumps(dict(recording.metadata(), id=result_id, bytes=size)) + '\n'
+        for chunk in chunks:
+            data = store.replay_range(result_id, chunk.offset, chunk.size)
+            try:
+                decoded = recording.decode_chunk(chunk, data)
+            except ValueError as e:
+                yield json.dumps({'error': f'Replay is unreadable: {e}'}) + '\n'
+                return
+            yield json.dumps(decoded, separators=(',', ':')) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @app.route('/api/leaderboard')
 def get_leaderboard():
-    """Get leaderboard data (mock data for now)"""
-    leaderboard = [
-        {'rank': 1, 'name': 'SpeedDemon', 'wpm': 145, 'accuracy': 98, 'date': '2024-01-15'},
-        {'rank': 2, 'name': 'TypeMaster', 'wpm': 138, 'accuracy': 99, 'date': '2024-01-14'},
-        {'rank': 3, 'name': 'KeyboardWarrior', 'wpm': 132, 'accuracy': 97, 'date': '2024-01-13'},
-        {'rank': 4, 'name': 'FastFingers', 'wpm': 128, 'accuracy': 96, 'date': '2024-01-12'},
-        {'rank': 5, 'name': 'QuickType', 'wpm': 125, 'accuracy': 98, 'date': '2024-01-11'}
-    ]
+    """Get the top results for one combination of test settings"""
+    try:
+        window = request.args.get('window', 'all')
+        if window not in WINDOWS:
+            raise ValueError(f'Unknown window: {window}')
+        limit = min(int(request.args.get('limit', 10)), 100)
+        
+        partition = (
+            request.args.get('test_type', 'time'),
+            request.args.get('content_type', 'text'),
+            request.args.get('language', 'english'),
+            request.args.get('category', 'tech'),
+            int(request.args.get('duration', 30)),
+        )
+        leaderboard = get_leaderboard_index().top(partition, window, limit)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({'leaderboard': leaderboard})
+    return jsonify({
+        'leaderboard': leaderboard,
+        'window': window,
+        'filters': dict(zip(PARTITION_FIELDS, partition))
+    })
+
+
+PERCENTILE_QUANTILES = (0.25, 0.5, 0.75, 0.9, 0.99)
+
+
+@app.route('/api/percentiles')
+def get_percentiles():
+    """Rank a WPM and/or accuracy among all results with the same settings, plus the distribution's quantiles"""
+    try:
+        partition = (
+            request.args.get('test_type', 'time'),
+            request.args.get('content_type', 'text'),
+            request.args.get('category', 'tech'),
+            int(request.args.get('duration', 30)),
+        )
+        values = {metric: float(request.args[metric]) for metric in percentiles.METRICS if metric in request.args}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    index = get_percentile_index()
+    payload: Dict[str, Any] = {'filters': dict(zip(percentiles.PARTITION_FIELDS, partition))}
+    for metric in percentiles.METRICS:
+        quantiles = index.quantiles(partition, metric, PERCENTILE_QUANTILES)
+        entry: Dict[str, Any] = {
+            f'p{round(q * 100)}': None if value is None else round(value, 1)
+            for q, value in zip(PERCENTILE_QUANTILES, quantiles)
+        }
+        percentile, entry['count'] = index.rank(partition, metric, values.get(metric, 0.0))
+        if metric in values:
+            entry['value'] = values[metric]
+            entry['percentile'] = round(percentile, 1)
+        payload[metric] = entry
+    return jsonify(payload)
+
+
+@app.route('/api/practice/profile')
+def get_practice_profile():
+    """A user's miss counts and the characters and bigrams their practice texts currently target"""
+    profile = get_practice_profiles().get(request.args.get('user'))
+    if profile is None:
+        return jsonify({'error': 'No verified results for this user yet'}), 404
+    return jsonify(dict(profile.to_dict(), targets=[gram for gram, _ in profile.targets()]))
+
+
+def race_text_query(query: str) -> str:
+    """The /api/text query every player in a race uses: the creator's text settings plus a fresh seed"""
+    settings = [(name, value) for name, value in urllib.parse.parse_qsl(query or '') if name in races.TEXT_PARAMS]
+    return urllib.parse.urlencode(settings + [('seed', os.urandom(8).hex())])
+
+
+def race_payload(room: races.Room, slot: int, token: str) -> Dict[str, Any]:
+    return {'room': room.id, 'slot': slot, 'token': token, 'text_query': room.text_query, 'state': room.snapshot()}
+
+
+def player_name(data: Dict[str, Any]) -> str:
+    return str(data.get('name') or 'Anonymous')[:32]
+
+
+@app.route('/api/races', methods=['POST'])
+def create_race():
+    """Open a race room; the creator is player 0 and the only one who can start it"""
+    try:
+        data = request.get_json(silent=True) or {}
+        room, slot, token = race_hub.create(race_text_query(data.get('query', '')), player_name(data))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(race_payload(room, slot, token))
+
+
+@app.route('/api/races/<room_id>/join', methods=['POST'])
+def join_race(room_id):
+    """Take the next free slot in a room that hasn't started"""
+    try:
+        room, slot, token = race_hub.join(room_id, player_name(request.get_json(silent=True) or {}))
+    except KeyError:
+        return jsonify({'error': 'Race not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(race_payload(room, slot, token))
+
+
+@app.route('/api/races/<room_id>/start', methods=['POST'])
+def start_race(room_id):
+    """Start the countdown; every subscriber gets the same start time"""
+    try:
+        room = race_hub.start(room_id, str((request.get_json(silent=True) or {}).get('token', '')))
+    except KeyError:
+        return jsonify({'error': 'Race not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'start_at': int(room.start_at * 1000)})
+
+
+@app.route('/api/races/<room_id>/progress', methods=['POST'])
+def report_race_progress(room_id):
+    """Record a player's progress (thousandths of the text) and WPM; peers see it on the next tick"""
+    try:
+        data = request.get_json(silent=True) or {}
+        race_hub.update(room_id, str(data.get('token', '')), int(data.get('progress', 0)), int(data.get('wpm', 0)))
+    except KeyError:
+        return jsonify({'error': 'Race not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'success': True})
+
+
+@app.route('/api/races/<room_id>')
+def get_race(room_id):
+    """A room's current state"""
+    room = race_hub.rooms.get(room_id)
+    if room is None:
+        return jsonify({'error': 'Race not found'}), 404
+    return jsonify(room.snapshot())
+
+
+@app.route('/api/races/<room_id>/events')
+def race_events(room_id):
+    """Server-sent events for a room: its state, then joins, the start signal and merged progress per tick
+
+    asgi.py serves this route itself as a coroutine; this threaded version is for WSGI servers.
+    """
+    wake = threading.Event()
+    try:
+        subscriber = race_hub.subscribe(room_id, wake.set)
+    except KeyError:
+        return jsonify({'error': 'Race not found'}), 404
+    race_hub.ensure_thread()
+
+    def generate():
+        try:
+            while not subscriber.closed:
+                yield subscriber.drain() or races.KEEPALIVE_EVENT
+                wake.wait(races.KEEPALIVE)
+                wake.clear()
+        finally:
+            race_hub.unsubscribe(subscriber)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/stats')
+def get_stats():
+    """Get internal cache and pool statistics"""
+    return jsonify({
+        'pool': content_pool.stats(),
+        'results': get_result_store().stats(),
+        'leaderboard': get_leaderboard_index().stats(),
+        'responses': response_cache.stats(),
+        'languages': language_registry.stats(),
+        'practice': get_practice_profiles().stats(),
+        'percentiles': get_percentile_index().stats(),
+        'races': race_hub.stats(),
+        'code_tokens': code_tokens.cache.stats(),
+        'idempotency': get_recent_keys().stats(),
+        'startup': startup.stats(),
+    })
+
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text exposition of request and generator metrics"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/metrics/profile')
+def get_metrics_profile():
+    """Aggregated cProfile output for the sampled requests"""
+    if not metrics.profiler.enabled:
+        return jsonify({'error': 'Profiling is off; set TYPEXI_PROFILE_SAMPLE_RATE'}), 404
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'calls'):
+        return jsonify({'error': f'Unknown sort: {sort}'}), 400
+    return Response(metrics.profiler.report(sort=sort), mimetype='text/plain')
+
 
+# Long-running servers build the metadata up front; lazy (serverless) starts leave it to the first request
+if not startup.LAZY:
+    metadata_bodies()
 
 # For Vercel deployment
 app.debug = False
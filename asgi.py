@@ -0,0 +1,342 @@
+"""ASGI entry point for high-concurrency deployments
+
+    uvicorn asgi:application
+
+Run one worker process. Race rooms live in the memory of the process that
+created them (races.py), so with several workers a join, progress report or
+event stream can land on a process that doesn't know the room. Scaling out
+needs sticky routing on the room id (/api/races/<room_id>/...) in front.
+
+Every existing Flask route keeps working unchanged; this module only decides
+where each request runs:
+
+- Async views (ASYNC_VIEWS) run on the event loop. POST /api/result and
+  /api/results/batch await the result store's group commit instead of parking
+  a thread on it, so thousands of submissions can wait on the same few
+  transactions. Everything around that wait runs in the thread pool:
+  building results (verifying a keystroke log, encoding its replay), their
+  SQLite lookups (known idempotency keys, a duplicate's stored result) and
+  folding saved results into the indexes.
+- Routes that only touch in-memory state (INLINE_ENDPOINTS) are dispatched
+  directly on the event loop. They are short CPU work (the word and sentence
+  generators clamp the sizes a client asks for), and a thread hop would
+  add latency without adding parallelism under the GIL. That holds only once
+  the lifespan startup has built what they read (the leaderboard, percentile
+  and practice indexes, the metadata bodies), so serve with lifespan enabled.
+- Everything else runs in a bounded thread pool: SQLite reads, static files,
+  and the text endpoints (bootstrap included, since it builds a first text),
+  which can load a language's data, train or load a Markov model, page in a
+  memory-mapped corpus or generate a text when its content pool is empty.
+- Race event streams (STREAM_VIEWS) are coroutines fed by the race hub's tick
+  task, so an idle subscriber costs a parked coroutine rather than a thread.
+
+The Flask request context, before/after_request hooks and error handlers apply
+on every path, exactly as under WSGI.
+"""
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from flask import Response, jsonify, request
+from werkzeug.exceptions import HTTPException
+
+import races
+from app import (app, build_replay, build_result, finish_result_batch, get_leaderboard_index,
+                 get_percentile_index, get_practice_profiles, get_recent_keys, get_result_store, index_result,
+                 keyed_result_response, metadata_bodies, prepare_result_batch, race_hub, result_batch_response,
+                 result_percentiles)
+
+MAX_BODY_BYTES = int(os.environ.get('TYPEXI_MAX_BODY_BYTES', 2 * 1024 * 1024))
+THREADS = int(os.environ.get('TYPEXI_ASGI_THREADS', 32))
+
+INLINE_ENDPOINTS = frozenset({
+    'index', 'get_random_words', 'generate_sentence', 'generate_paragraph', 'get_categories', 'get_languages',
+    'get_leaderboard', 'get_percentiles', 'create_race', 'join_race', 'start_race', 'report_race_progress',
+    'get_race',
+})
+
+executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='asgi-worker')
+
+
+async def store_result_batch(items: Any) -> Tuple[List[Dict[str, Any]], List[Any]]:
+    """Async twin of app.record_result_batch"""
+    loop = asyncio.get_running_loop()
+    outcomes, pending, repeats = await loop.run_in_executor(executor, prepare_result_batch, items)
+    stored = await asyncio.wrap_future(get_result_store().submit_many(
+        [result for _, _, result, _ in pending], [key for _, key, _, _ in pending],
+        [replay_data for _, _, _, replay_data in pending])) if pending else []
+    return await loop.run_in_executor(executor, finish_result_batch, outcomes, pending, repeats, stored), pending
+
+
+def prepare_result(data: Any) -> Tuple[Dict[str, Any], Optional[bytes]]:
+    """Build a result and its replay: verifying and encoding a keystroke log is too much CPU for the loop"""
+    return build_result(data), build_replay(data)
+
+
+async def save_result():
+    """Async twin of app.save_result: the durable write is awaited, not waited on by a thread"""
+    loop = asyncio.get_running_loop()
+    try:
+        data = request.json
+        if isinstance(data, dict) and data.get('idempotency_key') is not None:
+            outcomes, pending = await store_result_batch([data])
+            stored = None
+            if outcomes[0]['status'] == 'duplicate':
+                stored = await loop.run_in_executor(executor, get_result_store().get, outcomes[0]['id'])
+            return keyed_result_response(outcomes[0], pending, stored)
+        result, replay_data = await loop.run_in_executor(executor, prepare_result, data)
+        result['id'] = await asyncio.wrap_future(get_result_store().submit(result, replay_data))
+        await loop.run_in_executor(executor, index_result, result)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'result': result,
+        'percentiles': result_percentiles(result),
+        'message': 'Result saved successfully'
+    })
+
+
+async def save_results_batch():
+    """Async twin of app.save_results_batch"""
+    try:
+        data = request.json
+        outcomes, _ = await store_result_batch(data.get('results') if isinstance(data, dict) else data)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result_batch_response(outcomes))
+
+
+ASYNC_VIEWS: Dict[str, Callable[..., Awaitable[Any]]] = {
+    'save_result': save_result,
+    'save_results_batch': save_results_batch,
+}
+
+
+def build_environ(scope: Dict[str, Any], body: bytes) -> Dict[str, Any]:
+    """PEP 3333 environ for an ASGI HTTP scope whose body has already been read"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = 'HTTP_' + name
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def endpoint_for(environ: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any]]:
+    """Endpoint the request routes to and its arguments; None when Flask will answer with a routing error"""
+    try:
+        return app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return None, {}
+
+
+def dispatch(environ: Dict[str, Any]) -> Response:
+    """Run a request through Flask synchronously, as Flask.wsgi_app does"""
+    ctx = app.request_context(environ)
+    error: Optional[BaseException] = None
+    try:
+        ctx.push()
+        try:
+            return app.full_dispatch_request()
+        except Exception as e:
+            error = e
+            return app.handle_exception(e)
+    finally:
+        ctx.pop(error)
+
+
+async def dispatch_async(view: Callable[..., Awaitable[Any]], environ: Dict[str, Any]) -> Response:
+    """Like dispatch, but awaits an async view between the before and after request hooks"""
+    ctx = app.request_context(environ)
+    error: Optional[BaseException] = None
+    try:
+        ctx.push()
+        try:
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await view(**request.view_args)
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            return app.finalize_request(rv)
+        except Exception as e:
+            error = e
+            return app.handle_exception(e)
+    finally:
+        ctx.pop(error)
+
+
+async def read_body(receive: Callable[[], Awaitable[Dict[str, Any]]]) -> Optional[bytes]:
+    """The full request body, or None once it exceeds MAX_BODY_BYTES"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+_EXHAUSTED = object()
+
+
+async def send_response(send: Callable[[Dict[str, Any]], Awaitable[None]], response: Response,
+                        environ: Dict[str, Any], threaded: bool) -> None:
+    """Send a Flask response; streamed bodies are pulled chunk by chunk (in the pool when threaded)"""
+    app_iter, status, headers = response.get_wsgi_response(environ)
+    await send({
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+
+    loop = asyncio.get_running_loop()
+    iterator = iter(app_iter)
+    try:
+        while True:
+            if threaded:
+                chunk = await loop.run_in_executor(executor, next, iterator, _EXHAUSTED)
+            else:
+                chunk = next(iterator, _EXHAUSTED)
+            if chunk is _EXHAUSTED:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        close = getattr(app_iter, 'close', None)
+        if close is not None:
+            close()
+
+
+async def race_events(send, receive, room_id: str) -> None:
+    """Coroutine twin of app.race_events, woken by the hub's tick task on this loop"""
+    race_hub.ensure_task()
+    wake = asyncio.Event()
+    try:
+        subscriber = race_hub.subscribe(room_id, wake.set)
+    except KeyError:
+        await send({'type': 'http.response.start', 'status': 404,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': b'{"error":"Race not found"}'})
+        return
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-store'),
+        (b'x-accel-buffering', b'no'),
+    ]})
+    # The request body has been read, so the next message is the disconnect
+    disconnected = asyncio.ensure_future(receive())
+    try:
+        while not subscriber.closed:
+            await send({'type': 'http.response.body', 'body': subscriber.drain() or races.KEEPALIVE_EVENT,
+                        'more_body': True})
+            waiter = asyncio.ensure_future(wake.wait())
+            await asyncio.wait((waiter, disconnected), timeout=races.KEEPALIVE,
+                               return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            if disconnected.done():
+                return
+            wake.clear()
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        race_hub.unsubscribe(subscriber)
+
+
+STREAM_VIEWS: Dict[str, Callable[..., Awaitable[None]]] = {
+    'race_events': race_events,
+}
+
+
+async def handle_http(scope: Dict[str, Any], receive, send) -> None:
+    body = await read_body(receive)
+    if body is None:
+        await send({'type': 'http.response.start', 'status': 413,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': b'{"error":"Request body too large"}'})
+        return
+
+    environ = build_environ(scope, body)
+    endpoint, view_args = endpoint_for(environ)
+    if endpoint in STREAM_VIEWS:
+        await STREAM_VIEWS[endpoint](send, receive, **view_args)
+        return
+    if endpoint in ASYNC_VIEWS:
+        response = await dispatch_async(ASYNC_VIEWS[endpoint], environ)
+        threaded = False
+    elif endpoint in INLINE_ENDPOINTS:
+        response = dispatch(environ)
+        threaded = False
+    else:
+        response = await asyncio.get_running_loop().run_in_executor(executor, dispatch, environ)
+        threaded = True
+    await send_response(send, response, environ, threaded)
+
+
+async def handle_lifespan(receive, send) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Replay the leaderboard and error profiles, load the percentile sketches and seed the recent
+            # idempotency keys before serving, so no inline request pays for the SQLite reads
+            await loop.run_in_executor(executor, get_leaderboard_index)
+            await loop.run_in_executor(executor, get_practice_profiles)
+            await loop.run_in_executor(executor, get_percentile_index)
+            await loop.run_in_executor(executor, get_recent_keys)
+            # Every language's metadata, which loads their data files, for the inline metadata endpoints
+            await loop.run_in_executor(executor, metadata_bodies)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Flush results still queued for the group commit
+            await loop.run_in_executor(executor, get_result_store().close)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope: Dict[str, Any], receive, send) -> None:
+    """The ASGI application"""
+    if scope['type'] == 'http':
+        await handle_http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await handle_lifespan(receive, send)
+    else:
+        raise NotImplementedError(f"Unsupported ASGI scope type {scope['type']!r}")
@@ -0,0 +1,57 @@
+"""Code token runs: tokenizing per request versus the content-hash cache, and what they add to a response
+
+For each code language, a curated 60-second text (every curated snippet,
+joined) is tokenized cold, then served from the cache. "bytes" compares
+the JSON text with the JSON token runs sent next to it; "gzip" is the same
+after compression, which is how most clients receive them.
+
+    python benchmarks/bench_code_tokens.py --repeats 5
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import code_tokens  # noqa: E402
+from app import CODE_SNIPPETS  # noqa: E402
+
+
+def best_us(fn, repeats, calls):
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, (time.perf_counter() - started) / calls)
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--calls', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f'{"language":>11} {"chars":>6} {"runs":>5} {"tokenize us":>12} {"cached us":>10} '
+          f'{"text bytes":>11} {"runs bytes":>11} {"text gzip":>10} {"runs gzip":>10}')
+    for language, snippets in CODE_SNIPPETS.items():
+        parts = [snippet['code'] for snippet in snippets]
+        text = '\n\n'.join(parts)
+        tokenize_us = best_us(lambda: code_tokens.token_runs(parts, language, memoize=False),
+                              args.repeats, args.calls)
+        runs = code_tokens.token_runs(parts, language)
+        cached_us = best_us(lambda: code_tokens.token_runs(parts, language), args.repeats, args.calls)
+        text_json = json.dumps(text).encode()
+        runs_json = json.dumps(runs, separators=(',', ':')).encode()
+        print(f'{language:>11} {len(text):>6} {len(runs) // 2:>5} {tokenize_us:>12.1f} {cached_us:>10.1f} '
+              f'{len(text_json):>11} {len(runs_json):>11} {len(gzip.compress(text_json)):>10} '
+              f'{len(gzip.compress(runs_json)):>10}')
+    print(f'\ncache: {code_tokens.cache.stats()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Resident memory while sampling curated passages: mapped corpus versus an in-memory list
+
+Builds synthetic corpora of increasing size in a temporary directory, then,
+in a fresh process per size, samples passages the way /api/text does and
+reports how much the process's resident memory grew. Anonymous RSS (the
+heap) should stay flat for the mapped corpus as the passage count grows, while
+the list baseline grows with it. Mapped pages that were sampled show up as
+file-backed RSS: that is shared page cache the kernel can drop at any time.
+
+    python benchmarks/bench_corpus_rss.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import corpus  # noqa: E402
+from word_pools import generate_sentences  # noqa: E402
+
+PROBE = '''
+import random, sys, time
+sys.path.insert(0, {root!r})
+import corpus
+
+def rss_kib():
+    fields = {{}}
+    with open('/proc/self/status') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if name in ('RssAnon', 'RssFile'):
+                fields[name] = int(value.split()[0])
+    return fields['RssAnon'], fields['RssFile']
+
+anon, file = rss_kib()
+if {mode!r} == 'mapped':
+    texts = corpus.Corpus({path!r})
+else:
+    with open({path!r}, encoding='utf-8') as f:
+        texts = [line.strip() for line in f if line.strip()]
+rng = random.Random(0)
+started = time.perf_counter()
+for _ in range({samples}):
+    ' '.join(texts[i] for i in rng.sample(range(len(texts)), 5))
+elapsed = time.perf_counter() - started
+now_anon, now_file = rss_kib()
+print(now_anon - anon, now_file - file, elapsed / {samples} * 1e6)
+'''
+
+
+def write_corpus(path, passages):
+    rng = random.Random(passages)
+    with open(path, 'w', encoding='utf-8') as f:
+        remaining = passages
+        while remaining:
+            batch = min(remaining, 10000)
+            sentences = generate_sentences(batch * 2, rng=rng)
+            f.writelines(f'{sentences[2 * i]} {sentences[2 * i + 1]}\n' for i in range(batch))
+            remaining -= batch
+
+
+def probe(mode, path, samples):
+    code = PROBE.format(root=ROOT, mode=mode, path=path, samples=samples)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    anon, file, us = output.split()
+    return int(anon) / 1024, int(file) / 1024, float(us)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--samples', type=int, default=5000, help='/api/text-style draws of 5 passages each')
+    args = parser.parse_args()
+
+    if not os.path.exists('/proc/self/status'):
+        sys.exit('RSS is read from /proc; run this on Linux')
+
+    print(f'{"passages":>10} {"file MiB":>9} {"build s":>8} {"mapped anon MiB":>16} {"mapped file MiB":>16} '
+          f'{"list anon MiB":>14} {"mapped us":>10} {"list us":>8}')
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            path = os.path.join(directory, f'{size}.txt')
+            write_corpus(path, size)
+            started = time.perf_counter()
+            corpus.build_index(path)
+            build_seconds = time.perf_counter() - started
+
+            mapped_anon, mapped_file, mapped_us = probe('mapped', path, args.samples)
+            list_anon, _, list_us = probe('list', path, args.samples)
+            print(f'{size:>10} {os.path.getsize(path) / 2 ** 20:>9.1f} {build_seconds:>8.2f} {mapped_anon:>16.1f} '
+                  f'{mapped_file:>16.1f} {list_anon:>14.1f} {mapped_us:>10.1f} {list_us:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
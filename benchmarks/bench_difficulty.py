@@ -0,0 +1,80 @@
+"""Difficulty bands: a lookup in the precomputed index versus scoring the collection per request
+
+For each collection size, "score" is what serving a band would cost without
+the index: score every passage, sort, and pick from the band. "index" is
+the request path as served: slice the band out of the sorted index and
+draw from it. "build" is the one-off cost of scoring the collection at load
+or build time, and "open" is mapping a corpus's prebuilt .dif sidecar.
+
+    python benchmarks/bench_difficulty.py --passages 100 10000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus  # noqa: E402
+from app import TEXT_COLLECTIONS  # noqa: E402
+from difficulty import BANDS, DifficultyIndex, score_text  # noqa: E402
+
+
+def best_us(fn, repeats, calls):
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, (time.perf_counter() - started) / calls)
+    return best * 1e6
+
+
+def synthetic_passages(count, rng):
+    """Passages shuffled together from the built-in sentences, so they vary in difficulty"""
+    sentences = [sentence.strip() + '.' for texts in TEXT_COLLECTIONS.values() for text in texts
+                 for sentence in text.split('.') if sentence.strip()]
+    return [' '.join(rng.sample(sentences, rng.randint(1, 4))) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--passages', type=int, nargs='+', default=[100, 10000, 100000])
+    parser.add_argument('--band', choices=list(BANDS), default='hard')
+    parser.add_argument('--pick', type=int, default=5, help='passages drawn per request')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f'{"passages":>9} {"score ms":>9} {"index us":>9} {"build ms":>9} {"open ms":>8} {".dif bytes":>11}')
+    for size in args.passages:
+        passages = synthetic_passages(size, rng)
+
+        def score_per_request():
+            DifficultyIndex.of(passages).sample(args.band, args.pick, rng)
+
+        started = time.perf_counter()
+        index = DifficultyIndex.of(passages)
+        build_ms = (time.perf_counter() - started) * 1000
+        score_ms = best_us(score_per_request, 1, 1) / 1000
+        index_us = best_us(lambda: index.sample(args.band, args.pick, rng), args.repeats, 10000)
+
+        with tempfile.TemporaryDirectory() as directory:
+            text_path = os.path.join(directory, 'bench' + corpus.TEXT_SUFFIX)
+            with open(text_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(passages) + '\n')
+            corpus.build_index(text_path)
+            started = time.perf_counter()
+            mapped = corpus.Corpus(text_path)
+            open_ms = (time.perf_counter() - started) * 1000
+            dif_bytes = os.path.getsize(text_path[:-len(corpus.TEXT_SUFFIX)] + corpus.DIFFICULTY_SUFFIX)
+            assert abs(score_text(mapped[mapped.difficulty.ids[-1]]) - mapped.difficulty.scores[-1]) < 1e-9
+            del mapped
+
+        print(f'{size:>9} {score_ms:>9.2f} {index_us:>9.2f} {build_ms:>9.2f} {open_ms:>8.2f} {dif_bytes:>11}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Keystroke-log verification cost: decoding plus analysis on the NumPy path and the pure-Python fallback
+
+Builds synthetic logs of a human-paced typist (with occasional typos fixed by
+backspace) and reports how many results per second the server can verify.
+
+    python benchmarks/bench_keystrokes.py --minutes 10 --logs 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import keystroke_analysis  # noqa: E402
+from keystroke_analysis import BACKSPACE, analyze, encode_log  # noqa: E402
+from word_pools import generate_sentences  # noqa: E402
+
+
+def synthetic_log(minutes, wpm, rng):
+    """A log of roughly `minutes` of typing at `wpm`, with ~3% typos each corrected by a backspace"""
+    keystrokes = int(minutes * wpm * 5)
+    text = ' '.join(generate_sentences(keystrokes // 40 + 1, rng=rng))[:keystrokes]
+    mean_interval = 60000 / (wpm * 5)
+    deltas, keys = [], []
+    for char in text:
+        if rng.random() < 0.03:
+            deltas.extend([max(1, int(rng.gauss(mean_interval, mean_interval / 3))), int(mean_interval * 2)])
+            keys.extend([ord('x'), BACKSPACE])
+        deltas.append(max(1, int(rng.gauss(mean_interval, mean_interval / 3))))
+        keys.append(ord(char))
+    return encode_log(deltas, keys), text
+
+
+def measure(logs, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for encoded, text in logs:
+            analyze(encoded, text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=float, default=10)
+    parser.add_argument('--wpm', type=int, default=90)
+    parser.add_argument('--logs', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    logs = [synthetic_log(args.minutes, args.wpm, rng) for _ in range(args.logs)]
+    size = sum(len(encoded) for encoded, _ in logs) / len(logs)
+    print(f'{args.logs} logs of {args.minutes:g} min at {args.wpm} WPM, {size / 1024:.1f} KiB each (base64)')
+
+    numpy_module = keystroke_analysis.np
+    rows = []
+    if numpy_module is not None:
+        rows.append(('NumPy', numpy_module))
+    rows.append(('pure Python', None))
+
+    baseline = None
+    for label, module in rows:
+        keystroke_analysis.np = module
+        try:
+            elapsed = measure(logs, args.repeats)
+        finally:
+            keystroke_analysis.np = numpy_module
+        baseline = baseline or elapsed
+        print(f'  {label:<12} {args.logs / elapsed:9.1f} results/s  {elapsed / args.logs * 1e3:7.2f} ms/result  '
+              f'{elapsed / baseline:5.2f}x time')
+
+
+if __name__ == '__main__':
+    main()
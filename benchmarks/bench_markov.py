@@ -0,0 +1,77 @@
+"""Markov prose versus word-list prose: cost per generated word, and training versus loading a stored model
+
+The per-word figures compare the Markov walk (one alias-table draw per word)
+with the existing uniform word-list generator on its seeded, pure-Python path
+and, when NumPy is installed, its unseeded bulk path. The model figures train
+on a synthetic corpus of the given size, then time saving and reloading it.
+
+    python benchmarks/bench_markov.py --sentences 20000 --passages 50000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import markov  # noqa: E402
+import word_pools  # noqa: E402
+from app import get_markov_model  # noqa: E402
+from word_pools import generate_sentences  # noqa: E402
+
+
+def per_word_ns(generate, sentences, repeats):
+    best = float('inf')
+    words = 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        output = generate(sentences)
+        best = min(best, time.perf_counter() - started)
+        words = sum(len(sentence.split()) for sentence in output)
+    return best / words * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sentences', type=int, default=20000)
+    parser.add_argument('--passages', type=int, default=50000, help='size of the synthetic training corpus')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    model = get_markov_model('english')
+    rng = random.Random(0)
+    rows = [
+        ('word list, seeded', lambda n: generate_sentences(n, rng=rng)),
+        ('markov, seeded', lambda n: model.generate_sentences(n, rng)),
+        ('markov, unseeded', lambda n: model.generate_sentences(n)),
+    ]
+    if word_pools.np is not None:
+        rows.insert(1, ('word list, numpy', lambda n: generate_sentences(n)))
+    for name, generate in rows:
+        print(f'{name:<20} {per_word_ns(generate, args.sentences, args.repeats):8.0f} ns/word')
+
+    # A larger corpus in the curated texts' style, so the tables have realistic fan-out
+    passages = [' '.join(model.generate_sentences(2, rng)) for _ in range(args.passages)]
+    started = time.perf_counter()
+    trained = markov.MarkovModel.train(passages)
+    train_seconds = time.perf_counter() - started
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.bin')
+        started = time.perf_counter()
+        trained.save(path)
+        save_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        loaded = markov.MarkovModel.load(path)
+        load_seconds = time.perf_counter() - started
+        size = os.path.getsize(path)
+    print(f'\n{args.passages} passages: {trained.state_count} states, {len(trained)} transitions, '
+          f'{size / 1024:.0f} KiB on disk')
+    print(f'train {train_seconds * 1000:8.1f} ms   save {save_seconds * 1000:6.1f} ms   '
+          f'load {load_seconds * 1000:6.1f} ms')
+    assert loaded.generate_sentences(5, random.Random(1)) == trained.generate_sentences(5, random.Random(1))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Instrumentation overhead: cost of one metrics observation and of the per-request hooks
+
+The hooks are timed directly inside a request context. The end-to-end figure
+is the difference between requests to a cheap route with recording on and
+off through the Flask test client (best of several alternating rounds, but
+still noisier than the direct measurement).
+
+    python benchmarks/bench_metrics.py --requests 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+from app import app, record_request_metrics, start_request_metrics  # noqa: E402
+
+
+def per_call_us(fn, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--observations', type=int, default=500000)
+    args = parser.parse_args()
+
+    labels = ('/api/text', 'GET', 'type=text,random=true,continuous=false,seeded=false,bucket=30')
+    observe = per_call_us(lambda: metrics.REQUEST_SECONDS.observe(labels, 0.0042), args.observations)
+    record = per_call_us(lambda: metrics.observe_request(*labels, 200, 0.0042, 1200), args.observations)
+    print(f'histogram observe     {observe * 1000:8.0f} ns')
+    print(f'observe_request       {record * 1000:8.0f} ns')
+
+    with app.test_request_context('/api/text?random=true&duration=30'):
+        app.preprocess_request()
+        response = app.make_response(({'text': 'x' * 500}, 200))
+        hooks = per_call_us(lambda: (start_request_metrics(), record_request_metrics(response)), args.requests)
+    print(f'request hooks         {hooks:8.2f} us')
+
+    client = app.test_client()
+    timings = {}
+    for enabled in (False, True) * 5:
+        metrics.ENABLED = enabled
+        timings[enabled] = min(timings.get(enabled, float('inf')),
+                               per_call_us(lambda: client.get('/api/languages'), args.requests))
+    print(f'request, metrics off  {timings[False]:8.1f} us')
+    print(f'request, metrics on   {timings[True]:8.1f} us  (+{timings[True] - timings[False]:.1f} us)')
+
+
+if __name__ == '__main__':
+    main()
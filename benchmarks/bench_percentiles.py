@@ -0,0 +1,93 @@
+"""Percentile sketches versus ranking against sorted results: cost per query and per result, and cross-worker sync
+
+For each history size, "sorted" is what answering a rank query without the
+sketches costs: read the partition's stored values, sort them and bisect.
+The sketch figures are folding a result in, a rank query, serializing one
+sketch, and its worst rank error against the exact answer. The sync figure
+has several PercentileIndex instances (standing in for worker processes)
+share one SQLite file, each merging a batch of new results and picking up
+the others'.
+
+    python benchmarks/bench_percentiles.py --results 1000 100000 1000000 --workers 4
+"""
+import argparse
+import bisect
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from percentiles import DDSketch, PercentileIndex, SketchStore  # noqa: E402
+
+PARTITION = {'test_type': 'time', 'content_type': 'text', 'category': 'tech', 'duration': 30}
+
+
+def best_us(fn, repeats, calls):
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, (time.perf_counter() - started) / calls)
+    return best * 1e6
+
+
+def synthetic_wpm(count, rng):
+    # Typing speeds are roughly log-normal around 40-50 WPM
+    return [min(rng.lognormvariate(3.8, 0.35), 250.0) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--results', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=500, help='results per worker between syncs')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f'{"results":>9} {"sorted us":>10} {"rank us":>8} {"add us":>7} {"bytes":>6} {"max rank err":>12}')
+    for size in args.results:
+        values = synthetic_wpm(size, rng)
+        probes = values[:1000]
+        exact = sorted(values)
+        sorted_us = best_us(lambda: bisect.bisect_left(sorted(values), probes[0]), 1, max(1, 3000000 // size))
+
+        sketch = DDSketch()
+        add_us = best_us(lambda: [sketch.add(value) for value in values], 1, 1) / size
+        rank_us = best_us(lambda: sketch.rank(probes[rng.randrange(1000)]), args.repeats, 10000)
+        error = max(abs(sketch.rank(value) - (bisect.bisect_left(exact, value) + bisect.bisect_right(exact, value))
+                        / 2 / size) for value in probes)
+        print(f'{size:>9} {sorted_us:>10.0f} {rank_us:>8.2f} {add_us:>7.2f} {len(sketch.to_bytes()):>6} {error:>12.4f}')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'results.sqlite3')
+        workers = [PercentileIndex(SketchStore(path)) for _ in range(args.workers)]
+        for worker in workers:
+            worker.open(lambda: [])
+        next_id = 1
+        timings = []
+        for _ in range(args.repeats):
+            for worker in workers:
+                for wpm in synthetic_wpm(args.batch, rng):
+                    worker.add(dict(PARTITION, id=next_id, wpm=wpm, accuracy=95.0))
+                    next_id += 1
+            for worker in workers:
+                started = time.perf_counter()
+                worker.sync()
+                timings.append(time.perf_counter() - started)
+        for worker in workers:
+            worker.sync()
+        counts = {worker.sketch(tuple(PARTITION.values()), 'wpm').count for worker in workers}
+        for worker in workers:
+            worker.close()
+    print(f'\n{args.workers} workers x {args.batch} results per sync: '
+          f'sync {min(timings) * 1000:.2f} ms best, {max(timings) * 1000:.2f} ms worst; '
+          f'every worker sees {sorted(counts)} results (expected {next_id - 1})')
+
+
+if __name__ == '__main__':
+    main()
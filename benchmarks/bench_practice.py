@@ -0,0 +1,85 @@
+"""Practice-text cost: profile updates per result and word selection against growing vocabularies
+
+Builds synthetic vocabularies of increasing size, a profile from a few
+hundred results with realistic miss counts, then times index construction
+(once per language), folding a result into a profile, and building a
+60-second practice text.
+
+    python benchmarks/bench_practice.py --vocabulary 10000 100000 500000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from practice import ErrorProfile, WordIndex  # noqa: E402
+
+LETTERS = string.ascii_lowercase
+# Rough English letter frequencies, so bigram postings have realistic skew
+FREQUENCIES = [8.2, 1.5, 2.8, 4.3, 12.7, 2.2, 2.0, 6.1, 7.0, 0.2, 0.8, 4.0, 2.4,
+               6.7, 7.5, 1.9, 0.1, 6.0, 6.3, 9.1, 2.8, 1.0, 2.4, 0.2, 2.0, 0.1]
+
+
+def synthetic_words(count, rng):
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choices(LETTERS, FREQUENCIES, k=rng.randint(2, 12))))
+    return list(words)
+
+
+def synthetic_mistakes(rng):
+    chars = rng.choices(LETTERS, FREQUENCIES, k=rng.randint(3, 15))
+    mistakes = {'chars': {}, 'bigrams': {}}
+    for char in chars:
+        bigram = rng.choice(LETTERS) + char
+        mistakes['chars'][char] = mistakes['chars'].get(char, 0) + 1
+        mistakes['bigrams'][bigram] = mistakes['bigrams'].get(bigram, 0) + 1
+    return mistakes
+
+
+def best_us(fn, repeats, calls):
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, (time.perf_counter() - started) / calls)
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vocabulary', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--results', type=int, default=300, help='results already in the profile')
+    parser.add_argument('--words', type=int, default=180, help='words per practice text')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    profile = ErrorProfile()
+    for _ in range(args.results):
+        profile.add(synthetic_mistakes(rng))
+    mistakes = [synthetic_mistakes(rng) for _ in range(1000)]
+    update = best_us(lambda: profile.add(mistakes[rng.randrange(1000)]), args.repeats, 1000)
+    # Every update invalidates the cached targets, so this is the first text after a result
+    retarget = best_us(lambda: (profile.add(mistakes[0]), profile.targets()), args.repeats, 1000) - update
+    print(f'profile: {len(profile.chars)} chars, {len(profile.bigrams)} bigrams')
+    print(f'fold in a result {update:8.2f} us   retarget after it {retarget:8.2f} us')
+
+    targets = profile.targets()
+    print(f'\n{"vocabulary":>10} {"index s":>8} {"text us":>8} {"us/word":>8}')
+    for size in args.vocabulary:
+        words = synthetic_words(size, rng)
+        started = time.perf_counter()
+        index = WordIndex(words)
+        build_seconds = time.perf_counter() - started
+        text = best_us(lambda: index.practice_words(targets, args.words, rng), args.repeats, 200)
+        print(f'{size:>10} {build_seconds:>8.2f} {text:>8.1f} {text / args.words:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""Race-room load generator: broadcast latency and server CPU per connected player
+
+Starts the ASGI server (one uvicorn worker) with a fresh database, opens
+ROOMS race rooms of PLAYERS players each, and subscribes every player to
+its room's event stream. Once the races have started, every player reports
+progress every INTERVAL seconds over a shared pool of keep-alive
+connections. Latency is measured from sending a report to each peer
+receiving the progress event that carries it, so it includes the wait for
+the next tick. CPU is the server process's user+system time over the
+measurement window.
+
+    python benchmarks/bench_races.py --rooms 1000 --players 4 --interval 0.2 --seconds 10
+
+Pass --url to drive an already running server (CPU is then not reported).
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+from urllib.parse import urlsplit
+
+from load_test import start_server
+
+COUNTDOWN_SLACK = 0.5
+
+
+async def read_head(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return int(status_line.split(b' ', 2)[1]), headers
+
+
+async def request_json(connection, host, method, path, payload=None):
+    """One request on a keep-alive (reader, writer) pair"""
+    reader, writer = connection
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+    await writer.drain()
+    status, headers = await read_head(reader)
+    data = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, json.loads(data) if data else None
+
+
+async def subscribe(host, port, room, slot, sent, latencies, ready):
+    """Read a room's event stream, timing every progress entry another player sent"""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f'GET /api/races/{room}/events HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode('latin-1'))
+    await writer.drain()
+    status, headers = await read_head(reader)
+    if status != 200:
+        raise RuntimeError(f'event stream for {room} returned {status}')
+    chunked = headers.get('transfer-encoding', '').lower() == 'chunked'
+    ready.release()
+    buffer = b''
+    try:
+        while True:
+            if chunked:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    return
+                buffer += await reader.readexactly(size + 2)
+                buffer = buffer[:-2]
+            else:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                buffer += data
+            *events, buffer = buffer.split(b'\n\n')
+            received = time.perf_counter()
+            for event in events:
+                if not event.startswith(b'event: progress'):
+                    continue
+                payload = json.loads(event.split(b'\ndata: ', 1)[1])
+                for player, progress, _, _ in payload['players']:
+                    started = sent.get((room, player, progress))
+                    if started is not None and player != slot:
+                        latencies.append(received - started)
+    except (asyncio.CancelledError, ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def report(host, port, rooms, interval, deadline, sent, failures, offset):
+    """Progress reports for a share of the players, in turn, on one connection"""
+    connection = await asyncio.open_connection(host, port)
+    await asyncio.sleep(offset)
+    progress = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        progress += 1
+        for room, tokens in rooms:
+            for slot, token in enumerate(tokens):
+                sent[(room, slot, progress)] = time.perf_counter()
+                status, _ = await request_json(connection, host, 'POST', f'/api/races/{room}/progress',
+                                               {'token': token, 'progress': progress, 'wpm': 60})
+                if status != 200:
+                    failures.append(status)
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+    connection[1].close()
+
+
+def process_cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+async def run(url, pid, args):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    setup = await asyncio.open_connection(host, port)
+
+    rooms = []
+    for _ in range(args.rooms):
+        status, created = await request_json(setup, host, 'POST', '/api/races',
+                                             {'query': 'type=text&random=true&duration=60'})
+        if status != 200:
+            raise RuntimeError(f'creating a race returned {status}: {created}')
+        tokens = [created['token']]
+        for _ in range(args.players - 1):
+            _, joined = await request_json(setup, host, 'POST', f'/api/races/{created["room"]}/join', {})
+            tokens.append(joined['token'])
+        rooms.append((created['room'], tokens))
+
+    sent, latencies, failures = {}, [], []
+    ready = asyncio.Semaphore(0)
+    streams = [asyncio.ensure_future(subscribe(host, port, room, slot, sent, latencies, ready))
+               for room, tokens in rooms for slot in range(len(tokens))]
+    for _ in streams:
+        await ready.acquire()
+    for room, tokens in rooms:
+        await request_json(setup, host, 'POST', f'/api/races/{room}/start', {'token': tokens[0]})
+    _, state = await request_json(setup, host, 'GET', f'/api/races/{rooms[-1][0]}')
+    await asyncio.sleep(max(0.0, state['start_at'] / 1000 - time.time()) + COUNTDOWN_SLACK)
+
+    cpu_before = process_cpu_seconds(pid) if pid else None
+    started = time.perf_counter()
+    deadline = started + args.seconds
+    shares = [rooms[i::args.connections] for i in range(min(args.connections, len(rooms)))]
+    await asyncio.gather(*(
+        report(host, port, share, args.interval, deadline, sent, failures, args.interval * i / len(shares))
+        for i, share in enumerate(shares)
+    ))
+    await asyncio.sleep(0.5)  # Let the last ticks arrive
+    elapsed = time.perf_counter() - started
+    cpu = process_cpu_seconds(pid) - cpu_before if pid else None
+
+    for stream in streams:
+        stream.cancel()
+    await asyncio.gather(*streams, return_exceptions=True)
+    setup[1].close()
+    # The setup connection has sat idle past the server's keep-alive timeout
+    stats_connection = await asyncio.open_connection(host, port)
+    _, stats = await request_json(stats_connection, host, 'GET', '/api/stats')
+    stats_connection[1].close()
+    return latencies, failures, elapsed, cpu, stats['races']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=0.2, help='seconds between one player\'s reports')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--connections', type=int, default=64, help='keep-alive connections carrying reports')
+    parser.add_argument('--url', help='an already running server instead of starting one')
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))  # The server inherits it too
+    process = None
+    if args.url:
+        url, pid = args.url, None
+    else:
+        process, url = start_server('asgi', 1)
+        pid = process.pid
+    try:
+        latencies, failures, elapsed, cpu, stats = asyncio.run(run(url, pid, args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    players = args.rooms * args.players
+    latencies.sort()
+    print(f'{args.rooms} rooms x {args.players} players, one report per player every {args.interval:g}s, '
+          f'{elapsed:.1f}s; {stats["broadcasts"]} broadcasts, {stats["deliveries"]} deliveries')
+    if latencies:
+        print(f'broadcast latency  p50 {statistics.median(latencies) * 1e3:7.1f} ms  '
+              f'p95 {latencies[int(len(latencies) * 0.95)] * 1e3:7.1f} ms  '
+              f'p99 {latencies[int(len(latencies) * 0.99)] * 1e3:7.1f} ms  ({len(latencies)} samples)')
+    if cpu is not None:
+        print(f'server cpu {cpu / elapsed * 100:6.1f}% of a core, {cpu / elapsed / players * 1e6:7.1f} us/s '
+              f'per connected player')
+    if failures:
+        print(f'{len(failures)} failed reports')
+    sys.exit(1 if failures or not latencies else 0)
+
+
+if __name__ == '__main__':
+    main()
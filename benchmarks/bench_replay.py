@@ -0,0 +1,85 @@
+"""Replay storage: bytes per keystroke, encode/decode throughput, and time to the first playable chunk
+
+Builds the same synthetic logs as bench_keystrokes.py (human-paced typing with
+~3% typos fixed by backspace) at several speeds. "log B/ks" is the packed
+log the client uploads (4 bytes a keystroke before base64); "replay B/ks"
+is the stored replay including its text, and "keys B/ks" the chunks and
+their index alone. "first us" is what playback waits for before its first
+keystroke: parsing the header and decoding one chunk.
+
+    python benchmarks/bench_replay.py --minutes 1 --wpm 40 90 140 --logs 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import replay  # noqa: E402
+from bench_keystrokes import synthetic_log  # noqa: E402
+from keystroke_analysis import decode_log  # noqa: E402
+
+
+def best_us(fn, repeats, calls):
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, (time.perf_counter() - started) / calls)
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=float, default=1)
+    parser.add_argument('--wpm', type=int, nargs='+', default=[40, 90, 140])
+    parser.add_argument('--logs', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{args.logs} logs of {args.minutes:g} min each, {replay.CHUNK_MS} ms chunks')
+    print(f'{"wpm":>4} {"keystrokes":>10} {"log B/ks":>8} {"replay B/ks":>11} {"keys B/ks":>9} '
+          f'{"encode ks/s":>12} {"decode ks/s":>12} {"first us":>9}')
+    rng = random.Random(0)
+    for wpm in args.wpm:
+        logs = []
+        for _ in range(args.logs):
+            encoded, text = synthetic_log(args.minutes, wpm, rng)
+            deltas, keys = decode_log(encoded)
+            logs.append((deltas.tolist(), keys.tolist(), text))
+        blobs = [replay.encode(deltas, keys, text) for deltas, keys, text in logs]
+        keystrokes = sum(len(keys) for _, keys, _ in logs)
+
+        # Everything but the magic, header size and compressed text
+        text_bytes = sum(len(replay._deflate(text.encode('utf-8'))) + replay.PREFIX.size for _, _, text in logs)
+        total_bytes = sum(len(blob) for blob in blobs)
+
+        def encode_all():
+            for deltas, keys, text in logs:
+                replay.encode(deltas, keys, text)
+
+        def decode_all():
+            for blob in blobs:
+                for _ in replay.decode(blob)[1]:
+                    pass
+
+        def first_chunk():
+            for blob in blobs:
+                recording = replay.Replay.parse(blob[:replay.Replay.header_size(blob)])
+                chunk = recording.chunks[0]
+                recording.decode_chunk(chunk, blob[chunk.offset:chunk.offset + chunk.size])
+
+        encode_us = best_us(encode_all, args.repeats, 1)
+        decode_us = best_us(decode_all, args.repeats, 1)
+        first_us = best_us(first_chunk, args.repeats, 1) / len(blobs)
+        print(f'{wpm:>4} {keystrokes // len(logs):>10} {4.0:>8.2f} {total_bytes / keystrokes:>11.2f} '
+              f'{(total_bytes - text_bytes) / keystrokes:>9.2f} {keystrokes / encode_us * 1e6:>12.0f} '
+              f'{keystrokes / decode_us * 1e6:>12.0f} {first_us:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
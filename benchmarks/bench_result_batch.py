@@ -0,0 +1,101 @@
+"""Per-result cost of saving results one POST at a time versus batched with idempotency keys
+
+Runs the app in-process against a fresh database. "single" posts results
+one by one to /api/result (sequentially, then from --threads threads at
+once, as a burst of clients would). "keyed" is the same with an idempotency
+key on each. "batch N" posts them to /api/results/batch N at a time, and
+"retry N" resends batches that were already saved, which is what a client
+that lost the responses does. Commits counts the SQLite transactions the
+writer made.
+
+    python benchmarks/bench_result_batch.py --results 2000 --threads 16 --batches 10 50 100
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RESULT = {'wpm': 80, 'accuracy': 97, 'duration': 30, 'test_type': 'time', 'content_type': 'text',
+          'language': 'english', 'category': 'tech'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--results', type=int, default=2000, help='results saved per mode')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--batches', type=int, nargs='+', default=[10, 50, 100])
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ['TYPEXI_DB_PATH'] = os.path.join(directory, 'results.sqlite3')
+    import app as typexi
+
+    client = typexi.app.test_client()
+    store = typexi.get_result_store()
+    keys = (f'key-{i}' for i in itertools.count())
+    client.post('/api/result', json=RESULT)  # Open the store and build the indexes outside the timings
+
+    def measure(label, run):
+        commits = store.commits
+        started = time.perf_counter()
+        count = run()
+        elapsed = time.perf_counter() - started
+        print(f'{label:<22} {elapsed / count * 1e6:>9.1f} {count / elapsed:>10.0f} {store.commits - commits:>8}')
+
+    def single(keyed):
+        def run():
+            for _ in range(args.results):
+                payload = dict(RESULT, idempotency_key=next(keys)) if keyed else RESULT
+                assert client.post('/api/result', json=payload).status_code == 200
+            return args.results
+        return run
+
+    def burst():
+        share = args.results // args.threads
+
+        def post_share():
+            for _ in range(share):
+                assert client.post('/api/result', json=RESULT).status_code == 200
+        threads = [threading.Thread(target=post_share) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return share * args.threads
+
+    def batched(size, sent):
+        def run():
+            for start in range(0, args.results, size):
+                batch = [dict(RESULT, idempotency_key=next(keys)) for _ in range(min(size, args.results - start))]
+                response = client.post('/api/results/batch', json={'results': batch})
+                assert response.get_json()['created'] == len(batch)
+                sent.append(batch)
+            return args.results
+        return run
+
+    def retried(sent):
+        def run():
+            for batch in sent:
+                assert client.post('/api/results/batch', json={'results': batch}).get_json()['duplicates'] == len(batch)
+            return sum(len(batch) for batch in sent)
+        return run
+
+    print(f'{"mode":<22} {"us/result":>9} {"results/s":>10} {"commits":>8}')
+    measure('single', single(False))
+    measure(f'single x{args.threads} threads', burst)
+    measure('keyed', single(True))
+    for size in args.batches:
+        sent = []
+        measure(f'batch {size}', batched(size, sent))
+        measure(f'retry {size}', retried(sent))
+    store.close()
+    print(f'\nidempotency: {typexi.get_recent_keys().stats()}')
+
+
+if __name__ == '__main__':
+    main()
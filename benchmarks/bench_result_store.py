@@ -0,0 +1,78 @@
+"""Sustained POST /api/result throughput with several worker processes sharing one SQLite file
+
+Each process stands in for a WSGI worker: it imports the app, opens its own
+ResultStore on the shared database and drives /api/result from a pool of
+request threads. Run with --batch-size 1 to see the cost without group commit.
+
+    python benchmarks/bench_result_store.py --workers 4 --threads 16 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_worker(db_path, batch_size, threads, seconds, counts):
+    os.environ['TYPEXI_DB_PATH'] = db_path
+    os.environ['TYPEXI_DB_BATCH'] = str(batch_size)
+    import app as typexi
+
+    client = typexi.app.test_client()
+    deadline = time.perf_counter() + seconds
+    done = [0] * threads
+
+    def request_loop(slot):
+        payload = {'wpm': 80, 'accuracy': 97, 'duration': 30, 'test_type': 'time'}
+        while time.perf_counter() < deadline:
+            response = client.post('/api/result', json=payload)
+            assert response.status_code == 200, response.get_data(as_text=True)
+            done[slot] += 1
+
+    workers = [threading.Thread(target=request_loop, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+    store = typexi.get_result_store()
+    counts.put((sum(done), store.commits))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--batch-size', type=int, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.sqlite3')
+        counts = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=run_worker,
+                                    args=(db_path, args.batch_size, args.threads, args.seconds, counts))
+            for _ in range(args.workers)
+        ]
+        started = time.perf_counter()
+        for p in procs:
+            p.start()
+        results = [counts.get() for _ in procs]
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - started
+
+    inserts = sum(n for n, _ in results)
+    commits = sum(c for _, c in results)
+    print(f'workers={args.workers} threads/worker={args.threads} batch_size={args.batch_size}')
+    print(f'inserts={inserts} commits={commits} rows/commit={inserts / max(commits, 1):.1f}')
+    print(f'sustained inserts/sec={inserts / elapsed:.0f}')
+
+
+if __name__ == '__main__':
+    main()
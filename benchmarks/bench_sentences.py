@@ -0,0 +1,72 @@
+"""Sentence generation cost: the per-sentence generator versus the bulk generate_sentences API
+
+Compares the original per-call generator and ContentGenerator.generate_random_sentence
+in a loop against
+generate_sentences drawing every word index at once, on the NumPy path (when
+installed) and the pure-Python fallback.
+
+    python benchmarks/bench_sentences.py --sentences 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import word_pools  # noqa: E402
+from app import ContentGenerator  # noqa: E402
+from word_pools import generate_sentences, get_word_pool  # noqa: E402
+
+
+def legacy_sentence(word_list):
+    """The generator as it was: rebuilds the list and the ending lambdas on every call"""
+    words = random.choices(word_list, k=random.randint(5, 20))
+    words[0] = words[0].capitalize()
+    sentence_types = [
+        lambda w: ' '.join(w) + '.',
+        lambda w: ' '.join(w) + '!',
+        lambda w: ' '.join(w) + '?',
+        lambda w: ' '.join(w) + '...',
+    ]
+    return random.choice(sentence_types)(words)
+
+
+def best_of(repeats, fn):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sentences', type=int, default=5000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    n = args.sentences
+
+    for category in ('common', 'tech', 'common_weighted'):
+        pool = get_word_pool(category)
+        words = list(pool.words)
+        rows = [
+            ('legacy loop', lambda: [legacy_sentence(words) for _ in range(n)]),
+            ('per-sentence loop', lambda: [ContentGenerator.generate_random_sentence(word_list=pool) for _ in range(n)]),
+            ('bulk, pure Python', lambda: generate_sentences(n, pool=pool, rng=random.Random())),
+        ]
+        if word_pools.np is not None:
+            rows.append(('bulk, NumPy', lambda: generate_sentences(n, pool=pool)))
+
+        baseline = None
+        print(f'\n{category} pool ({len(pool)} words), {n} sentences')
+        for label, fn in rows:
+            elapsed = best_of(args.repeats, fn)
+            baseline = baseline or elapsed
+            print(f'  {label:<20} {elapsed / n * 1e6:8.2f} us/sentence  {baseline / elapsed:5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Cold-start cost: import time and time to first response, eager versus lazy startup, with and without a snapshot
+
+Each sample is a fresh interpreter, like a serverless cold start. It
+imports the app, then serves one request through the test client and
+reports both times. The eager mode is how the app started before lazy
+startup existed. The snapshot runs first write one to a temporary file with
+`python startup.py snapshot`.
+
+    python benchmarks/bench_startup.py --runs 10 --path '/api/bootstrap' --path '/api/text?random=true'
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import startup  # noqa: E402
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get({path!r})
+assert response.status_code == 200, response.status_code
+served = time.perf_counter()
+print(json.dumps({{'import_ms': (imported - started) * 1000, 'first_ms': (served - imported) * 1000}}))
+'''
+
+
+def sample(path, env):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', PROBE.format(root=ROOT, path=path)], env=env,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output)
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', action='append', help='first request (repeatable)')
+    parser.add_argument('--budget-ms', type=float, default=startup.BUDGET_MS, help='import-time budget')
+    args = parser.parse_args()
+    paths = args.path or ['/api/bootstrap', '/api/text?random=true&duration=60',
+                          '/api/text?practice=true&user=bench&duration=60']
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'results.sqlite3')
+        snapshot_path = os.path.join(directory, 'snapshot.pickle')
+        base = dict(os.environ, TYPEXI_DB_PATH=db_path, TYPEXI_SNAPSHOT=os.path.join(directory, 'none.pickle'))
+        subprocess.run([sys.executable, os.path.join(ROOT, 'startup.py'), 'snapshot', snapshot_path],
+                       env=base, check=True, capture_output=True)
+        configs = [
+            ('eager (before)', dict(base, TYPEXI_STARTUP='eager')),
+            ('lazy', dict(base, TYPEXI_STARTUP='lazy')),
+            ('lazy + snapshot', dict(base, TYPEXI_STARTUP='lazy', TYPEXI_SNAPSHOT=snapshot_path)),
+        ]
+
+        print(f'median of {args.runs} fresh processes; import budget {args.budget_ms:g} ms')
+        print(f'{"first request":<48} {"mode":<16} {"import ms":>10} {"first ms":>9} {"process ms":>11}')
+        over_budget = False
+        for path in paths:
+            for name, env in configs:
+                runs = [sample(path, env) for _ in range(args.runs)]
+                import_ms = statistics.median(run['import_ms'] for run in runs)
+                first_ms = statistics.median(run['first_ms'] for run in runs)
+                process_ms = statistics.median(run['process_ms'] for run in runs)
+                over = import_ms > args.budget_ms
+                over_budget = over_budget or (over and name != 'eager (before)')
+                print(f'{path:<48} {name:<16} {import_ms:>10.1f} {first_ms:>9.1f} {process_ms:>11.1f}'
+                      f'{"  over budget" if over else ""}')
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
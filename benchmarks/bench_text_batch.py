@@ -0,0 +1,48 @@
+"""Per-text server cost: N separate /api/text calls versus one /api/text/batch?count=N
+
+The content pool is disabled so both paths pay for generation on the request.
+
+    python benchmarks/bench_text_batch.py --count 5 --rounds 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['TYPEXI_POOL_DEPTH'] = '0'
+
+import app as typexi  # noqa: E402
+
+QUERIES = [
+    'type=text&random=true&category=tech&duration=60',
+    'type=text&random=true&category=science&duration=30',
+    'type=code&random=true&code_language=python&duration=60',
+    'type=text&random=false&category=philosophy&duration=30',
+]
+
+
+def per_text_us(client, url, rounds, texts_per_call):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        response = client.get(url)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return (time.perf_counter() - started) / (rounds * texts_per_call) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=5)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    client = typexi.app.test_client()
+    print(f'{"query":<58} {"single us/text":>15} {"batch us/text":>14} {"speedup":>8}')
+    for query in QUERIES:
+        single = per_text_us(client, f'/api/text?{query}', args.rounds * args.count, 1)
+        batch = per_text_us(client, f'/api/text/batch?count={args.count}&{query}', args.rounds, args.count)
+        print(f'{query:<58} {single:>15.1f} {batch:>14.1f} {single / batch:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""HTTP load test: requests/sec and latency percentiles for the WSGI and ASGI deployments
+
+Starts each server on a free local port with a fresh result database, then
+drives it from many concurrent keep-alive connections with a mix of
+/api/text reads and /api/result submissions.
+
+    python benchmarks/load_test.py --target both --connections 200 --seconds 10
+
+The WSGI side runs under gunicorn (gthread workers) when it is installed and
+falls back to Werkzeug's threaded server; the ASGI side needs uvicorn. Pass
+--url to load an already running server instead.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+READ_PATHS = [
+    '/api/text?type=text&random=true&category=tech&duration=30',
+    '/api/text?type=text&random=false&category=science&duration=60',
+    '/api/text?type=code&random=true&code_language=python&duration=30',
+    '/api/bootstrap',
+]
+
+RESULT = json.dumps({
+    'wpm': 72, 'accuracy': 96, 'time_taken': 30, 'characters_typed': 180, 'errors': 4,
+    'test_type': 'time', 'content_type': 'text', 'language': 'english', 'category': 'tech', 'duration': 30,
+}).encode('utf-8')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(target, port, workers):
+    if target == 'asgi':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--port', str(port),
+                '--workers', str(workers), '--log-level', 'warning', '--no-access-log']
+    if importlib.util.find_spec('gunicorn') is not None:
+        return [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+                '--workers', str(workers), '--worker-class', 'gthread', '--threads', '8', '--log-level', 'warning']
+    return [sys.executable, '-c', f'from app import app; app.run(port={port}, threaded=True)']
+
+
+def start_server(target, workers):
+    port = free_port()
+    env = dict(os.environ, TYPEXI_DB_PATH=os.path.join(tempfile.mkdtemp(), 'load_test.sqlite3'))
+    process = subprocess.Popen(server_command(target, port, workers), cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url + '/api/languages', timeout=1).read()
+            return process, url
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{target} server did not start: {" ".join(server_command(target, port, workers))}')
+
+
+async def read_response(reader):
+    """Read one HTTP/1.x response; returns (status, keep_alive)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    version, status = status_line.split(b' ', 2)[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()
+        return int(status), False
+
+    keep_alive = version == b'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+    return int(status), keep_alive
+
+
+async def connection(host, port, deadline, write_ratio, latencies, failures, rng):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection(host, port)
+        if rng.random() < write_ratio:
+            head = (f'POST /api/result HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                    f'Content-Length: {len(RESULT)}\r\n\r\n')
+            payload = head.encode('latin-1') + RESULT
+        else:
+            payload = f'GET {rng.choice(READ_PATHS)} HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode('latin-1')
+
+        started = time.perf_counter()
+        try:
+            writer.write(payload)
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            failures.append('connection')
+            writer.close()
+            writer = None
+            continue
+        latencies.append(time.perf_counter() - started)
+        if status >= 400:
+            failures.append(status)
+        if not keep_alive:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(url, connections, seconds, write_ratio):
+    parts = urlsplit(url)
+    latencies, failures = [], []
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        connection(parts.hostname, parts.port or 80, deadline, write_ratio, latencies, failures, random.Random(i))
+        for i in range(connections)
+    ))
+    return latencies, failures, time.perf_counter() - started
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def report(label, latencies, failures, elapsed):
+    latencies.sort()
+    print(f'{label:<6} {len(latencies) / elapsed:9.0f} req/s  p50 {percentile(latencies, 0.5) * 1e3:7.1f} ms  '
+          f'p99 {percentile(latencies, 0.99) * 1e3:7.1f} ms  errors {len(failures)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', choices=('wsgi', 'asgi', 'both'), default='both')
+    parser.add_argument('--url', help='load this running server instead of starting one')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--connections', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.1, help='share of requests that POST a result')
+    args = parser.parse_args()
+
+    print(f'{args.connections} connections, {args.seconds:g}s, {args.write_ratio:.0%} result submissions')
+    if args.url:
+        report('server', *asyncio.run(run_load(args.url, args.connections, args.seconds, args.write_ratio)))
+        return
+
+    for target in (('wsgi', 'asgi') if args.target == 'both' else (args.target,)):
+        process, url = start_server(target, args.workers)
+        try:
+            report(target, *asyncio.run(run_load(url, args.connections, args.seconds, args.write_ratio)))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+"""Benchmark suite: generator microbenchmarks plus a per-route load test, written to a JSON file
+
+Runs entirely locally. The microbenchmarks time ContentGenerator's sentence,
+paragraph and code generators at several sizes. The load test starts the app
+under Werkzeug's threaded WSGI server (HTTP/1.1 keep-alive) in a subprocess
+and drives every route from concurrent connections, one scenario at a time,
+recording throughput and p50/p95/p99 latency. Allocations are measured
+separately, in-process through the test client under tracemalloc, as the
+peak traced memory per request and per generator call.
+
+    python benchmarks/suite.py                                  # writes benchmarks/results/<commit>.json
+    python benchmarks/suite.py --compare benchmarks/results/<old>.json --fail-on-regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('TYPEXI_DB_PATH', os.path.join(tempfile.mkdtemp(), 'suite.sqlite3'))
+
+from load_test import free_port, read_response  # noqa: E402
+
+RESULT_BODY = {
+    'wpm': 72, 'accuracy': 96, 'time_taken': 30, 'characters_typed': 180, 'errors': 4,
+    'test_type': 'time', 'content_type': 'text', 'language': 'english', 'category': 'tech', 'duration': 30,
+}
+
+SERVER = '''
+import sys
+sys.path.insert(0, {root!r})
+from werkzeug.serving import WSGIRequestHandler, make_server
+from app import app
+
+class KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+make_server('127.0.0.1', {port}, app, threaded=True, request_handler=KeepAliveHandler).serve_forever()
+'''
+
+
+# Microbenchmarks
+
+def micro_cases():
+    from app import ContentGenerator, get_markov_model
+    cases = []
+    for min_words, max_words in ((3, 6), (5, 20), (20, 40)):
+        cases.append((f'sentence[{min_words}-{max_words} words]',
+                      lambda a=min_words, b=max_words: ContentGenerator.generate_random_sentence(a, b)))
+    for sentences in (3, 10, 30):
+        cases.append((f'paragraph[{sentences} sentences]',
+                      lambda n=sentences: ContentGenerator.generate_random_paragraph(n)))
+    model = get_markov_model('english')
+    for sentences in (3, 10, 30):
+        cases.append((f'markov_paragraph[{sentences} sentences]',
+                      lambda n=sentences: ContentGenerator.generate_natural_paragraphs(1, n, model)))
+    for language in ('python', 'javascript', 'java', 'default'):
+        cases.append((f'code_snippet[{language}]',
+                      lambda lang=language: ContentGenerator.generate_random_code_snippet(lang)))
+    return cases
+
+
+def peak_alloc_kib(fn, calls):
+    """Median peak traced memory over `calls` invocations"""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(calls):
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            fn()
+            peaks.append(tracemalloc.get_traced_memory()[1] - start)
+    finally:
+        tracemalloc.stop()
+    return statistics.median(peaks) / 1024
+
+
+def run_micro(seconds, alloc_calls):
+    results = {}
+    for name, fn in micro_cases():
+        fn()  # Warm up lazily built pools and templates
+        calls = 0
+        deadline = time.perf_counter() + seconds
+        started = time.perf_counter()
+        while time.perf_counter() < deadline:
+            for _ in range(100):
+                fn()
+            calls += 100
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            'calls_per_sec': round(calls / elapsed, 1),
+            'us_per_call': round(elapsed / calls * 1e6, 3),
+            'peak_alloc_kib': round(peak_alloc_kib(fn, alloc_calls), 2),
+        }
+        print(f'  {name:<32} {results[name]["us_per_call"]:10.2f} us/call  '
+              f'{results[name]["peak_alloc_kib"]:8.1f} KiB peak')
+    return results
+
+
+# Load test scenarios
+
+def scenarios(cursor):
+    """(name, method, path, json body) for every route; /api/text in all type/random/duration combinations"""
+    cases = []
+    for content_type, extra in (('text', 'category=tech'), ('code', 'code_language=python')):
+        for random_mode in ('false', 'true'):
+            for duration in (15, 30, 60):
+                query = f'type={content_type}&random={random_mode}&duration={duration}&{extra}'
+                cases.append((f'GET /api/text?{query}', 'GET', f'/api/text?{query}', None))
+    cases += [
+        ('GET /api/text?continuous', 'GET', '/api/text?random=true&continuous=true&duration=60', None),
+        ('GET /api/text?generator=markov', 'GET', '/api/text?random=true&generator=markov&duration=60', None),
+        ('GET /api/text?seed', 'GET', '/api/text?random=true&seed=42&duration=60', None),
+        ('GET /api/text/batch', 'GET', '/api/text/batch?random=true&count=5', None),
+        ('GET /api/text/more', 'GET', f'/api/text/more?cursor={cursor}&chunks=3', None),
+        ('GET /api/text/stream', 'GET', f'/api/text/stream?cursor={cursor}&chunks=20', None),
+        ('GET /api/random-words', 'GET', '/api/random-words?count=50&category=tech', None),
+        ('GET /api/generate-sentence', 'GET', '/api/generate-sentence', None),
+        ('GET /api/generate-paragraph', 'GET', '/api/generate-paragraph?sentences=5', None),
+        ('GET /api/categories', 'GET', '/api/categories?language=english', None),
+        ('GET /api/languages', 'GET', '/api/languages', None),
+        ('GET /api/bootstrap', 'GET', '/api/bootstrap', None),
+        ('POST /api/result', 'POST', '/api/result', RESULT_BODY),
+        ('GET /api/result/<id>', 'GET', '/api/result/1', None),
+        ('GET /api/leaderboard', 'GET', '/api/leaderboard?window=all&limit=10', None),
+        ('GET /api/percentiles', 'GET', '/api/percentiles?wpm=60&accuracy=95', None),
+        ('GET /api/stats', 'GET', '/api/stats', None),
+    ]
+    return cases
+
+
+def encode_request(method, path, body):
+    head = f'{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+    if body is None:
+        return (head + '\r\n').encode('latin-1')
+    payload = json.dumps(body).encode('utf-8')
+    head += f'Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n'
+    return head.encode('latin-1') + payload
+
+
+async def drive(port, request, connections, seconds):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+
+    async def connection():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                writer.write(request)
+                await writer.drain()
+                status, keep_alive = await read_response(reader)
+                latencies.append(time.perf_counter() - started)
+                errors += status >= 400
+                if not keep_alive:
+                    writer.close()
+                    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(connections)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))] if sorted_values else 0.0
+
+
+def request_allocations(cases, calls):
+    """Median per-request peak traced memory, measured in-process through the Flask test client"""
+    from app import app
+    client = app.test_client()
+    results = {}
+    for name, method, path, body in cases:
+        def call():
+            response = client.open(path, method=method, json=body)
+            response.get_data()
+            response.close()
+        call()
+        results[name] = round(peak_alloc_kib(call, calls), 2)
+    return results
+
+
+def run_load(connections, seconds, alloc_calls):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, '-c', SERVER.format(root=ROOT, port=port)], cwd=ROOT,
+                              env=dict(os.environ), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        for _ in range(150):
+            try:
+                urllib.request.urlopen(base + '/api/languages', timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.2)
+        else:
+            raise RuntimeError('WSGI server did not start')
+
+        # Seed what the read scenarios depend on: a saved result and a continuation cursor
+        urllib.request.urlopen(urllib.request.Request(
+            base + '/api/result', json.dumps(RESULT_BODY).encode(), {'Content-Type': 'application/json'})).read()
+        cursor = json.loads(urllib.request.urlopen(base + '/api/text?random=true&continuous=true').read())['cursor']
+
+        cases = scenarios(cursor)
+        results = {}
+        for name, method, path, body in cases:
+            latencies, errors, elapsed = asyncio.run(drive(port, encode_request(method, path, body),
+                                                           connections, seconds))
+            latencies.sort()
+            results[name] = {
+                'requests': len(latencies),
+                'rps': round(len(latencies) / elapsed, 1),
+                'p50_ms': round(percentile(latencies, 0.50) * 1e3, 3),
+                'p95_ms': round(percentile(latencies, 0.95) * 1e3, 3),
+                'p99_ms': round(percentile(latencies, 0.99) * 1e3, 3),
+                'errors': errors,
+            }
+            print(f'  {name:<70} {results[name]["rps"]:8.0f} req/s  p50 {results[name]["p50_ms"]:7.2f}  '
+                  f'p95 {results[name]["p95_ms"]:7.2f}  p99 {results[name]["p99_ms"]:7.2f} ms  errors {errors}')
+    finally:
+        server.terminate()
+        server.wait()
+
+    for name, kib in request_allocations(cases, alloc_calls).items():
+        results[name]['peak_alloc_kib'] = kib
+    return results
+
+
+# Reporting
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current, baseline, threshold):
+    """Print changes against a previous run; returns the regressions beyond threshold"""
+    regressions = []
+    checks = (('micro', 'us_per_call', 1), ('load', 'rps', -1), ('load', 'p99_ms', 1))
+    print(f'\nCompared with {baseline["commit"]} (threshold {threshold:.0%})')
+    for section, metric, direction in checks:
+        for name, values in current[section].items():
+            old = baseline.get(section, {}).get(name, {}).get(metric)
+            if not old:
+                continue
+            change = (values[metric] - old) / old
+            worse = change * direction > threshold
+            if worse:
+                regressions.append(f'{name} {metric}')
+            if worse or abs(change) > threshold:
+                print(f'  {"REGRESSION" if worse else "improved":<10} {name:<70} {metric:<12} '
+                      f'{old:>10} -> {values[metric]:<10} ({change:+.1%})')
+    if not regressions:
+        print('  no regressions')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='result file (default benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='previous result file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change that counts as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--micro-seconds', type=float, default=1.0, help='time per microbenchmark')
+    parser.add_argument('--load-seconds', type=float, default=3.0, help='time per load scenario')
+    parser.add_argument('--connections', type=int, default=16)
+    parser.add_argument('--alloc-calls', type=int, default=50, help='calls sampled per allocation measurement')
+    parser.add_argument('--skip-load', action='store_true')
+    args = parser.parse_args()
+    random.seed(0)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+    }
+    print('Microbenchmarks')
+    report['micro'] = run_micro(args.micro_seconds, args.alloc_calls)
+    if args.skip_load:
+        report['load'] = {}
+    else:
+        print(f'\nLoad test ({args.connections} connections, {args.load_seconds:g}s per route)')
+        report['load'] = run_load(args.connections, args.load_seconds, args.alloc_calls)
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', f'{report["commit"]}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f'\nWrote {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Code snippet templates loaded from data/code_templates/<language>.tmpl and compiled once into slot form
+
+A .tmpl file holds one or more templates separated by lines containing only
+`---`. Identifiers are written as slots: {{var1}}, {{func1}}, ... bind one
+name for the whole snippet (distinct numbers get distinct names), a
+capitalized slot such as {{Var1}} reuses that binding with a capital
+letter, and an unnumbered {{var}} draws a fresh name every time.
+Adding a language means dropping a new .tmpl file into the directory.
+Each template is scored for difficulty as it is compiled, with every slot
+standing in as its pool's first name, so snippets can be drawn by band.
+"""
+import os
+import random
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import startup
+from difficulty import DifficultyIndex, score_text
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'code_templates')
+TEMPLATE_SUFFIX = '.tmpl'
+TEMPLATE_SEPARATOR = re.compile(r'^---[ \t]*$', re.MULTILINE)
+FALLBACK_LANGUAGE = 'default'
+
+SLOT = re.compile(r'\{\{([A-Za-z]+)(\d*)\}\}')
+
+VAR_NAMES = (
+    'data', 'result', 'value', 'item', 'element', 'object', 'array', 'list', 'dict', 'set',
+    'count', 'index', 'position', 'length', 'size', 'total', 'sum', 'average', 'maximum', 'minimum',
+    'user', 'name', 'email', 'password', 'token', 'session', 'config', 'settings', 'options', 'params',
+    'temp', 'current', 'previous', 'next', 'first', 'last', 'start', 'end', 'begin', 'finish'
+)
+
+FUNC_NAMES = (
+    'process', 'calculate', 'compute', 'generate', 'create', 'build', 'construct', 'initialize', 'setup', 'configure',
+    'validate', 'check', 'verify', 'test', 'analyze', 'parse', 'format', 'transform', 'convert', 'extract',
+    'filter', 'sort', 'search', 'find', 'locate', 'get', 'fetch', 'retrieve', 'load', 'save'
+)
+
+NAME_POOLS = {'var': VAR_NAMES, 'func': FUNC_NAMES}
+
+
+class CompiledTemplate:
+    """A template turned into a str.format string plus the name draws needed to fill it"""
+
+    __slots__ = ('source', 'format_string', 'draws', 'score')
+
+    def __init__(self, source: str):
+        self.source = source
+        self.score = score_text(SLOT.sub(lambda match: NAME_POOLS.get(match.group(1).lower(), ('',))[0], source))
+
+        # Each binding is one name draw keyed by (pool kind, slot number); unnumbered slots bind per occurrence
+        slots: List[Tuple[Tuple[str, str], bool]] = []
+
+        def mark(match: 're.Match[str]') -> str:
+            kind, number = match.group(1), match.group(2)
+            if kind.lower() not in NAME_POOLS:
+                raise ValueError(f'Unknown template slot {match.group(0)!r}')
+            slots.append(((kind.lower(), number or f'#{len(slots)}'), kind[0].isupper()))
+            return '\0'
+
+        marked = SLOT.sub(mark, source)
+
+        # Number bindings grouped by pool so fill() can draw each pool's names in a single sample
+        keys = sorted(dict.fromkeys(key for key, _ in slots), key=lambda key: list(NAME_POOLS).index(key[0]))
+        position = {key: i for i, key in enumerate(keys)}
+        self.draws = tuple((kind, sum(1 for k, _ in keys if k == kind)) for kind in NAME_POOLS
+                           if any(k == kind for k, _ in keys))
+
+        # Escape literal braces for str.format; capitalized slots index the second half of the arguments
+        parts = marked.replace('{', '{{').replace('}', '}}').split('\0')
+        out = [parts[0]]
+        for (key, capitalized), literal in zip(slots, parts[1:]):
+            out.append('{%d}' % (position[key] + len(keys) if capitalized else position[key]))
+            out.append(literal)
+        self.format_string = ''.join(out)
+
+    def fill(self, rng=None) -> str:
+        """Bind every slot; numbered slots of the same kind never share a name within the snippet"""
+        rng = rng or random
+        names: List[str] = []
+        for kind, count in self.draws:
+            pool = NAME_POOLS[kind]
+            names.extend(rng.sample(pool, count) if count <= len(pool) else rng.choices(pool, k=count))
+        return self.format_string.format(*names, *[name.capitalize() for name in names])
+
+
+def parse_templates(text: str) -> List[str]:
+    """Split a .tmpl file into template sources, trimming the blank lines around separators"""
+    return [chunk.strip('\n') for chunk in TEMPLATE_SEPARATOR.split(text) if chunk.strip()]
+
+
+@lru_cache(maxsize=None)
+def available_languages() -> Tuple[str, ...]:
+    """Languages with a template file, discovered once from the data directory"""
+    if not os.path.isdir(TEMPLATE_DIR):
+        return ()
+    return tuple(sorted(
+        name[:-len(TEMPLATE_SUFFIX)] for name in os.listdir(TEMPLATE_DIR)
+        if name.endswith(TEMPLATE_SUFFIX) and name[:-len(TEMPLATE_SUFFIX)] != FALLBACK_LANGUAGE
+    ))
+
+
+def resolve_language(language: str) -> str:
+    """The template set a language actually uses; unknown languages share the fallback set"""
+    return language if language in available_languages() else FALLBACK_LANGUAGE
+
+
+@startup.artifact('code_templates', keys=lambda: [(language,) for language in available_languages() + (FALLBACK_LANGUAGE,)])
+def _load(language: str) -> Tuple[CompiledTemplate, ...]:
+    with open(os.path.join(TEMPLATE_DIR, language + TEMPLATE_SUFFIX), encoding='utf-8') as f:
+        return tuple(CompiledTemplate(source) for source in parse_templates(f.read()))
+
+
+def load_templates(language: str) -> Tuple[CompiledTemplate, ...]:
+    """Compiled templates for a language, compiled once per process"""
+    return _load(resolve_language(language))
+
+
+@lru_cache(maxsize=None)
+def template_difficulty(language: str) -> DifficultyIndex:
+    """A language's templates ordered by the scores they were compiled with"""
+    return DifficultyIndex.build(template.score for template in load_templates(language))
+
+
+def generate_snippet(language: str, rng: Optional[random.Random] = None, band: Optional[str] = None) -> str:
+    """Pick one template, from a difficulty band if one is given, and fill only that one"""
+    rng = rng or random
+    templates = load_templates(language)
+    if band is None:
+        return rng.choice(templates).fill(rng)
+    return templates[template_difficulty(resolve_language(language)).sample(band, 1, rng)[0]].fill(rng)
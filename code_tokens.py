@@ -0,0 +1,158 @@
+"""Token classes for code-mode texts, so the client can highlight code without tokenizing it
+
+A text's tokens are sent as a flat list of runs, [class, length, class, length, ...],
+where class indexes CLASSES and adjacent runs of one class are merged. Lengths
+count UTF-16 code units, as JavaScript indexes strings, so the runs line up
+with the client's characters. The tokenizer is one regular expression per
+language: indentation, whitespace, comments, strings, numbers, and words
+(keywords where the language reserves them, identifiers otherwise). It
+doesn't nest, and it isn't meant to; anything it doesn't recognize is 'other'.
+
+Curated snippets never change, so their runs are memoized by content hash and
+each is tokenized once per process. Generated code is tokenized as it is served.
+"""
+import hashlib
+import keyword
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Pattern, Tuple
+
+CLASSES = ('other', 'keyword', 'identifier', 'string', 'number', 'comment', 'whitespace', 'indent')
+CLASS_INDEX = {name: i for i, name in enumerate(CLASSES)}
+
+CACHE_SIZE = int(os.environ.get('TYPEXI_TOKEN_CACHE_SIZE', 4096))
+
+JAVASCRIPT_KEYWORDS = frozenset((
+    'async', 'await', 'break', 'case', 'catch', 'class', 'const', 'continue', 'default', 'delete', 'do', 'else',
+    'export', 'extends', 'false', 'finally', 'for', 'function', 'if', 'import', 'in', 'instanceof', 'let', 'new',
+    'null', 'of', 'return', 'static', 'super', 'switch', 'this', 'throw', 'true', 'try', 'typeof', 'undefined',
+    'var', 'void', 'while', 'yield',
+))
+
+JAVA_KEYWORDS = frozenset((
+    'abstract', 'boolean', 'break', 'byte', 'case', 'catch', 'char', 'class', 'continue', 'default', 'do', 'double',
+    'else', 'enum', 'extends', 'false', 'final', 'finally', 'float', 'for', 'if', 'implements', 'import',
+    'instanceof', 'int', 'interface', 'long', 'new', 'null', 'package', 'private', 'protected', 'public', 'return',
+    'short', 'static', 'super', 'switch', 'synchronized', 'this', 'throw', 'throws', 'true', 'try', 'var', 'void',
+    'volatile', 'while',
+))
+
+KEYWORDS = {
+    'python': frozenset(keyword.kwlist) | {'self'},
+    'javascript': JAVASCRIPT_KEYWORDS,
+    'java': JAVA_KEYWORDS,
+}
+
+# Languages without a keyword set of their own are tokenized as C-like code with these
+FALLBACK_KEYWORDS = JAVASCRIPT_KEYWORDS | JAVA_KEYWORDS
+
+_COMMON = {
+    'indent': r'^[ \t]+',
+    'whitespace': r'[ \t]+|[\r\n]+',
+    'number': r'\d[\w.]*',
+    'word': r'[A-Za-z_$][\w$]*',
+    'other': r'[\s\S]',
+}
+_PYTHON = {
+    'comment': r'\#[^\n]*',
+    'string': r"'''[\s\S]*?(?:'''|\Z)|\"\"\"[\s\S]*?(?:\"\"\"|\Z)|'(?:\\.|[^'\\\n])*'?|\"(?:\\.|[^\"\\\n])*\"?",
+}
+_C_LIKE = {
+    'comment': r'//[^\n]*|/\*[\s\S]*?(?:\*/|\Z)',
+    'string': r"'(?:\\.|[^'\\\n])*'?|\"(?:\\.|[^\"\\\n])*\"?|`(?:\\.|[^`\\])*`?",
+}
+# Alternatives are tried in this order; comments and strings come first so the words inside them don't count
+_ORDER = ('indent', 'whitespace', 'comment', 'string', 'number', 'word', 'other')
+
+
+@lru_cache(maxsize=None)
+def _tokenizer(language: str) -> Tuple[Pattern[str], frozenset]:
+    rules = dict(_COMMON, **(_PYTHON if language == 'python' else _C_LIKE))
+    pattern = re.compile('|'.join(f'(?P<{name}>{rules[name]})' for name in _ORDER), re.MULTILINE)
+    return pattern, KEYWORDS.get(language, FALLBACK_KEYWORDS)
+
+
+def tokenize(code: str, language: str) -> Tuple[int, ...]:
+    """Token runs for one piece of code"""
+    pattern, keywords = _tokenizer(language)
+    astral = not code.isascii()
+    runs: List[int] = []
+    for match in pattern.finditer(code):
+        kind = match.lastgroup
+        token = match.group()
+        if kind == 'word':
+            kind = 'keyword' if token in keywords else 'identifier'
+        length = len(token)
+        if astral:
+            length += sum(1 for char in token if ord(char) > 0xFFFF)  # Surrogate pairs
+        cls = CLASS_INDEX[kind]
+        if runs and runs[-2] == cls:
+            runs[-1] += length
+        else:
+            runs += (cls, length)
+    return tuple(runs)
+
+
+class TokenCache:
+    """Token runs by (language, content hash), least recently used evicted past max_entries"""
+
+    def __init__(self, max_entries: int = CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, bytes], Tuple[int, ...]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, code: str, language: str) -> Tuple[int, ...]:
+        key = (language, hashlib.blake2b(code.encode('utf-8'), digest_size=16).digest())
+        with self._lock:
+            runs = self._entries.get(key)
+            if runs is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return runs
+            self.misses += 1
+        runs = tokenize(code, language)
+        with self._lock:
+            self._entries[key] = runs
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return runs
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+cache = TokenCache()
+
+
+def token_runs(parts: Iterable[str], language: str, separator: str = '\n\n', memoize: bool = True,
+               leading: bool = False) -> List[int]:
+    """Runs for the parts joined by separator (and preceded by it when leading), each part tokenized on its own
+
+    Pass memoize=False for generated code that won't be seen again, so it doesn't crowd the curated snippets out.
+    """
+    separator_runs = tokenize(separator, language) if separator else ()
+    runs: List[int] = []
+    for i, part in enumerate(parts):
+        pieces = [cache.get(part, language) if memoize else tokenize(part, language)]
+        if i or leading:
+            pieces.insert(0, separator_runs)
+        for piece in pieces:
+            # Runs within a piece are already merged; only the seam between pieces may need it
+            if runs and piece and runs[-2] == piece[0]:
+                runs[-1] += piece[1]
+                runs.extend(piece[2:])
+            else:
+                runs.extend(piece)
+    return runs
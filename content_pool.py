@@ -0,0 +1,149 @@
+"""Pre-generated content pool so random texts are popped, not built, on the request path"""
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ContentPool:
+    """Keeps a bounded queue of ready-made texts per key and refills it from a background worker"""
+
+    def __init__(self, depth: int = 32, batch_size: int = 8, low_water: Optional[int] = None,
+                 idle_interval: float = 1.0):
+        self.depth = depth
+        self.batch_size = max(1, batch_size)
+        self.low_water = depth // 2 if low_water is None else low_water
+        self.idle_interval = idle_interval
+
+        self._buckets: Dict[Hashable, deque] = {}
+        # Factories take a count and return that many items, so refills generate in one pass
+        self._factories: Dict[Hashable, Callable[[int], List[Any]]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.depth > 0
+
+    def register(self, key: Hashable, factory: Callable[[int], List[Any]]) -> None:
+        """Register a factory for a key; the worker keeps its bucket filled from then on"""
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = deque(maxlen=self.depth or None)
+                self._factories[key] = factory
+
+    def get(self, key: Hashable, factory: Callable[[int], List[Any]]) -> Any:
+        """Pop a ready item for key, generating inline when the bucket has run dry"""
+        return self.get_many(key, 1, factory)[0]
+
+    def get_many(self, key: Hashable, count: int, factory: Callable[[int], List[Any]]) -> List[Any]:
+        """Pop up to `count` ready items and generate the shortfall with a single factory call"""
+        if not self.enabled:
+            return factory(count)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self.register(key, factory)
+            bucket = self._buckets[key]
+
+        items = []
+        while len(items) < count:
+            try:
+                items.append(bucket.popleft())
+            except IndexError:
+                break
+        hits = len(items)
+        if hits < count:
+            items.extend(factory(count - hits))
+
+        with self._lock:
+            self.hits += hits
+            self.misses += count - hits
+
+        if len(bucket) < self.low_water:
+            self._ensure_worker()
+            self._wakeup.set()
+        return items
+
+    def fill(self, key: Optional[Hashable] = None) -> None:
+        """Synchronously top up one bucket (or all of them) to the configured depth"""
+        keys = [key] if key is not None else list(self._buckets)
+        for k in keys:
+            self._refill(k, until_full=True)
+
+    def _refill(self, key: Hashable, until_full: bool = False) -> None:
+        bucket = self._buckets[key]
+        factory = self._factories[key]
+        while len(bucket) < self.depth:
+            # Generate outside the lock so request threads never wait on a refill
+            batch = factory(min(self.batch_size, self.depth - len(bucket)))
+            bucket.extend(batch)
+            with self._lock:
+                self.generated += len(batch)
+            if not until_full:
+                break
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name='content-pool-refill', daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.idle_interval)
+            self._wakeup.clear()
+
+            pending = True
+            failed = set()
+            while pending:
+                pending = False
+                for key, bucket in list(self._buckets.items()):
+                    if len(bucket) < self.depth and key not in failed:
+                        try:
+                            self._refill(key)
+                        except Exception:
+                            # Skip the bucket until the next pass so it can't starve the others or kill the worker;
+                            # its requests generate inline meanwhile
+                            logger.exception('Refilling content pool bucket %r failed', key)
+                            failed.add(key)
+                            with self._lock:
+                                self.errors += 1
+                            continue
+                        pending = pending or len(bucket) < self.depth
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current fill level per bucket"""
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'depth': self.depth,
+            'batch_size': self.batch_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'generated': self.generated,
+            'errors': self.errors,
+            'buckets': {'/'.join(str(part) for part in key): len(bucket)
+                        for key, bucket in self._buckets.items()},
+        }
+
+
+def pool_from_env() -> ContentPool:
+    """Build the pool from TYPEXI_POOL_* environment variables (depth 0 disables pooling)"""
+    return ContentPool(
+        depth=int(os.environ.get('TYPEXI_POOL_DEPTH', 32)),
+        batch_size=int(os.environ.get('TYPEXI_POOL_BATCH', 8)),
+    )
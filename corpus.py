@@ -0,0 +1,186 @@
+"""Memory-mapped curated-text corpora with a prebuilt offset index
+
+A corpus is a UTF-8 text file with one passage per line, stored as
+data/corpus/<language>/<category>.txt, next to a binary <category>.idx:
+
+    8s   magic b'TXIDX001'
+    u64  passage count n
+    u64  size of the .txt the index was built from
+    u64  x n+1  byte offset where each passage starts (the last is the file size)
+
+All integers are little-endian. Reading passage i slices the mapped text
+between two offsets, so nothing is loaded onto the heap: the process's own
+memory does not grow with the corpus, and the pages that were sampled are
+page cache the kernel can reclaim.
+
+Building the index also scores every passage for difficulty and writes the
+sorted scores to <category>.dif (see difficulty.DifficultyIndex), so opening
+a corpus never has to read it all. Without an up-to-date .dif the passages
+are scored when the corpus is opened. Build or refresh indexes with
+
+    python corpus.py build [directory]
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+from array import array
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from difficulty import DifficultyIndex, score_text
+
+CORPUS_DIR = os.environ.get(
+    'TYPEXI_CORPUS_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'corpus'),
+)
+TEXT_SUFFIX = '.txt'
+INDEX_SUFFIX = '.idx'
+DIFFICULTY_SUFFIX = '.dif'
+
+INDEX_MAGIC = b'TXIDX001'
+INDEX_HEADER = struct.Struct('<8sQQ')
+OFFSET = struct.Struct('<Q')
+
+
+class Corpus:
+    """Read-only sequence of passages backed by a memory-mapped text file and its offset index"""
+
+    def __init__(self, text_path: str, index_path: Optional[str] = None):
+        self.text_path = text_path
+        self.index_path = index_path or text_path[:-len(TEXT_SUFFIX)] + INDEX_SUFFIX
+
+        with open(self.text_path, 'rb') as f:
+            text_size = os.fstat(f.fileno()).st_size
+            self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if text_size else b''
+        with open(self.index_path, 'rb') as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Passages are read at random, so kernel readahead would only pull in pages nobody asked for
+        if hasattr(mmap, 'MADV_RANDOM'):
+            for mapped in (self._text, self._index):
+                if isinstance(mapped, mmap.mmap):
+                    mapped.madvise(mmap.MADV_RANDOM)
+
+        magic, count, indexed_size = INDEX_HEADER.unpack_from(self._index)
+        if magic != INDEX_MAGIC:
+            raise ValueError(f'{self.index_path} is not a corpus index')
+        if indexed_size != text_size or len(self._index) != INDEX_HEADER.size + OFFSET.size * (count + 1):
+            raise ValueError(f'{self.index_path} is stale; rebuild it with `python corpus.py build`')
+        self._count = count
+        self.difficulty = self._load_difficulty(text_size)
+
+    def _load_difficulty(self, text_size: int) -> DifficultyIndex:
+        path = self.text_path[:-len(TEXT_SUFFIX)] + DIFFICULTY_SUFFIX
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                index = DifficultyIndex.from_buffer(mapped, text_size)
+                if len(index) == self._count:
+                    return index
+            except (ValueError, struct.error):
+                pass
+        return DifficultyIndex.of(self[i] for i in range(self._count))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _offset(self, i: int) -> int:
+        return OFFSET.unpack_from(self._index, INDEX_HEADER.size + OFFSET.size * i)[0]
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('corpus passage index out of range')
+        return self._text[self._offset(i):self._offset(i + 1)].decode('utf-8').strip()
+
+
+def build_index(text_path: str) -> int:
+    """Write the offset index and difficulty index for one corpus file; returns the passage count"""
+    offsets = array('Q')
+    scores = []
+    position = 0
+    with open(text_path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                offsets.append(position)
+                scores.append(score_text(line.decode('utf-8').strip()))
+            position += len(line)
+    offsets.append(position)
+    if sys.byteorder == 'big':
+        offsets.byteswap()
+
+    index_path = text_path[:-len(TEXT_SUFFIX)] + INDEX_SUFFIX
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(offsets) - 1, position))
+        offsets.tofile(f)
+    os.replace(temp_path, index_path)
+
+    difficulty_path = text_path[:-len(TEXT_SUFFIX)] + DIFFICULTY_SUFFIX
+    with open(difficulty_path + '.tmp', 'wb') as f:
+        f.write(DifficultyIndex.build(scores).to_bytes(position))
+    os.replace(difficulty_path + '.tmp', difficulty_path)
+    return len(offsets) - 1
+
+
+def corpus_files(directory: str = CORPUS_DIR) -> Dict[Tuple[str, str], str]:
+    """(language, category) -> text path for every corpus file under directory"""
+    found = {}
+    if not os.path.isdir(directory):
+        return found
+    for language in sorted(os.listdir(directory)):
+        language_dir = os.path.join(directory, language)
+        if not os.path.isdir(language_dir):
+            continue
+        for name in sorted(os.listdir(language_dir)):
+            if name.endswith(TEXT_SUFFIX):
+                found[(language, name[:-len(TEXT_SUFFIX)])] = os.path.join(language_dir, name)
+    return found
+
+
+@lru_cache(maxsize=None)
+def available_corpora() -> FrozenSet[Tuple[str, str]]:
+    """(language, category) pairs with an indexed corpus, discovered once per process"""
+    return frozenset(key for key, path in corpus_files().items()
+                     if os.path.isfile(path[:-len(TEXT_SUFFIX)] + INDEX_SUFFIX))
+
+
+def categories(language: str) -> List[str]:
+    return sorted(category for lang, category in available_corpora() if lang == language)
+
+
+@lru_cache(maxsize=None)
+def _open(language: str, category: str) -> Corpus:
+    return Corpus(os.path.join(CORPUS_DIR, language, category + TEXT_SUFFIX))
+
+
+def get_corpus(language: str, category: str) -> Optional[Corpus]:
+    """The mapped corpus for a language and category, or None when there isn't one"""
+    if (language, category) not in available_corpora():
+        return None
+    return _open(language, category)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Build offset and difficulty indexes for curated-text corpora')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='index every <language>/<category>.txt under a directory')
+    build.add_argument('directory', nargs='?', default=CORPUS_DIR)
+    build.add_argument('--force', action='store_true', help='rebuild indexes that are already up to date')
+    args = parser.parse_args()
+
+    for (language, category), text_path in corpus_files(args.directory).items():
+        outputs = [text_path[:-len(TEXT_SUFFIX)] + suffix for suffix in (INDEX_SUFFIX, DIFFICULTY_SUFFIX)]
+        if not args.force and all(os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(text_path)
+                                  for path in outputs):
+            print(f'{language}/{category}: up to date')
+            continue
+        print(f'{language}/{category}: {build_index(text_path)} passages')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""Difficulty scores for passages, code snippets and words, and the sorted index difficulty bands are drawn from
+
+A score in [0, 1] blends four features that make text harder to type:
+
+- word length: mean letters per word
+- rare characters: capitals, digits and the letters the home and top rows rarely need
+- punctuation density: symbols per character, which dominates code
+- bigram awkwardness: adjacent letters typed by the same finger, or by one
+  hand jumping between the top and bottom rows (on QWERTY)
+
+Scores are computed once when a collection is loaded or built, never per
+request. A DifficultyIndex keeps a collection's scores sorted alongside the
+item ids. Passages, code and single words score on different scales, so a
+band ('easy', 'medium', 'hard') is a third of its own collection in score
+order rather than a fixed score interval. Finding a band's items is then
+arithmetic on the sorted positions, and a random pick inside it is one more
+draw.
+"""
+import random
+import string
+import struct
+import sys
+from array import array
+from typing import Any, Iterable, Optional, Sequence, Tuple
+
+# Each band's share of a collection, as fractions of its items in score order
+BANDS = {
+    'easy': (0.0, 1 / 3),
+    'medium': (1 / 3, 2 / 3),
+    'hard': (2 / 3, 1.0),
+}
+
+# Features at or beyond these values count fully towards the score
+LONG_WORD = 9.0
+SHORT_WORD = 3.0
+RARE_SHARE = 0.12
+PUNCTUATION_SHARE = 0.15
+AWKWARD_SHARE = 0.12
+WEIGHTS = (0.3, 0.2, 0.25, 0.25)
+
+RARE_LETTERS = frozenset('bjkqvxz')
+PUNCTUATION = frozenset(string.punctuation)
+
+# QWERTY finger (0-7, left pinky to right pinky) and row (0 top, 1 home, 2 bottom) per letter
+_FINGER_KEYS = ('qaz', 'wsx', 'edc', 'rfvtgb', 'yhnujm', 'ik', 'ol', 'p')
+FINGER = {key: finger for finger, keys in enumerate(_FINGER_KEYS) for key in keys}
+ROW = {key: row for row, keys in enumerate(('qwertyuiop', 'asdfghjkl', 'zxcvbnm')) for key in keys}
+
+INDEX_MAGIC = b'TXDIF001'
+INDEX_HEADER = struct.Struct('<8sQQ')
+
+
+def parse_band(value: Optional[str]) -> Optional[str]:
+    """The band a `difficulty` parameter names; None (no filtering) when it is absent or 'any'"""
+    if not value or value == 'any':
+        return None
+    if value not in BANDS:
+        raise ValueError(f'Unknown difficulty: {value}')
+    return value
+
+
+def _awkward(a: str, b: str) -> float:
+    if a == b or a not in FINGER or b not in FINGER:
+        return 0.0
+    if FINGER[a] == FINGER[b]:
+        return 1.0
+    # Same hand leaping over the home row
+    if (FINGER[a] < 4) == (FINGER[b] < 4) and abs(ROW[a] - ROW[b]) == 2:
+        return 0.5
+    return 0.0
+
+
+def score_text(text: str) -> float:
+    """Difficulty of a passage, snippet or word, from 0 (easiest) upwards, mostly below 1"""
+    letters = rare = punctuation = pairs = 0
+    awkward = 0.0
+    words = 0
+    previous = ''
+    in_word = False
+    for char in text:
+        if char.isspace():
+            in_word = False
+            previous = ''
+            continue
+        if char.isalpha():
+            letters += 1
+            if not in_word:
+                words += 1
+                in_word = True
+            lower = char.lower()
+            if char != lower or lower in RARE_LETTERS or not char.isascii():
+                rare += 1
+            if previous:
+                pairs += 1
+                awkward += _awkward(previous, lower)
+            previous = lower
+            continue
+        in_word = False
+        previous = ''
+        if char.isdigit():
+            rare += 1
+        elif char in PUNCTUATION:
+            punctuation += 1
+    characters = letters + rare + punctuation
+    if not characters:
+        return 0.0
+
+    features = (
+        min(max((letters / max(words, 1) - SHORT_WORD) / (LONG_WORD - SHORT_WORD), 0.0), 1.0),
+        min(rare / characters / RARE_SHARE, 1.0),
+        min(punctuation / characters / PUNCTUATION_SHARE, 1.0),
+        min(awkward / pairs / AWKWARD_SHARE, 1.0) if pairs else 0.0,
+    )
+    return sum(weight * feature for weight, feature in zip(WEIGHTS, features))
+
+
+class DifficultyIndex:
+    """A collection's item ids ordered by score, with the scores alongside"""
+
+    __slots__ = ('scores', 'ids')
+
+    def __init__(self, scores: Sequence[float], ids: Sequence[int]):
+        self.scores = scores
+        self.ids = ids
+
+    @classmethod
+    def build(cls, scores: Iterable[float]) -> 'DifficultyIndex':
+        scores = list(scores)
+        order = sorted(range(len(scores)), key=scores.__getitem__)
+        return cls(array('d', [scores[i] for i in order]), array('I', order))
+
+    @classmethod
+    def of(cls, texts: Iterable[str]) -> 'DifficultyIndex':
+        return cls.build(score_text(text) for text in texts)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def span(self, band: str, minimum: int = 1) -> Tuple[int, int]:
+        """Positions [lo, hi) of the band's items in score order, widened around it to at least `minimum` items"""
+        low, high = BANDS[band]
+        count = len(self.ids)
+        lo, hi = int(count * low), int(count * high) if high < 1 else count
+        minimum = min(minimum, count)
+        center = count * (low + high) / 2
+        while hi - lo < minimum:
+            if hi < count and (lo == 0 or hi - center <= center - lo):
+                hi += 1
+            else:
+                lo -= 1
+        return lo, hi
+
+    def band_ids(self, band: str, minimum: int = 1) -> Sequence[int]:
+        lo, hi = self.span(band, minimum)
+        return self.ids[lo:hi]
+
+    def sample(self, band: str, k: int, rng: Optional[random.Random] = None) -> Tuple[int, ...]:
+        """k distinct item ids from the band (fewer only when the whole collection is smaller)"""
+        rng = rng or random
+        lo, hi = self.span(band, k)
+        return tuple(self.ids[lo + offset] for offset in rng.sample(range(hi - lo), min(k, hi - lo)))
+
+    def to_bytes(self, source_size: int) -> bytes:
+        scores, ids = array('d', self.scores), array('I', self.ids)
+        if sys.byteorder == 'big':
+            scores.byteswap()
+            ids.byteswap()
+        return INDEX_HEADER.pack(INDEX_MAGIC, len(ids), source_size) + scores.tobytes() + ids.tobytes()
+
+    @classmethod
+    def from_buffer(cls, buffer: Any, source_size: int) -> 'DifficultyIndex':
+        """View an index written by to_bytes without copying it; ValueError when it doesn't match the source"""
+        magic, count, indexed_size = INDEX_HEADER.unpack_from(buffer)
+        if magic != INDEX_MAGIC or indexed_size != source_size or \
+                len(buffer) != INDEX_HEADER.size + count * (8 + 4):
+            raise ValueError('Stale or invalid difficulty index')
+        view = memoryview(buffer)[INDEX_HEADER.size:]
+        if sys.byteorder == 'big':
+            scores, ids = array('d', view[:count * 8]), array('I', view[count * 8:])
+            scores.byteswap()
+            ids.byteswap()
+            return cls(scores, ids)
+        return cls(view[:count * 8].cast('d'), view[count * 8:].cast('I'))
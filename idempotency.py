@@ -0,0 +1,124 @@
+"""Recently seen idempotency keys, so retried result submissions are answered without saving them twice
+
+Clients attach a key they generated to each result. The durable guarantee is
+the unique index on the key in the result table: a second insert with the
+same key is a no-op that reports the first row's id, whichever worker or
+process wrote it. RecentKeys sits in front of that and saves work on
+retries:
+
+- An LRU maps the most recent keys to their result ids, so a retry of one of
+  them is answered from memory without being built, verified or queued.
+- A Bloom filter remembers many more keys in a few bits each. A key it has
+  never seen skips the database lookup; a key it may have seen (a retry that
+  fell out of the LRU, or a false positive) costs one indexed read.
+
+The filter has two generations: once the current one holds `capacity` keys
+it becomes the previous one and a fresh filter takes over, so memory stays
+bounded and the false-positive rate stays near its target.
+"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+MAX_KEY_LENGTH = 128
+
+
+def parse_key(value: Any) -> str:
+    """A submitted idempotency key; ValueError unless it is a non-empty string of sane length"""
+    if not isinstance(value, str) or not value or len(value) > MAX_KEY_LENGTH:
+        raise ValueError(f'idempotency_key must be a string of 1-{MAX_KEY_LENGTH} characters')
+    return value
+
+
+class BloomFilter:
+    """Fixed-size set membership with false positives but no false negatives"""
+
+    __slots__ = ('bits', 'size', 'hashes', 'count')
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> Iterable[int]:
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] >> (position & 7) & 1 for position in self._positions(key))
+
+
+class RecentKeys:
+    """The last `lru_size` keys with their result ids, and about the last `capacity` keys in a Bloom filter"""
+
+    def __init__(self, capacity: int = 1_000_000, lru_size: int = 10_000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.lru_size = lru_size
+        self.error_rate = error_rate
+        self._ids: 'OrderedDict[str, int]' = OrderedDict()
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous: Optional[BloomFilter] = None
+        self._lock = threading.Lock()
+        self.lru_hits = 0
+        self.maybe_seen = 0
+        self.unseen = 0
+        self.rotations = 0
+
+    def get(self, key: str) -> Optional[int]:
+        """The result id a recent key was saved as, when the LRU still has it"""
+        with self._lock:
+            result_id = self._ids.get(key)
+            if result_id is not None:
+                self._ids.move_to_end(key)
+                self.lru_hits += 1
+            return result_id
+
+    def might_contain(self, key: str) -> bool:
+        """False only for keys never added (within the last two generations)"""
+        with self._lock:
+            seen = key in self._current or (self._previous is not None and key in self._previous)
+            if seen:
+                self.maybe_seen += 1
+            else:
+                self.unseen += 1
+            return seen
+
+    def add(self, key: str, result_id: int) -> None:
+        with self._lock:
+            self._ids[key] = result_id
+            self._ids.move_to_end(key)
+            while len(self._ids) > self.lru_size:
+                self._ids.popitem(last=False)
+            if self._current.count >= self.capacity:
+                self._previous = self._current
+                self._current = BloomFilter(self.capacity, self.error_rate)
+                self.rotations += 1
+            self._current.add(key)
+
+    def load(self, pairs: Iterable[Tuple[str, int]]) -> None:
+        """Seed from persisted (key, id) pairs, oldest first, e.g. after a restart"""
+        for key, result_id in pairs:
+            self.add(key, result_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'lru_entries': len(self._ids),
+            'lru_size': self.lru_size,
+            'filter_keys': self._current.count + (self._previous.count if self._previous is not None else 0),
+            'filter_bytes': len(self._current.bits) * (2 if self._previous is not None else 1),
+            'capacity': self.capacity,
+            'lru_hits': self.lru_hits,
+            'maybe_seen': self.maybe_seen,
+            'unseen': self.unseen,
+            'rotations': self.rotations,
+        }
@@ -0,0 +1,262 @@
+"""Packed keystroke logs and the server-side recomputation of a test's stats from them
+
+Wire format (base64 of little-endian bytes):
+
+    u8   version (1)
+    u32  keystroke count n
+    u16  x n  milliseconds since the previous keystroke (the first is since the test started)
+    u16  x n  key: the typed character's code point, or 8 for backspace
+
+Deltas and keys are stored as two flat arrays so both decode with a single
+frombuffer call and every stat below is a handful of whole-array passes.
+NumPy is used when installed; the pure-Python path gives the same numbers.
+"""
+import base64
+import struct
+import sys
+from array import array
+from typing import Any, Dict, List, Sequence, Tuple
+
+import startup
+
+np = startup.optional_module('numpy')
+
+LOG_VERSION = 1
+HEADER = struct.Struct('<BI')
+BACKSPACE = 8
+MAX_KEYSTROKES = 200000
+BURST_WINDOW = 10  # keystrokes
+
+# Plausibility limits for flagging
+MAX_PLAUSIBLE_WPM = 250
+MIN_HUMAN_INTERVAL_MS = 10
+MAX_FAST_INTERVAL_SHARE = 0.2
+MIN_INTERVAL_VARIATION = 0.05
+MAX_BATCHED_SHARE = 0.5  # Keystrokes sharing a timestamp (tab, auto-indent, paste)
+CLAIM_TOLERANCE = 0.25  # The client counts whitespace-separated words, not characters / 5
+
+
+def encode_log(deltas: Sequence[int], keys: Sequence[int]) -> str:
+    """Pack a keystroke log the way the client does (used by benchmarks and tooling)"""
+    delta_array = array('H', [min(d, 0xFFFF) for d in deltas])
+    key_array = array('H', [min(k, 0xFFFF) for k in keys])
+    if sys.byteorder == 'big':
+        delta_array.byteswap()
+        key_array.byteswap()
+    raw = HEADER.pack(LOG_VERSION, len(delta_array)) + delta_array.tobytes() + key_array.tobytes()
+    return base64.b64encode(raw).decode('ascii')
+
+
+def decode_log(encoded: str) -> Tuple[Any, Any]:
+    """Unpack a base64 log into (deltas, keys) arrays (NumPy arrays when available)"""
+    try:
+        raw = base64.b64decode(encoded, validate=True)
+        version, count = HEADER.unpack_from(raw)
+    except Exception:
+        raise ValueError('Malformed keystroke log')
+    if version != LOG_VERSION:
+        raise ValueError(f'Unsupported keystroke log version {version}')
+    if count > MAX_KEYSTROKES or len(raw) != HEADER.size + 4 * count:
+        raise ValueError('Keystroke log length does not match its header')
+
+    body = raw[HEADER.size:]
+    if np is not None:
+        deltas = np.frombuffer(body, dtype='<u2', count=count).astype(np.int64)
+        keys = np.frombuffer(body, dtype='<u2', count=count, offset=2 * count).astype(np.int64)
+        return deltas, keys
+
+    deltas, keys = array('H'), array('H')
+    deltas.frombytes(body[:2 * count])
+    keys.frombytes(body[2 * count:])
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+        keys.byteswap()
+    return deltas, keys
+
+
+def analyze(encoded: str, text: str, min_elapsed_ms: int = 0) -> Dict[str, Any]:
+    """Recompute WPM, raw WPM, accuracy, consistency and burst speed from a packed log
+
+    Speeds are averaged over the logged time or min_elapsed_ms, whichever is longer:
+    a timed test that ended after the last keystroke still counts its full length.
+    """
+    deltas, keys = decode_log(encoded)
+    if len(deltas) == 0:
+        raise ValueError('Keystroke log is empty')
+    target = [min(ord(c), 0xFFFF) for c in text]
+    if np is not None:
+        stats = _analyze_numpy(deltas, keys, np.array(target, dtype=np.int64))
+    else:
+        stats = _analyze_python(deltas, keys, target)
+    stats['elapsed_ms'] = max(stats['elapsed_ms'], min_elapsed_ms)
+    return _finish(stats)
+
+
+def _analyze_numpy(deltas, keys, target) -> Dict[str, Any]:
+    times = np.cumsum(deltas)
+    typed = keys != BACKSPACE
+    steps = np.where(typed, 1, -1)
+    lengths = np.cumsum(steps)
+    if lengths.min() < 0:
+        # Backspace on an empty input is a no-op; clamping breaks the prefix sum, so take the slow path
+        return _analyze_python(deltas.tolist(), keys.tolist(), target.tolist())
+
+    positions = lengths - 1  # Where each typed key landed
+    in_text = typed & (positions < len(target))
+    expected = np.full(len(keys), -1)
+    expected[in_text] = target[positions[in_text]]
+    correct = typed & (keys == expected)
+
+    # A typed key is in the final input unless a later backspace dropped the input below it
+    remaining = np.minimum.accumulate(lengths[::-1])[::-1]
+    survived = typed & (remaining > positions)
+
+    # Zero deltas are characters inserted by the same input event; they say nothing about rhythm
+    intervals = deltas[1:]
+    batched_share = float((intervals == 0).mean()) if len(intervals) else 0.0
+    intervals = intervals[intervals > 0]
+    return {
+        'elapsed_ms': int(times[-1]),
+        'typed': int(typed.sum()),
+        'correct_keystrokes': int(correct.sum()),
+        'correct_chars': int((correct & survived).sum()),
+        'final_length': int(lengths[-1]),
+        'per_second': np.bincount(times[typed] // 1000).tolist(),
+        'burst_ms': _burst_ms_numpy(times[typed]),
+        'batched_share': batched_share,
+        'fast_share': float((intervals < MIN_HUMAN_INTERVAL_MS).mean()) if len(intervals) else 0.0,
+        'interval_cv': float(intervals.std() / intervals.mean()) if len(intervals) and intervals.mean() else 0.0,
+        'missed': positions[in_text & ~correct].tolist(),
+    }
+
+
+def _burst_ms_numpy(typed_times) -> int:
+    if len(typed_times) <= BURST_WINDOW:
+        return 0
+    return int((typed_times[BURST_WINDOW:] - typed_times[:-BURST_WINDOW]).min())
+
+
+def _analyze_python(deltas: Sequence[int], keys: Sequence[int], target: List[int]) -> Dict[str, Any]:
+    length = 0
+    elapsed = 0
+    typed = correct_keystrokes = 0
+    buffer: List[bool] = []  # Correctness of each character currently in the input
+    typed_times: List[int] = []
+    missed: List[int] = []  # Text positions where a wrong key was typed
+    for delta, key in zip(deltas, keys):
+        elapsed += delta
+        if key == BACKSPACE:
+            if length:
+                length -= 1
+                buffer.pop()
+            continue
+        ok = length < len(target) and target[length] == key
+        if not ok and length < len(target):
+            missed.append(length)
+        buffer.append(ok)
+        length += 1
+        typed += 1
+        correct_keystrokes += ok
+        typed_times.append(elapsed)
+
+    per_second: List[int] = []
+    for t in typed_times:
+        second = t // 1000
+        if second >= len(per_second):
+            per_second.extend([0] * (second + 1 - len(per_second)))
+        per_second[second] += 1
+
+    burst_ms = 0
+    if len(typed_times) > BURST_WINDOW:
+        burst_ms = min(b - a for a, b in zip(typed_times, typed_times[BURST_WINDOW:]))
+
+    intervals = list(deltas[1:])
+    batched_share = intervals.count(0) / len(intervals) if intervals else 0.0
+    intervals = [i for i in intervals if i > 0]
+    mean = sum(intervals) / len(intervals) if intervals else 0.0
+    std = (sum((i - mean) ** 2 for i in intervals) / len(intervals)) ** 0.5 if intervals else 0.0
+    return {
+        'elapsed_ms': elapsed,
+        'typed': typed,
+        'correct_keystrokes': correct_keystrokes,
+        'correct_chars': sum(buffer),
+        'final_length': length,
+        'per_second': per_second,
+        'burst_ms': burst_ms,
+        'batched_share': batched_share,
+        'fast_share': sum(1 for i in intervals if i < MIN_HUMAN_INTERVAL_MS) / len(intervals) if intervals else 0.0,
+        'interval_cv': std / mean if mean else 0.0,
+        'missed': missed,
+    }
+
+
+def _finish(stats: Dict[str, Any]) -> Dict[str, Any]:
+    minutes = stats['elapsed_ms'] / 60000
+    per_second = [count * 12 for count in stats['per_second']]  # chars/sec -> WPM
+    mean = sum(per_second) / len(per_second) if per_second else 0.0
+    std = (sum((w - mean) ** 2 for w in per_second) / len(per_second)) ** 0.5 if per_second else 0.0
+
+    return {
+        'wpm': round(stats['correct_chars'] / 5 / minutes) if minutes else 0,
+        'raw_wpm': round(stats['typed'] / 5 / minutes) if minutes else 0,
+        'accuracy': round(stats['correct_keystrokes'] / stats['typed'] * 100) if stats['typed'] else 100,
+        'consistency': round(max(0.0, 1 - std / mean) * 100) if mean else 0,
+        'burst_wpm': round(BURST_WINDOW / 5 / (stats['burst_ms'] / 60000)) if stats['burst_ms'] else 0,
+        'errors': stats['typed'] - stats['correct_keystrokes'],
+        'characters_typed': stats['final_length'],
+        'time_taken': round(stats['elapsed_ms'] / 1000, 3),
+        'keystrokes': stats['typed'],
+        '_batched_share': stats['batched_share'],
+        '_fast_share': stats['fast_share'],
+        '_interval_cv': stats['interval_cv'],
+        '_missed': stats['missed'],
+    }
+
+
+def plausibility_flags(analysis: Dict[str, Any], claimed: Dict[str, Any]) -> List[str]:
+    """Reasons a result looks scripted or doesn't match what the client claimed"""
+    flags = []
+    if analysis['wpm'] > MAX_PLAUSIBLE_WPM:
+        flags.append('wpm_over_limit')
+    if analysis['_fast_share'] > MAX_FAST_INTERVAL_SHARE or analysis['_batched_share'] > MAX_BATCHED_SHARE:
+        flags.append('inhuman_intervals')
+    if analysis['keystrokes'] > 50 and analysis['_interval_cv'] < MIN_INTERVAL_VARIATION:
+        flags.append('too_regular')
+    claimed_wpm = float(claimed.get('wpm') or 0)
+    if claimed_wpm > analysis['wpm'] * (1 + CLAIM_TOLERANCE) + 2:
+        flags.append('claimed_wpm_mismatch')
+    claimed_time = float(claimed.get('time_taken') or 0)
+    if claimed_time and analysis['time_taken'] > claimed_time + 2:
+        flags.append('duration_mismatch')
+    return flags
+
+
+def mistake_counts(text: str, positions: Sequence[int]) -> Dict[str, Dict[str, int]]:
+    """Which characters were missed, and in which bigrams (the missed character and the one before it)
+
+    Letters are folded to lower case, and bigrams spanning a space are left out:
+    they are the units practice texts are built from.
+    """
+    chars: Dict[str, int] = {}
+    bigrams: Dict[str, int] = {}
+    for position in positions:
+        char = text[position].lower()
+        if char.isspace():
+            continue
+        chars[char] = chars.get(char, 0) + 1
+        if position:
+            bigram = text[position - 1].lower() + char
+            if not bigram[0].isspace():
+                bigrams[bigram] = bigrams.get(bigram, 0) + 1
+    return {'chars': chars, 'bigrams': bigrams}
+
+
+def verify(encoded: str, text: str, claimed: Dict[str, Any]) -> Dict[str, Any]:
+    """Analysis plus plausibility flags and the missed characters, with the internal helper fields dropped"""
+    claimed_ms = int(float(claimed.get('time_taken') or 0) * 1000)
+    analysis = analyze(encoded, text, claimed_ms)
+    flags = plausibility_flags(analysis, claimed)
+    verified = {key: value for key, value in analysis.items() if not key.startswith('_')}
+    verified['flags'] = flags
+    verified['mistakes'] = mistake_counts(text, analysis['_missed'])
+    return verified
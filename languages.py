@@ -0,0 +1,190 @@
+"""Registry of typing-test languages: discovered from metadata, loaded on first use, evicted when over budget
+
+Each language other than the built-in ones lives in data/languages/<code>/:
+
+    meta.json   {"name": "Español", "categories": {"tech": "Tecnología", ...}}
+    texts.json  {"<category>": ["passage", ...], ...}
+    words.json  {"common": ["word", ...], "tech": [...], ...}        (optional)
+    code.json   {"<code language>": [{"code": ..., "description": ...}]}  (optional)
+
+Listing languages and categories only ever reads meta.json. The other files
+are loaded the first time a request needs them, and the least recently used
+languages are dropped again once the loaded data exceeds the memory budget
+(measured as the size of the files it was loaded from).
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from difficulty import DifficultyIndex
+from word_pools import WordPool
+
+LANGUAGE_DIR = os.environ.get(
+    'TYPEXI_LANGUAGE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'languages'),
+)
+META_FILE = 'meta.json'
+DATA_FILES = ('texts.json', 'words.json', 'code.json')
+
+
+class LanguageData:
+    """Everything loaded for one language"""
+
+    __slots__ = ('code', 'name', 'texts', 'word_pools', 'snippets', 'size', 'text_difficulty', 'snippet_difficulty')
+
+    def __init__(self, code: str, name: str, texts: Dict[str, List[str]],
+                 words: Optional[Dict[str, List[str]]] = None,
+                 snippets: Optional[Dict[str, List[Dict[str, str]]]] = None, size: int = 0):
+        self.code = code
+        self.name = name
+        self.texts = texts
+        self.word_pools = {kind: WordPool(f'{code}:{kind}', word_list).index_bands()
+                           for kind, word_list in (words or {}).items()}
+        self.snippets = snippets or {}
+        self.size = size
+        # Scored here, while loading, so requests for a difficulty band only look the index up
+        self.text_difficulty = {category: DifficultyIndex.of(passages) for category, passages in texts.items()}
+        self.snippet_difficulty = {
+            code_language: DifficultyIndex.of(snippet['code'] for snippet in entries)
+            for code_language, entries in self.snippets.items()
+        }
+
+
+class LanguageRegistry:
+    """Language metadata for every language, full data for the recently used ones"""
+
+    def __init__(self, directory: str = LANGUAGE_DIR, memory_budget: int = 64 * 1024 * 1024,
+                 builtin: Optional[Dict[str, LanguageData]] = None):
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self._builtin = dict(builtin or {})
+        self._meta: Optional[Dict[str, Dict[str, Any]]] = None
+        self._loaded: 'OrderedDict[str, LanguageData]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.loaded_bytes = 0
+        self.loads = 0
+        self.evictions = 0
+
+    # Metadata
+
+    def _discover(self) -> Dict[str, Dict[str, Any]]:
+        if self._meta is not None:
+            return self._meta
+        meta: Dict[str, Dict[str, Any]] = {}
+        for code, data in self._builtin.items():
+            meta[code] = {'name': data.name, 'categories': {category: None for category in data.texts},
+                          'words': bool(data.word_pools)}
+        if os.path.isdir(self.directory):
+            for code in sorted(os.listdir(self.directory)):
+                path = os.path.join(self.directory, code, META_FILE)
+                if code in meta or not os.path.isfile(path):
+                    continue
+                with open(path, encoding='utf-8') as f:
+                    entry = json.load(f)
+                meta[code] = {
+                    'name': entry.get('name', code.title()),
+                    'categories': entry.get('categories', {}),
+                    'words': os.path.isfile(os.path.join(self.directory, code, 'words.json')),
+                }
+        self._meta = meta
+        return meta
+
+    def __contains__(self, code: str) -> bool:
+        return code in self._discover()
+
+    def names(self) -> Dict[str, str]:
+        """Language code -> display name, from metadata only"""
+        return {code: entry['name'] for code, entry in self._discover().items()}
+
+    def categories(self, code: str) -> List[Tuple[str, Optional[str]]]:
+        """(category, display name or None) pairs for a language, from metadata only"""
+        entry = self._discover().get(code)
+        return list(entry['categories'].items()) if entry else []
+
+    # Data
+
+    def get(self, code: str) -> Optional[LanguageData]:
+        """A language's full data, loading it on first use; None for unknown languages"""
+        if code in self._builtin:
+            return self._builtin[code]
+        with self._lock:
+            data = self._loaded.get(code)
+            if data is not None:
+                self._loaded.move_to_end(code)
+                return data
+        if code not in self._discover():
+            return None
+
+        data = self._load(code)
+        with self._lock:
+            if code in self._loaded:
+                return self._loaded[code]
+            self._loaded[code] = data
+            self.loaded_bytes += data.size
+            self.loads += 1
+            # Keep at least the language that was just asked for
+            while self.loaded_bytes > self.memory_budget and len(self._loaded) > 1:
+                _, evicted = self._loaded.popitem(last=False)
+                self.loaded_bytes -= evicted.size
+                self.evictions += 1
+        return data
+
+    def _load(self, code: str) -> LanguageData:
+        contents: Dict[str, Any] = {}
+        size = 0
+        for name in DATA_FILES:
+            path = os.path.join(self.directory, code, name)
+            if os.path.isfile(path):
+                with open(path, encoding='utf-8') as f:
+                    raw = f.read()
+                size += len(raw)
+                contents[name] = json.loads(raw)
+        return LanguageData(code, self._discover()[code]['name'], contents.get('texts.json', {}),
+                            contents.get('words.json'), contents.get('code.json'), size)
+
+    def texts(self, code: str, category: str) -> Optional[List[str]]:
+        data = self.get(code)
+        return data.texts.get(category) if data is not None else None
+
+    def word_pool(self, code: str, kind: str) -> Optional[WordPool]:
+        """The language's word pool of this kind, else its common pool, else None"""
+        data = self.get(code)
+        if data is None:
+            return None
+        return data.word_pools.get(kind) or data.word_pools.get('common')
+
+    def snippets(self, code: str, code_language: str) -> Optional[List[Dict[str, str]]]:
+        data = self.get(code)
+        return data.snippets.get(code_language) if data is not None else None
+
+    def text_difficulty(self, code: str, category: str) -> Optional[DifficultyIndex]:
+        data = self.get(code)
+        return data.text_difficulty.get(category) if data is not None else None
+
+    def snippet_difficulty(self, code: str, code_language: str) -> Optional[DifficultyIndex]:
+        data = self.get(code)
+        return data.snippet_difficulty.get(code_language) if data is not None else None
+
+    def has_words(self, code: str) -> bool:
+        """Whether a language ships its own word lists, from metadata only"""
+        entry = self._discover().get(code)
+        return bool(entry and entry['words'])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'available': len(self._discover()),
+            'loaded': list(self._loaded),
+            'loaded_bytes': self.loaded_bytes,
+            'memory_budget': self.memory_budget,
+            'loads': self.loads,
+            'evictions': self.evictions,
+        }
+
+
+def registry_from_env(builtin: Optional[Dict[str, LanguageData]] = None) -> LanguageRegistry:
+    return LanguageRegistry(
+        memory_budget=int(os.environ.get('TYPEXI_LANGUAGE_BUDGET_BYTES', 64 * 1024 * 1024)),
+        builtin=builtin,
+    )
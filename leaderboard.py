@@ -0,0 +1,147 @@
+"""Incrementally maintained top-K leaderboards per test partition and time window"""
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+PARTITION_FIELDS = ('test_type', 'content_type', 'language', 'category', 'duration')
+
+DAY = 86400
+
+# Calendar windows: each maps a timestamp to the bucket it counts towards.
+# Weeks start on Monday (the epoch fell on a Thursday, hence the +3).
+WINDOWS = {
+    'daily': lambda ts: ts // DAY,
+    'weekly': lambda ts: (ts // DAY + 3) // 7,
+    'all': lambda ts: 0,
+}
+
+Partition = Tuple[Any, ...]
+
+# No real WPM, accuracy or timestamp comes near this; it also rules out NaN, infinities and huge integers
+MAX_NUMBER = 1e15
+
+
+def partition_of(result: Dict[str, Any]) -> Partition:
+    return tuple(result.get(field) for field in PARTITION_FIELDS)
+
+
+class TopK:
+    """Bounded min-heap that keeps the K best entries seen so far"""
+
+    __slots__ = ('k', '_heap', '_seq')
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap: List[Tuple[Tuple[float, float, int], int, Dict[str, Any]]] = []
+        # Tie-breaker so equal scores never fall through to comparing entry dicts
+        self._seq = itertools.count()
+
+    def push(self, score: Tuple[float, float, int], entry: Dict[str, Any]) -> None:
+        item = (score, -next(self._seq), entry)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, item)
+        elif item > self._heap[0]:
+            heapq.heapreplace(self._heap, item)
+
+    def top(self) -> List[Dict[str, Any]]:
+        return [entry for _, _, entry in sorted(self._heap, key=lambda item: item[:2], reverse=True)]
+
+
+class LeaderboardIndex:
+    """One TopK per (window, partition); daily/weekly buckets expire by rolling over, never by rescanning"""
+
+    def __init__(self, k: int = 100):
+        self.k = k
+        # (window, partition) -> (bucket id, TopK for that bucket)
+        self._boards: Dict[Tuple[str, Partition], Tuple[int, TopK]] = {}
+        self._lock = threading.Lock()
+        # Highest result id covered by the last rebuild, so results saved mid-rebuild aren't counted twice
+        self._replayed_through = 0
+
+    @staticmethod
+    def _score(result: Dict[str, Any]) -> Optional[Tuple[float, float, int]]:
+        """None for results whose numbers aren't numbers (rows saved before results were validated)"""
+        wpm, accuracy, timestamp = (result.get(field) or 0 for field in ('wpm', 'accuracy', 'timestamp'))
+        if not all(isinstance(value, (int, float)) and abs(value) < MAX_NUMBER for value in (wpm, accuracy, timestamp)):
+            return None
+        # Higher WPM wins, then accuracy, then whoever got there first
+        return float(wpm), float(accuracy), -int(timestamp)
+
+    @staticmethod
+    def _entry(result: Dict[str, Any]) -> Dict[str, Any]:
+        timestamp = int(result.get('timestamp') or 0)
+        return {
+            'id': result.get('id'),
+            'name': result.get('name') or 'Anonymous',
+            'wpm': result.get('wpm', 0),
+            'accuracy': result.get('accuracy', 0),
+            'date': datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d'),
+        }
+
+    def add(self, result: Dict[str, Any], now: Optional[int] = None) -> None:
+        """Fold one saved result into every window it still counts towards; unrankable results are skipped"""
+        if (result.get('id') or 0) and result['id'] <= self._replayed_through:
+            return
+        score = self._score(result)
+        if score is None:
+            return
+        now = int(time.time()) if now is None else now
+        timestamp = -score[2] or now
+        partition = partition_of(result)
+        entry = self._entry(result)
+
+        with self._lock:
+            for window, bucket_of in WINDOWS.items():
+                bucket = bucket_of(timestamp)
+                if bucket != bucket_of(now):
+                    continue  # Already outside this window
+                key = (window, partition)
+                current = self._boards.get(key)
+                if current is None or current[0] != bucket:
+                    current = self._boards[key] = (bucket, TopK(self.k))
+                current[1].push(score, entry)
+
+    def top(self, partition: Partition, window: str = 'all', limit: Optional[int] = None,
+            now: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Ranked entries for one partition; O(K) and independent of result history size"""
+        if window not in WINDOWS:
+            raise ValueError(f'Unknown leaderboard window {window!r}')
+        now = int(time.time()) if now is None else now
+        key = (window, partition)
+
+        with self._lock:
+            current = self._boards.get(key)
+            if current is None:
+                return []
+            if current[0] != WINDOWS[window](now):
+                del self._boards[key]
+                return []
+            entries = current[1].top()
+
+        limit = self.k if limit is None else limit
+        return [dict(entry, rank=rank) for rank, entry in enumerate(entries[:limit], start=1)]
+
+    def rebuild(self, results: Iterable[Dict[str, Any]], now: Optional[int] = None) -> int:
+        """Replace the index with one built from persisted results; returns how many were replayed"""
+        now = int(time.time()) if now is None else now
+        with self._lock:
+            self._boards = {}
+            self._replayed_through = 0
+        count = 0
+        last_id = 0
+        for result in results:
+            try:
+                self.add(result, now)
+            except (TypeError, ValueError, OverflowError):
+                pass  # One malformed row mustn't keep every other result off the boards
+            else:
+                count += 1
+            last_id = max(last_id, result.get('id') or 0)
+        self._replayed_through = last_id
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        return {'k': self.k, 'boards': len(self._boards)}
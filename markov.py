@@ -0,0 +1,336 @@
+"""Word-level Markov text generator compiled to alias tables
+
+A model is trained once from curated passages. Every state (the previous
+`order` words, padded with a start marker at sentence starts) keeps the words
+seen after it, blended with the words seen after its last order-1 words so
+small corpora don't just get recited back, as a Vose alias table. Drawing
+the next word takes one random number and at most two table reads, whatever
+the number of successors. Each table entry also stores where the state it
+leads to starts, so generating text never hashes a word or looks anything up
+in a dict.
+
+Training closes every sentence with a word ending in . ! or ?, and those
+words lead back to the start state. Every other word was followed by
+something in training, so every walk through the tables ends a sentence.
+
+Compiled models are stored as data/markov/<language>.bin:
+
+    8s   magic b'TXMKV001'
+    u32  order
+    u32  vocabulary size v
+    u32  state count s
+    u32  entry count e
+    32s  SHA-256 fingerprint of the training sources
+    u32  byte length of the vocabulary, then the words joined by '\\n' (UTF-8)
+    u32 x s+1  first entry of each state (the last is e)
+    u32 x e    word id of each entry
+    u32 x e    state each entry leads to
+    u32 x e    alias entry of each entry
+    f64 x e    probability of keeping the entry rather than its alias
+
+All integers are little-endian. Rebuild the stored models with
+
+    python markov.py build
+"""
+import argparse
+import hashlib
+import os
+import random
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+MARKOV_DIR = os.environ.get(
+    'TYPEXI_MARKOV_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'markov'),
+)
+MODEL_SUFFIX = '.bin'
+
+MODEL_MAGIC = b'TXMKV001'
+MODEL_HEADER = struct.Struct('<8sIIII32s')
+LENGTH = struct.Struct('<I')
+
+DEFAULT_ORDER = 2
+# Share of each next-word distribution taken from the shorter context
+BACKOFF_WEIGHT = 0.3
+SENTENCE_ENDINGS = ('.', '!', '?')
+CLOSING_MARKS = '"\')]'
+# A walk that hasn't ended a sentence by then is cut off (loops through common words can run long)
+MAX_SENTENCE_WORDS = 60
+
+START = 0  # State index of the sentence start, and word id of the start marker
+
+
+def ends_sentence(word: str) -> bool:
+    return word.rstrip(CLOSING_MARKS).endswith(SENTENCE_ENDINGS)
+
+
+def split_sentences(passage: str) -> Iterable[List[str]]:
+    """Words of each sentence in a passage; a trailing fragment is closed with a full stop"""
+    sentence: List[str] = []
+    for word in passage.split():
+        sentence.append(word)
+        if ends_sentence(word):
+            yield sentence
+            sentence = []
+    if sentence:
+        sentence[-1] = sentence[-1].rstrip(',;:-') + '.'
+        yield sentence
+
+
+def alias_table(weights: Sequence[float]) -> Tuple[List[float], List[int]]:
+    """Vose's alias method: keep-probabilities and alias slots for a discrete distribution"""
+    n = len(weights)
+    total = sum(weights)
+    scaled = [weight * n / total for weight in weights]
+    probs = [1.0] * n
+    aliases = list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        probs[less] = scaled[less]
+        aliases[less] = more
+        scaled[more] -= 1.0 - scaled[less]
+        (small if scaled[more] < 1.0 else large).append(more)
+    # Whatever is left is 1.0 up to rounding error
+    return probs, aliases
+
+
+def blend(longer: Dict[int, int], shorter: Dict[int, int]) -> Dict[int, float]:
+    longer_total, shorter_total = sum(longer.values()), sum(shorter.values())
+    blended = {word: (1 - BACKOFF_WEIGHT) * count / longer_total for word, count in longer.items()}
+    for word, count in shorter.items():
+        blended[word] = blended.get(word, 0.0) + BACKOFF_WEIGHT * count / shorter_total
+    return blended
+
+
+class MarkovModel:
+    """Compiled transition tables for one order-n word model"""
+
+    def __init__(self, order: int, vocabulary: List[str], offsets: array, words: array, successors: array,
+                 aliases: array, probs: array, fingerprint: bytes = b''):
+        self.order = order
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.words = words
+        self.successors = successors
+        self.aliases = aliases
+        self.probs = probs
+        self.fingerprint = fingerprint
+        # The walk reads one tuple per step: (word, next state's first entry, its size, keep probability, alias).
+        # Indexing a list of tuples is much cheaper than several array reads, each boxing a new int.
+        self._entries = [
+            (vocabulary[word], offsets[successor], offsets[successor + 1] - offsets[successor], keep, alias)
+            for word, successor, keep, alias in zip(words, successors, probs, aliases)
+        ]
+
+    @property
+    def state_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def __len__(self) -> int:
+        """Number of table entries (distinct state -> word transitions)"""
+        return len(self.words)
+
+    @classmethod
+    def train(cls, passages: Iterable[str], order: int = DEFAULT_ORDER, fingerprint: bytes = b'') -> 'MarkovModel':
+        if order < 1:
+            raise ValueError('Markov order must be at least 1')
+        vocabulary = ['']  # The start marker
+        word_ids: Dict[str, int] = {}
+        state_ids: Dict[Tuple[int, ...], int] = {(START,) * order: START}
+        counts: List[Dict[int, int]] = [{}]
+        shorter: Dict[Tuple[int, ...], Dict[int, int]] = {}
+
+        for passage in passages:
+            for sentence in split_sentences(passage):
+                state = (START,) * order
+                for word in sentence:
+                    word_id = word_ids.get(word)
+                    if word_id is None:
+                        word_id = word_ids[word] = len(vocabulary)
+                        vocabulary.append(word)
+                    followers = counts[state_ids[state]]
+                    followers[word_id] = followers.get(word_id, 0) + 1
+                    if order > 1:
+                        followers = shorter.setdefault(state[1:], {})
+                        followers[word_id] = followers.get(word_id, 0) + 1
+                    state = state[1:] + (word_id,)
+                    if state not in state_ids and not ends_sentence(word):
+                        state_ids[state] = len(counts)
+                        counts.append({})
+        if not counts[START]:
+            raise ValueError('No text to train a Markov model on')
+
+        offsets, words, successors, aliases, probs = array('I', [0]), array('I'), array('I'), array('I'), array('d')
+        for state, followers in zip(state_ids, counts):
+            if order > 1:
+                # Any word seen after the shorter context leads to a state that exists: (.., word) was seen too
+                followers = blend(followers, shorter[state[1:]])
+            start = len(words)
+            table_probs, table_aliases = alias_table(list(followers.values()))
+            for word_id in followers:
+                words.append(word_id)
+                # Sentence ends lead back to the start; the state after a word that never ends one was seen in training
+                successors.append(START if ends_sentence(vocabulary[word_id]) else state_ids[state[1:] + (word_id,)])
+            aliases.extend(start + alias for alias in table_aliases)
+            probs.extend(table_probs)
+            offsets.append(len(words))
+        return cls(order, vocabulary, offsets, words, successors, aliases, probs, fingerprint)
+
+    def generate_sentences(self, n: int, rng: Optional[random.Random] = None) -> List[str]:
+        """Walk the chain until n sentences have ended"""
+        draw = (rng or random).random
+        entries = self._entries
+        start_size = self.offsets[START + 1]
+        sentences = []
+        for _ in range(n):
+            sentence: List[str] = []
+            append = sentence.append
+            start, size = START, start_size
+            for _ in range(MAX_SENTENCE_WORDS):
+                x = draw() * size
+                i = int(x)
+                word, start, size, keep, alias = entries[start + i]
+                if x - i >= keep:
+                    word, start, size, keep, alias = entries[alias]
+                append(word)
+                if start == START:  # Only sentence ends lead back to the start state, whose entries come first
+                    break
+            else:
+                sentence[-1] = sentence[-1].rstrip(',;:-') + '.'
+            sentences.append(' '.join(sentence))
+        return sentences
+
+    def save(self, path: str) -> None:
+        vocabulary = '\n'.join(self.vocabulary).encode('utf-8')
+        columns = [self.offsets, self.words, self.successors, self.aliases, self.probs]
+        if sys.byteorder == 'big':
+            columns = [array(column.typecode, column) for column in columns]
+            for column in columns:
+                column.byteswap()
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(MODEL_HEADER.pack(MODEL_MAGIC, self.order, len(self.vocabulary), self.state_count,
+                                      len(self.words), self.fingerprint))
+            f.write(LENGTH.pack(len(vocabulary)))
+            f.write(vocabulary)
+            for column in columns:
+                column.tofile(f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'MarkovModel':
+        with open(path, 'rb') as f:
+            raw = f.read()
+        magic, order, vocabulary_size, state_count, entry_count, fingerprint = MODEL_HEADER.unpack_from(raw)
+        if magic != MODEL_MAGIC:
+            raise ValueError(f'{path} is not a Markov model')
+        position = MODEL_HEADER.size
+        (length,) = LENGTH.unpack_from(raw, position)
+        position += LENGTH.size
+        vocabulary = raw[position:position + length].decode('utf-8').split('\n')
+        position += length
+        if len(vocabulary) != vocabulary_size:
+            raise ValueError(f'{path} is corrupt')
+
+        columns = []
+        for typecode, count in (('I', state_count + 1), ('I', entry_count), ('I', entry_count),
+                                ('I', entry_count), ('d', entry_count)):
+            column = array(typecode)
+            end = position + column.itemsize * count
+            column.frombytes(raw[position:end])
+            if sys.byteorder == 'big':
+                column.byteswap()
+            columns.append(column)
+            position = end
+        if position != len(raw):
+            raise ValueError(f'{path} is corrupt')
+        return cls(order, vocabulary, *columns, fingerprint=fingerprint)
+
+
+Source = Union[str, Sequence[str]]
+
+
+def fingerprint(sources: Iterable[Source], order: int = DEFAULT_ORDER) -> bytes:
+    """Hash of the training sources: file paths by size and mtime, in-memory passages by content"""
+    digest = hashlib.sha256(MODEL_MAGIC + struct.pack('<Id', order, BACKOFF_WEIGHT))
+    for source in sources:
+        if isinstance(source, str):
+            stat = os.stat(source)
+            digest.update(f'file:{os.path.basename(source)}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+        else:
+            digest.update(f'texts:{len(source)}\n'.encode())
+            for passage in source:
+                digest.update(passage.encode('utf-8'))
+                digest.update(b'\n')
+    return digest.digest()
+
+
+def iter_passages(sources: Iterable[Source]) -> Iterable[str]:
+    for source in sources:
+        if isinstance(source, str):
+            with open(source, encoding='utf-8') as f:
+                yield from (line for line in f if line.strip())
+        else:
+            yield from source
+
+
+def model_path(language: str, directory: str = MARKOV_DIR) -> str:
+    return os.path.join(directory, language + MODEL_SUFFIX)
+
+
+def load_or_train(language: str, sources: Sequence[Source], order: int = DEFAULT_ORDER,
+                  directory: str = MARKOV_DIR) -> MarkovModel:
+    """The stored model for a language if it was built from these sources, else a freshly trained one
+
+    A freshly trained model is written back so the next process can load it;
+    read-only deployments just train again.
+    """
+    expected = fingerprint(sources, order)
+    path = model_path(language, directory)
+    if os.path.isfile(path):
+        try:
+            model = MarkovModel.load(path)
+        except (ValueError, struct.error):
+            model = None
+        if model is not None and model.fingerprint == expected:
+            return model
+
+    model = MarkovModel.train(iter_passages(sources), order, expected)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        model.save(path)
+    except OSError:
+        pass
+    return model
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Train and store the Markov models for every language')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="train languages from their curated texts and corpora")
+    build.add_argument('languages', nargs='*', help='languages to build (default: all)')
+    build.add_argument('--order', type=int, default=DEFAULT_ORDER)
+    build.add_argument('--force', action='store_true', help='retrain models that are already up to date')
+    args = parser.parse_args()
+
+    from app import language_registry, markov_sources  # The app knows where each language's texts live
+    for language in args.languages or language_registry.names():
+        sources = markov_sources(language)
+        if not sources:
+            print(f'{language}: no texts')
+            continue
+        if args.force:
+            model = MarkovModel.train(iter_passages(sources), args.order, fingerprint(sources, args.order))
+            os.makedirs(MARKOV_DIR, exist_ok=True)
+            model.save(model_path(language))
+        else:
+            model = load_or_train(language, sources, args.order)
+        print(f'{language}: {model.state_count} states, {len(model)} transitions, '
+              f'{len(model.vocabulary) - 1} words')
+
+if __name__ == '__main__':
+    main()
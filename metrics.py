@@ -0,0 +1,235 @@
+"""In-process request and generator metrics, rendered in the Prometheus text format
+
+Histograms and counters keep one flat list per label combination and are
+updated under a single uncontended lock, so recording an observation costs
+about a microsecond. Label values must come from small, known sets (route
+rules, status codes, parameter tiers) and never from raw user input.
+
+Set TYPEXI_METRICS=0 to turn recording off entirely. Set
+TYPEXI_PROFILE_SAMPLE_RATE to a fraction such as 0.01 to run that share of
+requests under cProfile; the aggregated profile is served at /metrics/profile.
+"""
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+ENABLED = os.environ.get('TYPEXI_METRICS', '1') != '0'
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+Labels = Tuple[str, ...]
+F = TypeVar('F', bound=Callable[..., Any])
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], lock: threading.Lock):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Labels, float] = {}
+        self._lock = lock
+
+    def inc(self, labels: Labels, amount: float = 1) -> None:
+        with self._lock:
+            self.inc_locked(labels, amount)
+
+    def inc_locked(self, labels: Labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.label_names, labels)} {_format_number(value)}'
+                for labels, value in sorted(values)]
+
+
+class Histogram:
+    """Bucketed observations per label combination: one counts list plus a running sum"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float],
+                 lock: threading.Lock):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.bounds = tuple(buckets)
+        # labels -> [count per bucket ..., count above the last bound, sum]
+        self._series: Dict[Labels, List[float]] = {}
+        self._lock = lock
+
+    def observe(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            self.observe_locked(labels, value)
+
+    def observe_locked(self, labels: Labels, value: float) -> None:
+        """observe() for callers already holding the registry lock"""
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.bounds) + 1) + [0.0]
+        series[bisect_left(self.bounds, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            snapshot = [(labels, list(series)) for labels, series in self._series.items()]
+        lines = []
+        for labels, series in sorted(snapshot):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float('inf'),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{float(bound)!r}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, labels)} {series[-1]!r}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        # One lock for every metric, so a request's observations are recorded with a single acquisition
+        self.lock = threading.Lock()
+        self._metrics: List[Any] = []
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, label_names, self.lock)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, label_names, buckets, self.lock)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram(
+    'typexi_request_duration_seconds', 'Time spent handling a request, by route and parameter tier',
+    ('route', 'method', 'params'))
+RESPONSE_BYTES = registry.histogram(
+    'typexi_response_size_bytes', 'Response body size (streamed responses are not counted)',
+    ('route',), SIZE_BUCKETS)
+REQUEST_ERRORS = registry.counter(
+    'typexi_request_errors_total', 'Responses with a 4xx or 5xx status', ('route', 'status'))
+GENERATOR_SECONDS = registry.histogram(
+    'typexi_generator_duration_seconds', 'Time spent in content generator functions', ('function',))
+
+
+METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+
+def observe_request(route: str, method: str, params: str, status: int, seconds: float,
+                    size: Optional[int]) -> None:
+    with registry.lock:
+        REQUEST_SECONDS.observe_locked((route, method if method in METHODS else 'OTHER', params), seconds)
+        if size is not None:
+            RESPONSE_BYTES.observe_locked((route,), size)
+        if status >= 400:
+            REQUEST_ERRORS.inc_locked((route, str(status)))
+
+
+def timed(function: str) -> Callable[[F], F]:
+    """Decorator recording a function's wall time in GENERATOR_SECONDS (a no-op with metrics off)"""
+    def decorate(fn: F) -> F:
+        if not ENABLED:
+            return fn
+        labels = (function,)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                GENERATOR_SECONDS.observe(labels, time.perf_counter() - started)
+        return wrapper  # type: ignore[return-value]
+    return decorate
+
+
+class SamplingProfiler:
+    """Profiles a random share of requests with cProfile and aggregates the results"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.sampled = 0
+        self._stats: Optional[pstats.Stats] = None
+        # Only one profiler can be active per interpreter; requests that find it busy are not sampled
+        self._active = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """A running profiler for this request, or None when it isn't sampled"""
+        if not self.enabled or random.random() >= self.rate or not self._active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Another profiling tool is active
+            self._active.release()
+            return None
+        return profile
+
+    def stop(self, profile: cProfile.Profile) -> None:
+        profile.disable()
+        self._active.release()
+        with self._stats_lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.sampled += 1
+
+    def report(self, limit: int = 40, sort: str = 'cumulative') -> str:
+        with self._stats_lock:
+            if self._stats is None:
+                return 'No requests sampled yet\n'
+            out = io.StringIO()
+            self._stats.stream = out
+            out.write(f'{self.sampled} sampled requests\n')
+            self._stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+profiler = SamplingProfiler(float(os.environ.get('TYPEXI_PROFILE_SAMPLE_RATE', 0)))
@@ -0,0 +1,381 @@
+"""Streaming percentile sketches: where a result falls among everyone with the same settings
+
+Each partition (test type, content type, category, duration) keeps one
+DDSketch per metric. A sketch counts values in logarithmic buckets whose
+width is a fixed fraction of the value, so any rank or quantile it reports
+is within RELATIVE_ACCURACY of the exact one. It is bounded at MAX_BINS
+buckets however many results it has seen. Two sketches merge by adding
+bucket counts, and that is how worker processes share them.
+
+Every worker folds new results into an unflushed delta. Every SYNC_INTERVAL
+seconds a background thread merges the delta into the rows in the result
+store's SQLite file inside one write transaction, then re-reads the rows
+other workers changed since its last sync. A rank query sees everything
+persisted at the last sync plus this worker's own results since then.
+"""
+import bisect
+import json
+import math
+import sqlite3
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+PARTITION_FIELDS = ('test_type', 'content_type', 'category', 'duration')
+METRICS = ('wpm', 'accuracy')
+
+# Buckets about 1% wide, so accuracies a point apart near 100% still rank apart
+RELATIVE_ACCURACY = 0.005
+MAX_BINS = 2048
+# Values below this (a 0 WPM abandoned test) all share the zero bucket
+MIN_VALUE = 1e-3
+SYNC_INTERVAL = 5.0
+
+SKETCH_MAGIC = b'TXDDS001'
+SKETCH_HEADER = struct.Struct('<8sdqqddI')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS percentile_sketches (
+    partition TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (partition, metric)
+);
+CREATE TABLE IF NOT EXISTS percentile_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+Partition = Tuple[Any, ...]
+SketchKey = Tuple[Partition, str]
+
+
+def partition_of(result: Dict[str, Any]) -> Partition:
+    return tuple(result.get(field) for field in PARTITION_FIELDS)
+
+
+class DDSketch:
+    """Mergeable quantile sketch with relative-error guarantees and a bounded number of buckets"""
+
+    __slots__ = ('relative_accuracy', '_log_gamma', 'bins', 'zero', 'count', 'min', 'max', '_compiled')
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self._log_gamma = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self.bins: Dict[int, int] = {}
+        self.zero = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        # (sorted bucket keys, values counted below each key); dropped on every change
+        self._compiled: Optional[Tuple[List[int], List[int]]] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def value(self, key: int) -> float:
+        """Representative value of a bucket, within the relative accuracy of everything in it"""
+        gamma = math.exp(self._log_gamma)
+        return 2 * gamma ** key / (gamma + 1)
+
+    def add(self, value: float, weight: int = 1) -> None:
+        if value < MIN_VALUE:
+            self.zero += weight
+        else:
+            key = self.key(value)
+            self.bins[key] = self.bins.get(key, 0) + weight
+            if len(self.bins) > MAX_BINS:
+                self._collapse()
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self._compiled = None
+
+    def merge(self, other: 'DDSketch') -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge sketches with different accuracies')
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        if len(self.bins) > MAX_BINS:
+            self._collapse()
+        self.zero += other.zero
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compiled = None
+
+    def _collapse(self) -> None:
+        # Fold the lowest buckets into the lowest one kept: ranks stay exact at the top, where they are read
+        keys = sorted(self.bins)
+        excess = keys[:len(keys) - MAX_BINS + 1]
+        self.bins[excess[-1]] = sum(self.bins.pop(key) for key in excess[:-1]) + self.bins[excess[-1]]
+
+    def _compile(self) -> Tuple[List[int], List[int]]:
+        compiled = self._compiled
+        if compiled is None:
+            keys = sorted(self.bins)
+            below, running = [], self.zero
+            for key in keys:
+                below.append(running)
+                running += self.bins[key]
+            compiled = self._compiled = (keys, below)
+        return compiled
+
+    def rank(self, value: float) -> float:
+        """Fraction of values below `value`, counting half of those in its bucket; 0 when empty"""
+        if not self.count:
+            return 0.0
+        if value < MIN_VALUE:
+            return self.zero / 2 / self.count
+        keys, below = self._compile()
+        key = self.key(value)
+        i = bisect.bisect_left(keys, key)
+        if i == len(keys):
+            return 1.0
+        tied = self.bins[key] if keys[i] == key else 0
+        return (below[i] + tied / 2) / self.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate value at quantile `q` (0 to 1); None when empty"""
+        if not self.count:
+            return None
+        target = q * (self.count - 1)
+        if target < self.zero:
+            return max(self.min, 0.0)
+        keys, below = self._compile()
+        i = bisect.bisect_right(below, target) - 1
+        return min(max(self.value(keys[i]), self.min), self.max)
+
+    def copy(self) -> 'DDSketch':
+        sketch = DDSketch(self.relative_accuracy)
+        sketch.merge(self)
+        return sketch
+
+    def to_bytes(self) -> bytes:
+        keys = sorted(self.bins)
+        return SKETCH_HEADER.pack(SKETCH_MAGIC, self.relative_accuracy, self.zero, self.count,
+                                  self.min, self.max, len(keys)) + \
+            struct.pack(f'<{len(keys)}i{len(keys)}q', *keys, *(self.bins[key] for key in keys))
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> 'DDSketch':
+        magic, accuracy, zero, count, low, high, size = SKETCH_HEADER.unpack_from(raw)
+        if magic != SKETCH_MAGIC:
+            raise ValueError('Not a percentile sketch')
+        columns = struct.unpack_from(f'<{size}i{size}q', raw, SKETCH_HEADER.size)
+        sketch = cls(accuracy)
+        sketch.bins = dict(zip(columns[:size], columns[size:]))
+        sketch.zero, sketch.count, sketch.min, sketch.max = zero, count, low, high
+        return sketch
+
+
+def fold(sketches: Dict[SketchKey, DDSketch], result: Dict[str, Any]) -> None:
+    """Add one result's metrics to the sketches of its partition"""
+    partition = partition_of(result)
+    for metric in METRICS:
+        value = result.get(metric)
+        if isinstance(value, (int, float)) and value >= 0:
+            sketch = sketches.get((partition, metric))
+            if sketch is None:
+                sketch = sketches[(partition, metric)] = DDSketch()
+            sketch.add(float(value))
+
+
+class SketchStore:
+    """Sketch rows shared by every worker process, in the same SQLite file as the results"""
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction that holds SQLite's write lock from the start, so read-merge-write can't interleave"""
+        with self._lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    @staticmethod
+    def get_meta(conn: sqlite3.Connection, key: str) -> Optional[int]:
+        row = conn.execute('SELECT value FROM percentile_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def set_meta(conn: sqlite3.Connection, key: str, value: int) -> None:
+        conn.execute('INSERT OR REPLACE INTO percentile_meta (key, value) VALUES (?, ?)', (key, value))
+
+    def merge(self, conn: sqlite3.Connection, sketches: Dict[SketchKey, DDSketch]) -> int:
+        """Add sketches into the stored rows under a new generation; returns that generation"""
+        generation = (self.get_meta(conn, 'generation') or 0) + 1
+        for (partition, metric), sketch in sketches.items():
+            name = json.dumps(partition)
+            row = conn.execute('SELECT data FROM percentile_sketches WHERE partition = ? AND metric = ?',
+                               (name, metric)).fetchone()
+            if row is not None:
+                stored = DDSketch.from_bytes(row[0])
+                stored.merge(sketch)
+                sketch = stored
+            conn.execute('INSERT OR REPLACE INTO percentile_sketches (partition, metric, generation, data) '
+                         'VALUES (?, ?, ?, ?)', (name, metric, generation, sketch.to_bytes()))
+        self.set_meta(conn, 'generation', generation)
+        return generation
+
+    def changed_since(self, generation: int) -> Tuple[int, Dict[SketchKey, DDSketch]]:
+        """Rows written after `generation`, with the store's current generation"""
+        with self._lock:
+            current = self.get_meta(self.connection, 'generation') or 0
+            if current <= generation:
+                return current, {}
+            rows = self.connection.execute('SELECT partition, metric, data FROM percentile_sketches WHERE generation > ?',
+                                      (generation,)).fetchall()
+        return current, {(tuple(json.loads(name)), metric): DDSketch.from_bytes(data) for name, metric, data in rows}
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class PercentileIndex:
+    """Per-partition sketches as this worker sees them: the persisted rows plus its own unflushed results"""
+
+    def __init__(self, store: Optional[SketchStore] = None, sync_interval: float = SYNC_INTERVAL):
+        self.store = store
+        self.sync_interval = sync_interval
+        self._delta: Dict[SketchKey, DDSketch] = {}
+        self._view: Dict[SketchKey, DDSketch] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        # Highest result id already in the persisted sketches, so it isn't counted again
+        self._replayed_through = 0
+        self._syncer: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.syncs = 0
+
+    def open(self, replay: Callable[[], Iterable[Dict[str, Any]]]) -> int:
+        """Load persisted sketches; the first worker ever to open the store builds them from `replay`
+
+        Returns how many results were replayed.
+        """
+        through = self.store.get_meta(self.store.connection, 'replayed_through') if self.store else None
+        count = 0
+        if through is None:
+            sketches: Dict[SketchKey, DDSketch] = {}
+            through = 0
+            for result in replay():
+                fold(sketches, result)
+                through = max(through, result.get('id') or 0)
+                count += 1
+            if self.store is None:
+                self._view = sketches
+            else:
+                # Scanned outside the write lock; whoever commits first wins and the others drop their scan
+                with self.store.transaction() as conn:
+                    stored = self.store.get_meta(conn, 'replayed_through')
+                    if stored is None:
+                        self.store.merge(conn, sketches)
+                        self.store.set_meta(conn, 'replayed_through', through)
+                    else:
+                        through, count = stored, 0
+        self._replayed_through = through
+        self.sync()
+        return count
+
+    def add(self, result: Dict[str, Any]) -> None:
+        if (result.get('id') or 0) and result['id'] <= self._replayed_through:
+            return
+        with self._lock:
+            fold(self._delta, result)
+            fold(self._view, result)
+        self._ensure_syncer()
+
+    def sketch(self, partition: Partition, metric: str) -> Optional[DDSketch]:
+        return self._view.get((partition, metric))
+
+    def rank(self, partition: Partition, metric: str, value: float) -> Tuple[float, int]:
+        """Percentile (0 to 100) of `value` within the partition, and how many results it is ranked against"""
+        sketch = self._view.get((partition, metric))
+        if sketch is None:
+            return 0.0, 0
+        with self._lock:
+            return sketch.rank(value) * 100, sketch.count
+
+    def quantiles(self, partition: Partition, metric: str, qs: Sequence[float]) -> List[Optional[float]]:
+        sketch = self._view.get((partition, metric))
+        if sketch is None:
+            return [None] * len(qs)
+        with self._lock:
+            return [sketch.quantile(q) for q in qs]
+
+    def sync(self) -> None:
+        """Merge this worker's unflushed results into the store, then pick up what other workers merged"""
+        if self.store is None:
+            return
+        with self._lock:
+            pending, self._delta = self._delta, {}
+        try:
+            if pending:
+                with self.store.transaction() as conn:
+                    self.store.merge(conn, pending)
+            generation, changed = self.store.changed_since(self._generation)
+        except Exception:
+            with self._lock:
+                for key, sketch in pending.items():
+                    self._delta.setdefault(key, DDSketch()).merge(sketch)
+            raise
+
+        if changed:
+            with self._lock:
+                # Rebuild the view only where rows changed: the new persisted row plus results since the swap
+                for key, sketch in changed.items():
+                    view = sketch.copy()
+                    if key in self._delta:
+                        view.merge(self._delta[key])
+                    self._view[key] = view
+        self._generation = generation
+        self.syncs += 1
+
+    def _ensure_syncer(self) -> None:
+        if self.store is None or (self._syncer is not None and self._syncer.is_alive()):
+            return
+        with self._lock:
+            if self._syncer is None or not self._syncer.is_alive():
+                self._syncer = threading.Thread(target=self._run_syncer, name='percentile-sync', daemon=True)
+                self._syncer.start()
+
+    def _run_syncer(self) -> None:
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.sync()
+            except sqlite3.Error:
+                pass  # Busy or read-only: the delta was kept and goes out with the next sync
+
+    def close(self) -> None:
+        """Stop the background sync and flush whatever is still unflushed"""
+        self._stop.set()
+        if self._syncer is not None:
+            self._syncer.join()
+        self.sync()
+        if self.store is not None:
+            self.store.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'partitions': len({partition for partition, _ in self._view}),
+            'results': sum(sketch.count for (_, metric), sketch in self._view.items() if metric == 'wpm'),
+            'unflushed': sum(sketch.count for (_, metric), sketch in self._delta.items() if metric == 'wpm'),
+            'generation': self._generation,
+            'syncs': self.syncs,
+        }
@@ -0,0 +1,151 @@
+"""Practice texts aimed at each user's weak keys
+
+Verified results carry the characters and bigrams the typist missed. They
+are folded into a per-user ErrorProfile, at a cost proportional to the
+number of distinct misses. A WordIndex maps every character and bigram to
+the words that contain it. Building a practice text picks one of the user's
+weaknesses (weighted by how often it was missed) and then a random word
+containing it, once per word. The cost depends on the text length, not on
+the vocabulary size.
+"""
+import heapq
+import random
+import re
+import threading
+from bisect import bisect
+from itertools import accumulate
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# How many of a user's most-missed characters and bigrams a practice text targets
+MAX_TARGETS = 24
+# Share of ordinary words mixed in, so a drill still reads as text and doesn't hammer one key
+FILLER_SHARE = 0.25
+# Misses of a bigram say more about the motion that failed than misses of the character alone
+BIGRAM_WEIGHT = 2.0
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+(?:['’-][^\W\d_]+)*")
+
+
+class ErrorProfile:
+    """Running miss counts per character and per bigram for one user"""
+
+    __slots__ = ('chars', 'bigrams', 'results', 'version', '_targets')
+
+    def __init__(self):
+        self.chars: Dict[str, int] = {}
+        self.bigrams: Dict[str, int] = {}
+        self.results = 0
+        self.version = 0
+        self._targets: Optional[Tuple[int, List[Tuple[str, float]]]] = None
+
+    def add(self, mistakes: Dict[str, Dict[str, int]]) -> None:
+        for char, count in mistakes.get('chars', {}).items():
+            self.chars[char] = self.chars.get(char, 0) + count
+        for bigram, count in mistakes.get('bigrams', {}).items():
+            self.bigrams[bigram] = self.bigrams.get(bigram, 0) + count
+        self.results += 1
+        self.version += 1
+
+    def targets(self, limit: int = MAX_TARGETS) -> List[Tuple[str, float]]:
+        """The most-missed characters and bigrams with their weights, recomputed only after new results"""
+        cached = self._targets
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        weighted = [(char, float(count)) for char, count in self.chars.items()]
+        weighted += [(bigram, count * BIGRAM_WEIGHT) for bigram, count in self.bigrams.items()]
+        targets = heapq.nlargest(limit, weighted, key=lambda item: item[1])
+        self._targets = (self.version, targets)
+        return targets
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'results': self.results, 'chars': dict(self.chars), 'bigrams': dict(self.bigrams)}
+
+
+class ProfileIndex:
+    """Error profiles for every user, rebuilt from persisted results and updated as results arrive"""
+
+    def __init__(self):
+        self._profiles: Dict[str, ErrorProfile] = {}
+        self._lock = threading.Lock()
+        # Highest result id covered by the last rebuild, so results saved mid-rebuild aren't counted twice
+        self._replayed_through = 0
+
+    def add(self, result: Dict[str, Any]) -> None:
+        user, mistakes = result.get('user'), result.get('mistakes')
+        if not user or not mistakes:
+            return
+        if (result.get('id') or 0) and result['id'] <= self._replayed_through:
+            return
+        with self._lock:
+            profile = self._profiles.get(user)
+            if profile is None:
+                profile = self._profiles[user] = ErrorProfile()
+            profile.add(mistakes)
+
+    def get(self, user: Optional[str]) -> Optional[ErrorProfile]:
+        return self._profiles.get(user) if user else None
+
+    def rebuild(self, results: Iterable[Dict[str, Any]]) -> int:
+        """Replace every profile with ones built from persisted results; returns how many were replayed"""
+        with self._lock:
+            self._profiles = {}
+            self._replayed_through = 0
+        count = 0
+        last_id = 0
+        for result in results:
+            self.add(result)
+            last_id = max(last_id, result.get('id') or 0)
+            count += 1
+        self._replayed_through = last_id
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        return {'users': len(self._profiles)}
+
+
+class WordIndex:
+    """Inverted index from every character and bigram to the vocabulary words containing it"""
+
+    def __init__(self, words: Iterable[str]):
+        self.words = sorted({word.lower() for word in words if len(word) > 1})
+        postings: Dict[str, List[int]] = {}
+        for word_id, word in enumerate(self.words):
+            grams = set(word)
+            grams.update(word[i:i + 2] for i in range(len(word) - 1))
+            for gram in grams:
+                postings.setdefault(gram, []).append(word_id)
+        self.postings = {gram: tuple(ids) for gram, ids in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def practice_words(self, targets: Sequence[Tuple[str, float]], count: int,
+                       rng: Optional[random.Random] = None) -> Tuple[List[str], List[str]]:
+        """`count` words drawn mostly from those containing the targets; also returns the targets used"""
+        rng = rng or random
+        usable = [(gram, weight) for gram, weight in targets if gram in self.postings]
+        if not usable:
+            return [self.words[rng.randrange(len(self.words))] for _ in range(count)], []
+
+        grams = [gram for gram, _ in usable]
+        cum_weights = list(accumulate(weight for _, weight in usable))
+        total = cum_weights[-1]
+        words, postings = self.words, self.postings
+        chosen = []
+        for _ in range(count):
+            if rng.random() < FILLER_SHARE:
+                chosen.append(words[rng.randrange(len(words))])
+                continue
+            ids = postings[grams[bisect(cum_weights, rng.random() * total)]]
+            chosen.append(words[ids[rng.randrange(len(ids))]])
+        return chosen, grams
+
+
+def vocabulary(word_lists: Iterable[Sequence[str]], passages: Iterable[str]) -> List[str]:
+    """Word lists plus every word appearing in the passages"""
+    words: List[str] = []
+    for word_list in word_lists:
+        words.extend(word_list)
+    for passage in passages:
+        words.extend(WORD_PATTERN.findall(passage))
+    return words
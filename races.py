@@ -0,0 +1,313 @@
+"""Race rooms: players type the same seeded text and watch each other's progress
+
+A room fixes the text settings and a seed, so every player gets the same
+text from /api/text. Players report their progress as often as they like.
+A report only overwrites the player's slot in the room's arrays and sets
+its bit in the room's dirty mask. Every TICK seconds the hub visits just
+the rooms that changed. For each one it encodes a single server-sent event
+holding the changed slots, and hands the same bytes to every subscriber
+of that room. A room of N players then costs one encode and N queue
+appends per tick, however many reports arrived in between.
+
+The hub is driven either by a ticker thread (WSGI, where each event
+stream holds a thread) or by a task on the event loop (asgi.py, where
+streams are coroutines and thousands of rooms fit in one process).
+"""
+import asyncio
+import json
+import os
+import secrets
+import threading
+import time
+from array import array
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+TICK = float(os.environ.get('TYPEXI_RACE_TICK', 0.1))
+MAX_ROOMS = int(os.environ.get('TYPEXI_RACE_ROOMS', 10000))
+MAX_PLAYERS = 16
+ROOM_TTL = 600
+COUNTDOWN = 3.0
+# Progress is reported in thousandths of the text, so it fits an unsigned short
+PROGRESS_SCALE = 1000
+# Events a subscriber may fall behind by before its backlog is replaced with a fresh snapshot
+MAX_PENDING = 64
+KEEPALIVE = 15.0
+KEEPALIVE_EVENT = b': keepalive\n\n'
+
+# Text settings a room fixes for all its players; anything per-user (practice, continuation) is left out
+TEXT_PARAMS = ('type', 'language', 'category', 'code_language', 'duration', 'random', 'generator', 'difficulty',
+               'tokens')
+
+
+def encode_event(name: str, payload: Dict[str, Any]) -> bytes:
+    return f'event: {name}\ndata: {json.dumps(payload, separators=(",", ":"))}\n\n'.encode('utf-8')
+
+
+class Subscriber:
+    """One event stream: encoded events waiting to be written, and how to wake the writer"""
+
+    __slots__ = ('room', 'messages', 'wake', 'resync', 'closed')
+
+    def __init__(self, room: 'Room', wake: Callable[[], None]):
+        self.room = room
+        self.messages: Deque[bytes] = deque()
+        self.wake = wake
+        self.resync = False
+        self.closed = False
+
+    def push(self, message: bytes) -> None:
+        if len(self.messages) >= MAX_PENDING:
+            # Deltas are useless with a gap, so a reader this far behind gets the whole state instead
+            self.messages.clear()
+            self.resync = True
+        else:
+            self.messages.append(message)
+        self.wake()
+
+    def drain(self) -> bytes:
+        """Everything pending, as one write"""
+        if self.resync:
+            self.resync = False
+            self.messages.clear()
+            return encode_event('state', self.room.snapshot())
+        chunks = []
+        while self.messages:
+            chunks.append(self.messages.popleft())
+        return b''.join(chunks)
+
+
+class Room:
+    """A race's players and their latest progress, one array slot per player"""
+
+    __slots__ = ('id', 'text_query', 'created', 'touched', 'start_at', 'names', 'tokens', 'progress', 'wpm',
+                 'finish_ms', 'places', 'dirty', 'events', 'subscribers')
+
+    def __init__(self, room_id: str, text_query: str, now: float):
+        self.id = room_id
+        self.text_query = text_query
+        self.created = self.touched = now
+        self.start_at: Optional[float] = None
+        self.names: List[str] = []
+        self.tokens: Dict[str, int] = {}
+        self.progress = array('H')
+        self.wpm = array('H')
+        # Milliseconds from the start to each player's finish, 0 while still typing
+        self.finish_ms = array('I')
+        self.places: List[int] = []
+        # Bit i set: slot i changed since the last tick
+        self.dirty = 0
+        # Events other than progress (joins, the start signal), sent ahead of the next progress event
+        self.events: List[bytes] = []
+        self.subscribers: Set[Subscriber] = set()
+
+    def join(self, name: str) -> Tuple[int, str]:
+        if len(self.names) >= MAX_PLAYERS:
+            raise ValueError('This race is full')
+        if self.start_at is not None:
+            raise ValueError('This race has already started')
+        slot = len(self.names)
+        token = secrets.token_urlsafe(12)
+        self.names.append(name)
+        self.tokens[token] = slot
+        self.progress.append(0)
+        self.wpm.append(0)
+        self.finish_ms.append(0)
+        self.events.append(encode_event('join', {'slot': slot, 'name': name}))
+        return slot, token
+
+    def slot_for(self, token: str) -> int:
+        slot = self.tokens.get(token)
+        if slot is None:
+            raise ValueError('Not a player in this race')
+        return slot
+
+    def start(self, now: float) -> None:
+        if self.start_at is None:
+            self.start_at = now + COUNTDOWN
+            self.events.append(encode_event('start', {'start_at': int(self.start_at * 1000)}))
+
+    def update(self, slot: int, progress: int, wpm: int, now: float) -> None:
+        if self.start_at is None or now < self.start_at:
+            raise ValueError('The race has not started yet')
+        if self.finish_ms[slot]:
+            return
+        progress = max(0, min(int(progress), PROGRESS_SCALE))
+        self.progress[slot] = max(self.progress[slot], progress)
+        self.wpm[slot] = max(0, min(int(wpm), 65535))
+        if progress == PROGRESS_SCALE:
+            self.finish_ms[slot] = max(1, int((now - self.start_at) * 1000))
+            self.places.append(slot)
+        self.dirty |= 1 << slot
+
+    def player(self, slot: int) -> List[int]:
+        place = self.places.index(slot) + 1 if self.finish_ms[slot] else 0
+        return [slot, self.progress[slot], self.wpm[slot], place]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'room': self.id,
+            'text_query': self.text_query,
+            'start_at': int(self.start_at * 1000) if self.start_at is not None else None,
+            'names': list(self.names),
+            'players': [self.player(slot) for slot in range(len(self.names))],
+        }
+
+    def flush(self) -> bytes:
+        """The pending events plus one progress event for every slot that changed, then clear them"""
+        dirty, self.dirty = self.dirty, 0
+        chunks, self.events = self.events, []
+        if dirty:
+            changed = [self.player(slot) for slot in range(len(self.names)) if dirty >> slot & 1]
+            chunks.append(encode_event('progress', {'players': changed}))
+        return b''.join(chunks)
+
+
+class RaceHub:
+    """Every room in the process, and the tick that fans their changes out"""
+
+    def __init__(self, tick: float = TICK, max_rooms: int = MAX_ROOMS, ttl: float = ROOM_TTL):
+        self.tick_interval = tick
+        self.max_rooms = max_rooms
+        self.ttl = ttl
+        self.rooms: Dict[str, Room] = {}
+        self._changed: Set[Room] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional['asyncio.Task[None]'] = None
+        self._next_expiry = 0.0
+        self.ticks = 0
+        self.broadcasts = 0
+        self.deliveries = 0
+
+    def _room(self, room_id: str) -> Room:
+        room = self.rooms.get(room_id)
+        if room is None:
+            raise KeyError(room_id)
+        return room
+
+    def create(self, text_query: str, name: str, now: Optional[float] = None) -> Tuple[Room, int, str]:
+        now = time.time() if now is None else now
+        with self._lock:
+            # Rooms nobody ever subscribed to are never ticked, so creating one also clears out stale ones
+            if now >= self._next_expiry or len(self.rooms) >= self.max_rooms:
+                self._expire(now)
+            if len(self.rooms) >= self.max_rooms:
+                raise ValueError('Too many races in progress, try again later')
+            room_id = secrets.token_urlsafe(6)
+            while room_id in self.rooms:
+                room_id = secrets.token_urlsafe(6)
+            room = self.rooms[room_id] = Room(room_id, text_query, now)
+            slot, token = room.join(name)
+        return room, slot, token
+
+    def join(self, room_id: str, name: str, now: Optional[float] = None) -> Tuple[Room, int, str]:
+        with self._lock:
+            room = self._room(room_id)
+            slot, token = room.join(name)
+            room.touched = time.time() if now is None else now
+            self._changed.add(room)
+        return room, slot, token
+
+    def start(self, room_id: str, token: str, now: Optional[float] = None) -> Room:
+        now = time.time() if now is None else now
+        with self._lock:
+            room = self._room(room_id)
+            if room.slot_for(token) != 0:
+                raise ValueError('Only the player who created the race can start it')
+            room.start(now)
+            room.touched = now
+            self._changed.add(room)
+        return room
+
+    def update(self, room_id: str, token: str, progress: int, wpm: int, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            room = self._room(room_id)
+            room.update(room.slot_for(token), progress, wpm, now)
+            room.touched = now
+            self._changed.add(room)
+
+    def subscribe(self, room_id: str, wake: Callable[[], None]) -> Subscriber:
+        """A new event stream for the room, primed with the room's current state"""
+        with self._lock:
+            room = self._room(room_id)
+            # Deliver what is pending to the existing subscribers now; the snapshot already includes it
+            self._send(room)
+            self._changed.discard(room)
+            subscriber = Subscriber(room, wake)
+            subscriber.messages.append(encode_event('state', room.snapshot()))
+            room.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            subscriber.room.subscribers.discard(subscriber)
+
+    def tick(self, now: Optional[float] = None) -> int:
+        """Send each changed room's merged update to its subscribers; returns how many rooms were sent"""
+        now = time.time() if now is None else now
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            sent = sum(self._send(room) for room in changed)
+            if now >= self._next_expiry:
+                self._expire(now)
+            self.ticks += 1
+        return sent
+
+    def _send(self, room: Room) -> bool:
+        message = room.flush()
+        if not message or not room.subscribers:
+            return False
+        for subscriber in room.subscribers:
+            subscriber.push(message)
+        self.deliveries += len(room.subscribers)
+        self.broadcasts += 1
+        return True
+
+    def _expire(self, now: float) -> None:
+        for room_id in [room_id for room_id, room in self.rooms.items() if now - room.touched > self.ttl]:
+            room = self.rooms.pop(room_id)
+            for subscriber in room.subscribers:
+                subscriber.closed = True
+                subscriber.wake()
+        self._next_expiry = now + self.ttl / 10
+
+    # Drivers
+
+    def ensure_thread(self) -> None:
+        """Tick from a background thread; for servers where event streams are threads"""
+        if self._task is not None or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run_thread, name='race-ticker', daemon=True)
+                self._thread.start()
+
+    def _run_thread(self) -> None:
+        while True:
+            started = time.monotonic()
+            self.tick()
+            time.sleep(max(0.0, self.tick_interval - (time.monotonic() - started)))
+
+    def ensure_task(self) -> None:
+        """Tick from a task on the running event loop, so subscribers can be woken without crossing threads"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run_task())
+
+    async def _run_task(self) -> None:
+        while True:
+            started = time.monotonic()
+            self.tick()
+            await asyncio.sleep(max(0.0, self.tick_interval - (time.monotonic() - started)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'rooms': len(self.rooms),
+            'players': sum(len(room.names) for room in self.rooms.values()),
+            'subscribers': sum(len(room.subscribers) for room in self.rooms.values()),
+            'ticks': self.ticks,
+            'broadcasts': self.broadcasts,
+            'deliveries': self.deliveries,
+            'driver': 'task' if self._task is not None else 'thread' if self._thread is not None else None,
+        }
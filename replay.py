@@ -0,0 +1,302 @@
+"""Compact keystroke replays: what was typed and when, in chunks that can be read by time range
+
+A replay is built from a verified keystroke log (see keystroke_analysis) and
+the text it was typed against, and stored as one blob:
+
+    8s   magic b'TXRPL001'
+    u32  header size h (little-endian)
+    h    header, all varints:
+           keystroke count, duration ms, chunk count,
+           compressed text size, then the text (raw deflate of its UTF-8),
+           per chunk: start ms (since the previous chunk's start), keystroke count,
+                      cursor position at its start (zigzag, since the previous chunk's),
+                      body size << 1 | 1 if the body is deflated
+    ...  the chunk bodies, back to back
+
+A chunk body holds its keystrokes' timings, then their keys:
+
+- Timings are the milliseconds since the previous keystroke (0 for the
+  chunk's first). A typist's intervals cluster, so the chunk starts with a
+  varint base and an interval within 254 ms above it is one byte, its offset
+  plus 1. Byte 0 is an interval of 0 (keys inserted by one input event) and
+  255 is followed by a varint of any other interval, such as a pause.
+- Keys are relative to the text. Typing the character the text expects at
+  the cursor is the common case, so the keys are varint pairs: how many
+  expected characters were typed in a row, then the key that broke the run
+  (0 for backspace, else its code point plus 1), ending with a final run.
+
+The body is raw-deflated when that makes it smaller, which short chunks
+often aren't. A new chunk starts every CHUNK_MS of typing; each carries its
+start time and cursor position, so a player can fetch the header and then
+only the chunks for the time range it wants to show, decoding each on its own.
+"""
+import os
+import struct
+import zlib
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+MAGIC = b'TXRPL001'
+PREFIX = struct.Struct('<8sI')
+CHUNK_MS = int(os.environ.get('TYPEXI_REPLAY_CHUNK_MS', 10000))
+
+BACKSPACE = 8  # As in keystroke logs
+KEY_BACKSPACE = 0
+KEY_OFFSET = 1
+DELTA_ZERO = 0
+DELTA_ESCAPE = 255
+DELTA_WINDOW = DELTA_ESCAPE - 1  # Intervals a chunk's base covers in one byte
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(buffer: bytes, offset: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _deflate(data: bytes) -> bytes:
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, 9)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _inflate(data: bytes) -> bytes:
+    return zlib.decompress(data, -15)
+
+
+class Chunk(NamedTuple):
+    start_ms: int
+    end_ms: int
+    first: int  # Index of its first keystroke
+    count: int
+    position: int  # Cursor position before its first keystroke
+    offset: int  # Byte offset in the blob
+    size: int
+    deflated: bool
+
+
+def _delta_base(deltas: Sequence[int]) -> int:
+    """The start of the DELTA_WINDOW-wide range holding the most of a chunk's nonzero intervals"""
+    ordered = sorted(delta for delta in deltas if delta)
+    best = best_count = low = 0
+    for high, delta in enumerate(ordered):
+        while delta - ordered[low] >= DELTA_WINDOW:
+            low += 1
+        if high - low + 1 > best_count:
+            best, best_count = ordered[low], high - low + 1
+    return best
+
+
+def _encode_chunk(deltas: Sequence[int], symbols: Sequence[Optional[int]]) -> Tuple[bytes, bool]:
+    """A chunk's body and whether it was deflated (only when that makes it smaller)"""
+    out = bytearray()
+    base = _delta_base(deltas)
+    _write_varint(out, base)
+    for delta in deltas:
+        if not delta:
+            out.append(DELTA_ZERO)
+        elif 0 <= delta - base < DELTA_WINDOW:
+            out.append(delta - base + 1)
+        else:
+            out.append(DELTA_ESCAPE)
+            _write_varint(out, delta)
+    run = 0
+    for symbol in symbols:
+        if symbol is None:
+            run += 1
+        else:
+            _write_varint(out, run)
+            _write_varint(out, symbol)
+            run = 0
+    _write_varint(out, run)
+    compressed = _deflate(bytes(out))
+    return (compressed, True) if len(compressed) < len(out) else (bytes(out), False)
+
+
+def encode(deltas: Sequence[int], keys: Sequence[int], text: str, chunk_ms: int = CHUNK_MS) -> bytes:
+    """The replay blob for a keystroke log (deltas in ms, keys as code points or 8) and its text"""
+    # Split into chunks and turn keys into text-relative symbols (None for the expected character),
+    # tracking the cursor as the player will
+    chunks: List[List[Any]] = []  # [start ms, cursor position, deltas, symbols]
+    elapsed = position = 0
+    chunk: Optional[List[Any]] = None
+    for delta, key in zip(deltas, keys):
+        delta, key = int(delta), int(key)
+        elapsed += delta
+        if chunk is None or elapsed >= chunk[0] + chunk_ms:
+            chunk = [elapsed, position, [], []]
+            chunks.append(chunk)
+            delta = 0
+        chunk[2].append(delta)
+        if key == BACKSPACE:
+            chunk[3].append(KEY_BACKSPACE)
+            position = max(position - 1, 0)
+            continue
+        if position < len(text) and ord(text[position]) == key:
+            chunk[3].append(None)
+        else:
+            chunk[3].append(key + KEY_OFFSET)
+        position += 1
+
+    compressed_text = _deflate(text.encode('utf-8'))
+    header = bytearray()
+    for value in (sum(len(chunk[2]) for chunk in chunks), elapsed, len(chunks), len(compressed_text)):
+        _write_varint(header, value)
+    header += compressed_text
+
+    bodies = []
+    previous_start = previous_position = 0
+    for start, start_position, chunk_deltas, symbols in chunks:
+        body, deflated = _encode_chunk(chunk_deltas, symbols)
+        for value in (start - previous_start, len(chunk_deltas), _zigzag(start_position - previous_position),
+                      len(body) << 1 | deflated):
+            _write_varint(header, value)
+        previous_start, previous_position = start, start_position
+        bodies.append(body)
+    return PREFIX.pack(MAGIC, len(header)) + bytes(header) + b''.join(bodies)
+
+
+class Replay:
+    """A replay's header: the text, totals and the chunk index, parsed without touching the chunks"""
+
+    __slots__ = ('text', 'keystrokes', 'duration_ms', 'chunks')
+
+    def __init__(self, text: str, keystrokes: int, duration_ms: int, chunks: List[Chunk]):
+        self.text = text
+        self.keystrokes = keystrokes
+        self.duration_ms = duration_ms
+        self.chunks = chunks
+
+    @staticmethod
+    def header_size(prefix: bytes) -> int:
+        """Bytes before the first chunk, from the blob's first PREFIX.size bytes"""
+        if len(prefix) < PREFIX.size:
+            raise ValueError('Not a replay')
+        magic, size = PREFIX.unpack_from(prefix)
+        if magic != MAGIC:
+            raise ValueError('Not a replay')
+        return PREFIX.size + size
+
+    @classmethod
+    def parse(cls, head: bytes) -> 'Replay':
+        """Parse the first header_size() bytes of a blob (or the whole blob); ValueError if they aren't a replay's"""
+        cls.header_size(head)
+        try:
+            return cls._parse(head)
+        except (IndexError, zlib.error) as e:
+            raise ValueError('Corrupt replay header') from e
+
+    @classmethod
+    def _parse(cls, head: bytes) -> 'Replay':
+        offset = PREFIX.size
+        keystrokes, offset = _read_varint(head, offset)
+        duration_ms, offset = _read_varint(head, offset)
+        count, offset = _read_varint(head, offset)
+        text_size, offset = _read_varint(head, offset)
+        text = _inflate(head[offset:offset + text_size]).decode('utf-8')
+        offset += text_size
+
+        raw = []
+        start = position = 0
+        for _ in range(count):
+            start_delta, offset = _read_varint(head, offset)
+            keys, offset = _read_varint(head, offset)
+            position_delta, offset = _read_varint(head, offset)
+            size, offset = _read_varint(head, offset)
+            start += start_delta
+            position += _unzigzag(position_delta)
+            raw.append((start, keys, position, size >> 1, bool(size & 1)))
+
+        chunks = []
+        data_offset = cls.header_size(head)
+        first = 0
+        for i, (start, keys, position, size, deflated) in enumerate(raw):
+            end = raw[i + 1][0] if i + 1 < len(raw) else duration_ms + 1
+            chunks.append(Chunk(start, end, first, keys, position, data_offset, size, deflated))
+            data_offset += size
+            first += keys
+        return cls(text, keystrokes, duration_ms, chunks)
+
+    def select(self, start_ms: int = 0, end_ms: Optional[int] = None) -> List[Chunk]:
+        """The chunks with keystrokes in [start_ms, end_ms)"""
+        return [chunk for chunk in self.chunks
+                if chunk.end_ms > start_ms and (end_ms is None or chunk.start_ms < end_ms)]
+
+    def decode_chunk(self, chunk: Chunk, data: bytes) -> Dict[str, Any]:
+        """A chunk's keystrokes as absolute times (ms since the start) and keys (code points, 8 for backspace)
+
+        Raises ValueError if the data isn't that chunk's body.
+        """
+        try:
+            decoded = self._decode_chunk(chunk, data)
+        except (IndexError, zlib.error) as e:
+            raise ValueError('Corrupt replay chunk') from e
+        if len(decoded['keys']) != chunk.count:
+            raise ValueError('Corrupt replay chunk')
+        return decoded
+
+    def _decode_chunk(self, chunk: Chunk, data: bytes) -> Dict[str, Any]:
+        body = _inflate(data) if chunk.deflated else data
+        base, offset = _read_varint(body, 0)
+        times = []
+        elapsed = chunk.start_ms
+        for _ in range(chunk.count):
+            code = body[offset]
+            offset += 1
+            if code == DELTA_ESCAPE:
+                delta, offset = _read_varint(body, offset)
+                elapsed += delta
+            elif code != DELTA_ZERO:
+                elapsed += base + code - 1
+            times.append(elapsed)
+
+        keys: List[int] = []
+        text = self.text
+        position = chunk.position
+        while True:
+            run, offset = _read_varint(body, offset)
+            keys.extend(ord(char) for char in text[position:position + run])
+            position += run
+            if len(keys) >= chunk.count:
+                break
+            symbol, offset = _read_varint(body, offset)
+            if symbol == KEY_BACKSPACE:
+                keys.append(BACKSPACE)
+                position = max(position - 1, 0)
+            else:
+                keys.append(symbol - KEY_OFFSET)
+                position += 1
+        return {'start_ms': chunk.start_ms, 'position': chunk.position, 'times': times, 'keys': keys}
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            'text': self.text,
+            'keystrokes': self.keystrokes,
+            'duration_ms': self.duration_ms,
+            'chunks': [[chunk.start_ms, chunk.end_ms] for chunk in self.chunks],
+        }
+
+
+def decode(blob: bytes) -> Tuple[Replay, Iterator[Dict[str, Any]]]:
+    """Parse a whole blob: its header and a lazy iterator of decoded chunks"""
+    replay = Replay.parse(blob)
+    return replay, (replay.decode_chunk(chunk, blob[chunk.offset:chunk.offset + chunk.size])
+                    for chunk in replay.chunks)
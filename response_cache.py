@@ -0,0 +1,96 @@
+"""Size-capped LRU of pre-encoded response bodies, each stored alongside its compressed variants"""
+import gzip
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip and identity are always available
+    brotli = None
+
+# Preferred order when the client accepts several encodings
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress_variants(body: bytes) -> Dict[str, bytes]:
+    """The identity body plus every compressed variant this process can produce"""
+    variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    return variants
+
+
+class EncodedResponseCache:
+    """Maps a key to {encoding: bytes}, evicting least recently used entries past max_bytes"""
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Hashable, Dict[str, bytes]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _entry_size(variants: Dict[str, bytes]) -> int:
+        return sum(len(body) for body in variants.values())
+
+    def get_or_build(self, key: Hashable, build: Callable[[], bytes]) -> Dict[str, bytes]:
+        """Cached variants for key; on a miss, encode and compress once and keep the result"""
+        with self._lock:
+            variants = self._entries.get(key)
+            if variants is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return variants
+            self.misses += 1
+
+        variants = compress_variants(build())
+        entry_size = self._entry_size(variants)
+        if entry_size > self.max_bytes:
+            return variants
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = variants
+                self.size += entry_size
+                while self.size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size -= self._entry_size(evicted)
+                    self.evictions += 1
+        return variants
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'encodings': ['identity', *ENCODINGS],
+        }
+
+
+def choose_encoding(accept_encodings: Any) -> Optional[str]:
+    """Best compressed encoding the client accepts (werkzeug Accept object), or None for identity"""
+    for encoding in ENCODINGS:
+        if accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def negotiate(variants: Dict[str, bytes], accept_encodings: Any) -> Tuple[bytes, Optional[str]]:
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None or encoding not in variants:
+        return variants['identity'], None
+    return variants[encoding], encoding
+
+
+def cache_from_env() -> EncodedResponseCache:
+    return EncodedResponseCache(int(os.environ.get('TYPEXI_RESPONSE_CACHE_BYTES', 8 * 1024 * 1024)))
@@ -0,0 +1,333 @@
+"""Durable result storage: embedded SQLite in WAL mode behind a group-commit writer queue
+
+Results may carry a client-generated idempotency key. The key has a unique
+index, so saving a result whose key is already stored inserts nothing and
+reports the stored row's id instead (see idempotency.py).
+
+A result may also carry a keystroke replay (see replay.py), written to its own
+table in the same transaction as the result and read back in byte ranges.
+"""
+import json
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Columns pulled out of the result dict so they can be filtered and indexed
+INDEXED_COLUMNS = ('timestamp', 'test_type', 'content_type', 'language', 'category', 'duration', 'wpm', 'accuracy')
+FILTER_COLUMNS = ('test_type', 'content_type', 'language', 'category', 'duration')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp INTEGER NOT NULL,
+    test_type TEXT,
+    content_type TEXT,
+    language TEXT,
+    category TEXT,
+    duration INTEGER,
+    wpm REAL,
+    accuracy REAL,
+    data TEXT NOT NULL,
+    idempotency_key TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_results_timestamp ON results (timestamp);
+CREATE TABLE IF NOT EXISTS replays (
+    result_id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+);
+"""
+
+# Databases created before idempotency keys get the column added when opened
+KEY_INDEX = 'CREATE UNIQUE INDEX IF NOT EXISTS idx_results_idempotency_key ON results (idempotency_key)'
+
+INSERT = ('INSERT INTO results (timestamp, test_type, content_type, language, category, duration, '
+          'wpm, accuracy, data, idempotency_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+_STOP = object()
+
+# results, their idempotency keys and replays, the future to resolve, and whether it was a single submit()
+QueueItem = Tuple[List[Dict[str, Any]], List[Optional[str]], List[Optional[bytes]], Future, bool]
+
+
+class ResultStore:
+    """Append-mostly result table; writes from all request threads are committed in shared transactions"""
+
+    def __init__(self, path: str, batch_size: int = 256, linger: float = 0.002, busy_timeout: float = 5.0):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.linger = linger
+        self.busy_timeout = busy_timeout
+
+        self._queue: 'queue.Queue[Any]' = queue.Queue()
+        self._local = threading.local()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+        self.commits = 0
+        self.rows_written = 0
+
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        if 'idempotency_key' not in {row['name'] for row in conn.execute('PRAGMA table_info(results)')}:
+            conn.execute('ALTER TABLE results ADD COLUMN idempotency_key TEXT')
+        conn.execute(KEY_INDEX)
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # FULL keeps every commit durable; group commit is what keeps the fsync count down
+        conn.execute('PRAGMA synchronous=FULL')
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # Writes
+
+    def submit(self, result: Dict[str, Any], replay: Optional[bytes] = None) -> 'Future[int]':
+        """Queue a result (and its replay) for the next group commit; the future resolves to its row id"""
+        future: 'Future[int]' = Future()
+        self._ensure_writer()
+        self._queue.put(([result], [None], [replay], future, True))
+        return future
+
+    def save(self, result: Dict[str, Any], replay: Optional[bytes] = None, timeout: Optional[float] = 10.0) -> int:
+        """Queue a result and block until the transaction containing it is durable"""
+        return self.submit(result, replay).result(timeout)
+
+    def submit_many(self, results: Sequence[Dict[str, Any]], keys: Sequence[Optional[str]],
+                    replays: Optional[Sequence[Optional[bytes]]] = None) -> 'Future[List[Tuple[int, bool]]]':
+        """Queue results to be committed together, each with an optional idempotency key and replay
+
+        The future resolves to an (id, inserted) pair per result; inserted is False
+        when a result with the same key was already stored, and id is that result's.
+        """
+        future: 'Future[List[Tuple[int, bool]]]' = Future()
+        self._ensure_writer()
+        replays = list(replays) if replays is not None else [None] * len(results)
+        self._queue.put((list(results), list(keys), replays, future, False))
+        return future
+
+    def save_many(self, results: Sequence[Dict[str, Any]], keys: Sequence[Optional[str]],
+                  replays: Optional[Sequence[Optional[bytes]]] = None,
+                  timeout: Optional[float] = 10.0) -> List[Tuple[int, bool]]:
+        return self.submit_many(results, keys, replays).result(timeout)
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run_writer, name='result-store-writer', daemon=True)
+                self._writer.start()
+
+    def _run_writer(self) -> None:
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            stop = self._drain(batch)
+            self._commit(conn, batch)
+            if stop:
+                break
+        conn.close()
+
+    def _drain(self, batch: List[QueueItem]) -> bool:
+        """Collect whatever else is queued (waiting at most `linger` for stragglers) into one batch"""
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get(timeout=self.linger) if self.linger else self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if item is _STOP:
+                return True
+            batch.append(item)
+        return False
+
+    def _commit(self, conn: sqlite3.Connection,
+                batch: List[QueueItem]) -> None:
+        try:
+            outcomes = self._insert_items(conn, batch)
+        except Exception as e:
+            for _, _, _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        self.commits += 1
+        for (_, _, _, future, single), outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+                continue
+            self.rows_written += sum(1 for _, inserted in outcome if inserted)
+            future.set_result(outcome[0][0] if single else outcome)
+
+    def _insert_items(self, conn: sqlite3.Connection,
+                      batch: List[QueueItem]) -> List[Union[List[Tuple[int, bool]], Exception]]:
+        """Insert every queued submission in one transaction, each under its own savepoint
+
+        A submission whose rows can't be stored (a value SQLite can't bind or a constraint refuses) is rolled back
+        and gets its error; the other submissions sharing the transaction are still committed.
+        """
+        outcomes: List[Union[List[Tuple[int, bool]], Exception]] = []
+        conn.execute('BEGIN')
+        try:
+            for results, keys, replays, _, _ in batch:
+                conn.execute('SAVEPOINT submission')
+                try:
+                    outcomes.append([self._insert_row(conn, *row) for row in zip(results, keys, replays)])
+                except (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError,
+                        OverflowError, TypeError, ValueError) as e:
+                    conn.execute('ROLLBACK TO submission')
+                    outcomes.append(e)
+                conn.execute('RELEASE submission')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return outcomes
+
+    @staticmethod
+    def _insert_row(conn: sqlite3.Connection, result: Dict[str, Any], key: Optional[str],
+                    replay: Optional[bytes]) -> Tuple[int, bool]:
+        values = [result.get(column) for column in INDEXED_COLUMNS] + [json.dumps(result), key]
+        if key is None:
+            cursor = conn.execute(INSERT, values)
+        else:
+            cursor = conn.execute(INSERT + ' ON CONFLICT (idempotency_key) DO NOTHING', values)
+        if not cursor.rowcount:
+            # Stored before, possibly earlier in this very transaction
+            existing = conn.execute('SELECT id FROM results WHERE idempotency_key = ?', (key,)).fetchone()
+            return existing[0], False
+        if replay is not None:
+            conn.execute('INSERT INTO replays (result_id, data) VALUES (?, ?)', (cursor.lastrowid, replay))
+        return cursor.lastrowid, True
+
+    def close(self) -> None:
+        """Flush queued writes and stop the writer thread"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+
+    # Reads
+
+    @staticmethod
+    def _row_to_result(row: sqlite3.Row) -> Dict[str, Any]:
+        result = json.loads(row['data'])
+        result['id'] = row['id']
+        return result
+
+    @staticmethod
+    def _where(filters: Dict[str, Any], since: Optional[int] = None) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for column, value in filters.items():
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f'Cannot filter results by {column!r}')
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        if since is not None:
+            clauses.append('timestamp >= ?')
+            params.append(since)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def get(self, result_id: int) -> Optional[Dict[str, Any]]:
+        """Fetch a single result by id"""
+        row = self._reader().execute('SELECT id, data FROM results WHERE id = ?', (result_id,)).fetchone()
+        return self._row_to_result(row) if row else None
+
+    def recent(self, limit: int = 50, **filters: Any) -> List[Dict[str, Any]]:
+        """Newest results first, optionally filtered by test settings"""
+        where, params = self._where(filters)
+        rows = self._reader().execute(
+            f'SELECT id, data FROM results{where} ORDER BY id DESC LIMIT ?', params + [limit]
+        ).fetchall()
+        return [self._row_to_result(row) for row in rows]
+
+    def ids_for_keys(self, keys: Iterable[str]) -> Dict[str, int]:
+        """Stored result ids for whichever of the idempotency keys have been saved"""
+        keys = list(keys)
+        found: Dict[str, int] = {}
+        # Well under SQLite's bound-parameter limit per query
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._reader().execute(
+                f'SELECT idempotency_key, id FROM results WHERE idempotency_key IN ({",".join("?" * len(chunk))})',
+                chunk,
+            ).fetchall()
+            found.update((row[0], row[1]) for row in rows)
+        return found
+
+    def recent_keys(self, limit: int) -> List[Tuple[str, int]]:
+        """The newest `limit` (idempotency key, id) pairs, oldest first"""
+        rows = self._reader().execute(
+            'SELECT idempotency_key, id FROM results WHERE idempotency_key IS NOT NULL ORDER BY id DESC LIMIT ?',
+            (limit,),
+        ).fetchall()
+        return [(row[0], row[1]) for row in reversed(rows)]
+
+    def replay_size(self, result_id: int) -> Optional[int]:
+        """Size in bytes of a result's stored replay, or None if it has none"""
+        row = self._reader().execute('SELECT length(data) FROM replays WHERE result_id = ?', (result_id,)).fetchone()
+        return row[0] if row else None
+
+    def replay_range(self, result_id: int, offset: int, length: int) -> bytes:
+        """`length` bytes of a result's replay from `offset` (empty if it has none)"""
+        conn = self._reader()
+        if hasattr(conn, 'blobopen'):
+            # Incremental blob I/O (Python 3.11+) reads only the pages holding the range
+            try:
+                with conn.blobopen('replays', 'data', result_id, readonly=True) as blob:
+                    blob.seek(offset)
+                    return blob.read(length)
+            except sqlite3.OperationalError:  # No such row
+                return b''
+        row = conn.execute(
+            'SELECT substr(data, ?, ?) FROM replays WHERE result_id = ?', (offset + 1, length, result_id)
+        ).fetchone()
+        return bytes(row[0]) if row else b''
+
+    def count(self, **filters: Any) -> int:
+        """Number of stored results matching the filters"""
+        where, params = self._where(filters)
+        return self._reader().execute(f'SELECT COUNT(*) FROM results{where}', params).fetchone()[0]
+
+    def iter_results(self, since: Optional[int] = None, page_size: int = 1000, **filters: Any) -> Iterator[Dict[str, Any]]:
+        """Stream results oldest first in id-keyed pages, for index rebuilds and exports"""
+        where, params = self._where(filters, since)
+        where = where + (' AND' if where else ' WHERE') + ' id > ?'
+        last_id = 0
+        while True:
+            rows = self._reader().execute(
+                f'SELECT id, data FROM results{where} ORDER BY id LIMIT ?', params + [last_id, page_size]
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._row_to_result(row)
+            last_id = rows[-1]['id']
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'path': self.path,
+            'commits': self.commits,
+            'rows_written': self.rows_written,
+            'queued': self._queue.qsize(),
+        }
+
+
+def store_from_env() -> ResultStore:
+    """Open the store at TYPEXI_DB_PATH (defaults to the temp dir, the only writable path on Vercel)"""
+    path = os.environ.get('TYPEXI_DB_PATH') or os.path.join(tempfile.gettempdir(), 'typexi_results.sqlite3')
+    return ResultStore(path, batch_size=int(os.environ.get('TYPEXI_DB_BATCH', 256)))
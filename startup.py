@@ -0,0 +1,209 @@
+"""Cold-start control: what is built while the app is imported and what waits for first use
+
+Serverless deployments import the app again on every cold start, so the
+import itself is on the critical path of a request. TYPEXI_STARTUP=lazy (the
+default when VERCEL is set) keeps it to the minimum. Optional heavy modules
+such as NumPy are bound but not executed until first touched, and derived
+artifacts (metadata bodies, compiled templates, word indexes) are built by
+the first request that needs them. TYPEXI_STARTUP=eager builds everything
+while importing, which suits long-running servers that warm up before
+serving.
+
+Artifacts can also be loaded from a snapshot instead of being rebuilt:
+
+    python startup.py snapshot [path]
+
+pickles every registered artifact. On start the snapshot's fingerprint of
+the modules and data files is checked, and a stale snapshot is ignored.
+TYPEXI_SNAPSHOT points at the file (default data/snapshot.pickle).
+TYPEXI_STARTUP_BUDGET_MS is the import-time budget reported in /api/stats
+and by benchmarks/bench_startup.py.
+"""
+import argparse
+import hashlib
+import importlib
+import importlib.util
+import os
+import pickle
+import sys
+import threading
+import time
+import types
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+LAZY = os.environ.get('TYPEXI_STARTUP', 'lazy' if os.environ.get('VERCEL') else 'eager') == 'lazy'
+BUDGET_MS = float(os.environ.get('TYPEXI_STARTUP_BUDGET_MS', 250))
+SNAPSHOT_PATH = os.environ.get('TYPEXI_SNAPSHOT', os.path.join(ROOT, 'data', 'snapshot.pickle'))
+SNAPSHOT_VERSION = 1
+# Larger data files (corpora) are fingerprinted by size alone, so checking a snapshot stays cheap
+HASHED_FILE_LIMIT = 1024 * 1024
+
+
+def optional_module(name: str) -> Any:
+    """An optional dependency: None when it isn't installed, otherwise the module
+
+    In lazy mode the module is only executed when one of its attributes is first used.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return None
+    if not LAZY:
+        return importlib.import_module(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def loaded(module: Any) -> bool:
+    """Whether an optional module is installed and has actually been executed"""
+    # The lazy loader swaps the module's class back to ModuleType once it has run it
+    return module is not None and type(module) is types.ModuleType
+
+
+def source_fingerprint(root: str = ROOT, exclude: str = SNAPSHOT_PATH) -> str:
+    """Hash of the modules and data files artifacts are built from"""
+    digest = hashlib.sha256(str(SNAPSHOT_VERSION).encode())
+    paths = [os.path.join(root, name) for name in os.listdir(root) if name.endswith('.py')]
+    for directory, dirnames, filenames in os.walk(os.path.join(root, 'data')):
+        dirnames.sort()
+        paths.extend(os.path.join(directory, name) for name in filenames)
+    for path in sorted(paths):
+        if os.path.abspath(path) == os.path.abspath(exclude) or path.endswith('.tmp'):
+            continue
+        size = os.path.getsize(path)
+        digest.update(f'{os.path.relpath(path, root)}:{size}\n'.encode())
+        if size <= HASHED_FILE_LIMIT:
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+class Snapshot:
+    """Artifacts pickled by a previous process, read on first lookup"""
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        self.status = 'unread'
+        self.load_ms = 0.0
+        self._artifacts: Optional[Dict[Tuple[str, Tuple], Any]] = None
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[Tuple[str, Tuple], Any]:
+        if self._artifacts is not None:
+            return self._artifacts
+        with self._lock:
+            if self._artifacts is None:
+                started = time.perf_counter()
+                self._artifacts = {}
+                if not os.path.isfile(self.path):
+                    self.status = 'missing'
+                else:
+                    try:
+                        with open(self.path, 'rb') as f:
+                            contents = pickle.load(f)
+                    except Exception:
+                        contents = {}
+                    if contents.get('version') != SNAPSHOT_VERSION or \
+                            contents.get('fingerprint') != source_fingerprint(exclude=self.path):
+                        self.status = 'stale'
+                    else:
+                        self._artifacts = contents['artifacts']
+                        self.status = 'loaded'
+                self.load_ms = (time.perf_counter() - started) * 1000
+        return self._artifacts
+
+    def get(self, key: Tuple[str, Tuple], default: Any = None) -> Any:
+        return self._read().get(key, default)
+
+    def write(self, artifacts: Dict[Tuple[str, Tuple], Any]) -> None:
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump({'version': SNAPSHOT_VERSION, 'fingerprint': source_fingerprint(exclude=self.path),
+                         'artifacts': artifacts},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+
+
+snapshot = Snapshot()
+
+_MISSING = object()
+
+
+class Artifact:
+    """A derived structure built once per argument tuple: from the snapshot when it has it, else by the builder"""
+
+    def __init__(self, name: str, build: Callable[..., Any], keys: Callable[[], Iterable[Tuple]]):
+        self.name = name
+        self.build = build
+        self.keys = keys
+        self._values: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+        self.built = 0
+
+    def __call__(self, *args: Hashable) -> Any:
+        value = self._values.get(args, _MISSING)
+        if value is _MISSING:
+            with self._lock:
+                value = self._values.get(args, _MISSING)
+                if value is _MISSING:
+                    value = snapshot.get((self.name, args), _MISSING)
+                    if value is _MISSING:
+                        value = self.build(*args)
+                        self.built += 1
+                    self._values[args] = value
+        return value
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            self._values = {}
+
+
+ARTIFACTS: Dict[str, Artifact] = {}
+
+
+def artifact(name: str, keys: Callable[[], Iterable[Tuple]] = lambda: [()]) -> Callable[[Callable[..., Any]], Artifact]:
+    """Register a builder as a snapshot-able artifact; `keys` lists the argument tuples a snapshot should hold"""
+    def register(build: Callable[..., Any]) -> Artifact:
+        wrapped = ARTIFACTS[name] = Artifact(name, build, keys)
+        return wrapped
+    return register
+
+
+def build_all() -> Dict[Tuple[str, Tuple], Any]:
+    return {(name, args): entry.build(*args) for name, entry in ARTIFACTS.items() for args in entry.keys()}
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        'mode': 'lazy' if LAZY else 'eager',
+        'budget_ms': BUDGET_MS,
+        'snapshot': snapshot.status,
+        'snapshot_load_ms': round(snapshot.load_ms, 2),
+        'artifacts': {name: {'ready': len(entry._values), 'built': entry.built} for name, entry in ARTIFACTS.items()},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Precompute startup artifacts into a snapshot file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('snapshot', help='build every registered artifact and pickle them')
+    build.add_argument('path', nargs='?', default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    import app  # noqa: F401  Registers the app's artifacts, in the imported copy of this module
+    registered = sys.modules['startup']
+    artifacts = registered.build_all()
+    registered.Snapshot(args.path).write(artifacts)
+    names: List[str] = sorted({name for name, _ in artifacts})
+    print(f'{args.path}: {len(artifacts)} artifacts ({", ".join(names)}), {os.path.getsize(args.path)} bytes')
+
+
+if __name__ == '__main__':
+    main()
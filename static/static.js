@@ -276,6 +276,9 @@ class TypeXiApp {
 class TypingTest {
     constructor() {
         this.currentText = '';
+        // Per-character token class names for code texts, expanded from the server's token runs
+        this.charClasses = [];
+        this.tokenClasses = ['other', 'keyword', 'identifier', 'string', 'number', 'comment', 'whitespace', 'indent'];
         this.currentIndex = 0;
         this.startTime = null;
         this.endTime = null;
@@ -288,6 +291,7 @@ class TypingTest {
         this.testWordCount = 25;
         this.soundEnabled = true;
         this.randomMode = false;
+        this.naturalMode = false;
 
         this.typingSessions = [];
         this.lastTypingTime = null;
@@ -298,17 +302,59 @@ class TypingTest {
         this.renderTimeout = null;
         this.lastRenderTime = 0;
 
+        // Keystroke log submitted with the result so the server can recompute it
+        this.keystrokeDeltas = [];
+        this.keystrokeKeys = [];
+        this.lastKeystrokeTime = null;
+        this.previousInput = '';
+        this.longestInput = 0;
+
         this.autoIndent = true;
         this.currentIndentLevel = 0;
 
         this.scrollTimeout = null;
         this.lastScrollTime = 0;
 
+        // Upcoming texts fetched in batches so a new test doesn't wait on the network
+        this.textQueue = [];
+        this.textQueueQuery = null;
+        this.textQueueSize = 3;
+        this.textQueueLowWater = 2;
+        this.textPrefetch = null;
+
+        // Continuous texts carry a cursor; more is fetched once the caret gets this close to the end
+        this.textCursor = null;
+        this.continueThreshold = 200;
+        this.moreTextRequest = null;
+
+        // Anonymous id linking results to the error profile that practice texts are built from
+        this.userId = this.loadUserId();
+        this.practiceMode = false;
+
+        // Race room this tab has joined; progress is reported at most every raceReportInterval ms
+        this.race = null;
+        this.raceEvents = null;
+        this.raceCountdown = null;
+        this.raceReportInterval = 200;
+        this.lastRaceReport = 0;
+
+        // Results that couldn't be saved (offline, server errors) wait here and go up in one batch later
+        this.pendingResultsKey = 'typexi-pending-results';
+        this.maxBatchResults = 100;
+        this.flushingResults = false;
+        window.addEventListener('online', () => this.flushPendingResults());
+
         this.initializeElements();
         this.bindEvents();
         this.initializeFromActiveButtons();
-        this.loadNewText();
+        this.bootstrap();
         this.initializeSounds();
+
+        const raceId = new URLSearchParams(window.location.search).get('race');
+        if (raceId) {
+            this.joinRace(raceId);
+        }
+        this.flushPendingResults();
     }
 
     initializeElements() {
@@ -345,6 +391,7 @@ class TypingTest {
         document.getElementById('language-select').addEventListener('change', () => this.loadNewText());
         document.getElementById('category-select').addEventListener('change', () => this.loadNewText());
         document.getElementById('code-language-select').addEventListener('change', () => this.loadNewText());
+        document.getElementById('difficulty-select').addEventListener('change', () => this.loadNewText());
 
         document.getElementById('sound-toggle').addEventListener('change', (e) => {
             this.soundEnabled = e.target.checked;
@@ -354,11 +401,99 @@ class TypingTest {
             this.randomMode = e.target.checked;
             this.loadNewText();
         });
+
+        document.getElementById('practice-toggle').addEventListener('change', (e) => {
+            this.practiceMode = e.target.checked;
+            this.loadNewText();
+        });
+
+        // Random prose from a Markov model of the curated texts instead of independent words
+        document.getElementById('natural-toggle').addEventListener('change', (e) => {
+            this.naturalMode = e.target.checked;
+            if (this.randomMode) {
+                this.loadNewText();
+            }
+        });
+    }
+
+    randomId() {
+        const bytes = crypto.getRandomValues(new Uint8Array(16));
+        return Array.from(bytes, (b) => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    loadPendingResults() {
+        try {
+            return JSON.parse(localStorage.getItem(this.pendingResultsKey)) || [];
+        } catch (error) {
+            return [];
+        }
+    }
+
+    storePendingResults(results) {
+        try {
+            if (results.length) {
+                localStorage.setItem(this.pendingResultsKey, JSON.stringify(results));
+            } else {
+                localStorage.removeItem(this.pendingResultsKey);
+            }
+        } catch (error) {
+            console.error('Error storing unsaved results:', error);
+        }
+    }
+
+    async flushPendingResults() {
+        if (this.flushingResults || !navigator.onLine) return;
+        this.flushingResults = true;
+        try {
+            let pending = this.loadPendingResults();
+            while (pending.length) {
+                const batch = pending.slice(0, this.maxBatchResults);
+                const response = await fetch('/api/results/batch', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ results: batch })
+                });
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                // Every item got an answer (saved, already saved, or rejected for good), so none need resending
+                await response.json();
+                const sent = new Set(batch.map(result => result.idempotency_key));
+                pending = this.loadPendingResults().filter(result => !sent.has(result.idempotency_key));
+                this.storePendingResults(pending);
+            }
+        } catch (error) {
+            console.error('Error uploading unsaved results:', error);
+        } finally {
+            this.flushingResults = false;
+        }
+    }
+
+    loadUserId() {
+        try {
+            let userId = localStorage.getItem('typexi-user');
+            if (!userId) {
+                userId = this.randomId();
+                localStorage.setItem('typexi-user', userId);
+            }
+            return userId;
+        } catch (error) {
+            return null;
+        }
     }
 
     bindControlEvents() {
         document.getElementById('restartBtn').addEventListener('click', () => this.restartTest());
-        document.getElementById('newTextBtn').addEventListener('click', () => this.loadNewText());
+        document.getElementById('newTextBtn').addEventListener('click', () => {
+            this.leaveRace();
+            this.loadNewText();
+        });
+        document.getElementById('raceBtn').addEventListener('click', () => this.createRace());
+        document.getElementById('raceStartBtn').addEventListener('click', () => this.startRace());
+        document.getElementById('raceLeaveBtn').addEventListener('click', () => {
+            this.leaveRace();
+            this.loadNewText();
+        });
     }
 
     bindModalEvents() {
@@ -368,6 +503,7 @@ class TypingTest {
             this.restartTest();
         });
         document.getElementById('shareResultBtn').addEventListener('click', () => this.shareResult());
+        document.getElementById('watchReplayBtn').addEventListener('click', () => this.watchReplay());
     }
 
     bindGlobalEvents() {
@@ -405,38 +541,112 @@ class TypingTest {
         }
     }
 
-    async loadNewText() {
+    async bootstrap() {
+        // Metadata is cached by ETag; with a cached copy the first text is fetched in parallel with revalidation
+        let cached = null;
         try {
-            const language = document.getElementById('language-select').value;
-            const category = document.getElementById('category-select').value;
-            const codeLanguage = document.getElementById('code-language-select').value;
+            cached = JSON.parse(localStorage.getItem('typexi-bootstrap'));
+        } catch (error) {
+            cached = null;
+        }
 
-            let url = '/api/text?';
-            if (this.testMode === 'code') {
-                url += `type=code&code_language=${codeLanguage}&random=${this.randomMode}&duration=${this.testDuration}`;
-            } else {
-                url += `type=text&language=${language}&category=${category}&random=${this.randomMode}&duration=${this.testDuration}`;
+        if (cached && cached.etag && cached.meta) {
+            this.applyMetadata(cached.meta);
+            this.loadNewText();
+            try {
+                const response = await fetch('/api/bootstrap?text=false', {
+                    headers: { 'If-None-Match': `"${cached.etag}"` },
+                    cache: 'no-store'
+                });
+                if (response.status === 200) {
+                    const meta = await response.json();
+                    const etag = (response.headers.get('ETag') || '').replace(/"/g, '');
+                    this.storeMetadata(meta, etag);
+                    this.applyMetadata(meta);
+                }
+            } catch (error) {
+                console.error('Error revalidating metadata:', error);
             }
+            return;
+        }
 
-            const response = await fetch(url);
+        try {
+            const response = await fetch(`/api/bootstrap?${this.buildTextQuery()}`, { cache: 'no-store' });
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             const data = await response.json();
+            this.storeMetadata(data.meta, data.meta_etag);
+            this.applyMetadata(data.meta);
+            this.textQueue = [data.text];
+            this.textQueueQuery = this.buildTextQuery();
+        } catch (error) {
+            console.error('Error loading bootstrap data:', error);
+        }
+        this.loadNewText();
+    }
+
+    storeMetadata(meta, etag) {
+        try {
+            localStorage.setItem('typexi-bootstrap', JSON.stringify({ meta: meta, etag: etag }));
+        } catch (error) {
+            console.error('Error caching metadata:', error);
+        }
+    }
+
+    applyMetadata(meta) {
+        if (meta.token_classes) {
+            this.tokenClasses = meta.token_classes;
+        }
 
-            if (!data.text) {
-                throw new Error('No text content received from API');
+        const fillSelect = (id, options) => {
+            const select = document.getElementById(id);
+            const current = select.value;
+            select.innerHTML = '';
+            options.forEach(({ value, name }) => {
+                const option = document.createElement('option');
+                option.value = value;
+                option.textContent = name;
+                select.appendChild(option);
+            });
+            if (options.some(option => option.value === current)) {
+                select.value = current;
             }
+        };
 
-            this.currentText = this.formatText(data.text);
-            this.currentContentType = data.type || 'text';
-            this.resetTest();
-            this.renderText();
+        const languages = Object.entries(meta.languages || {}).map(([value, name]) => ({ value, name }));
+        if (languages.length) {
+            fillSelect('language-select', languages);
+        }
 
-            if (this.currentContentType === 'code') {
-                this.textDisplay.classList.add('code-display');
-            } else {
-                this.textDisplay.classList.remove('code-display');
+        const language = document.getElementById('language-select').value;
+        const categories = (meta.categories || {})[language];
+        if (categories && categories.length) {
+            fillSelect('category-select', categories);
+        }
+
+        if (meta.code_languages && meta.code_languages.length) {
+            fillSelect('code-language-select', meta.code_languages);
+        }
+    }
+
+    async loadNewText() {
+        try {
+            const query = this.buildTextQuery();
+            let data = this.textQueueQuery === query ? this.textQueue.shift() : undefined;
+
+            if (!data) {
+                // Settings changed or the queue ran dry: fetch a fresh batch and keep the rest for later
+                const texts = await this.fetchTextBatch(query);
+                data = texts.shift();
+                this.textQueue = texts;
+                this.textQueueQuery = query;
+            }
+
+            this.applyText(data);
+
+            if (this.textQueue.length < this.textQueueLowWater) {
+                this.prefetchTexts(query);
             }
         } catch (error) {
             console.error('Error loading text:', error);
@@ -444,6 +654,108 @@ class TypingTest {
         }
     }
 
+    applyText(data) {
+        if (!data || !data.text) {
+            throw new Error('No text content received from API');
+        }
+
+        this.replay = null; // Stops any playback; its text is being replaced anyway
+        this.currentText = this.formatText(data.text);
+        this.currentContentType = data.type || 'text';
+        this.charClasses = this.expandTokens(data.tokens);
+        this.textCursor = data.cursor || null;
+        this.resetTest();
+        this.renderText();
+
+        if (this.currentContentType === 'code') {
+            this.textDisplay.classList.add('code-display');
+        } else {
+            this.textDisplay.classList.remove('code-display');
+        }
+    }
+
+    buildTextQuery() {
+        const language = document.getElementById('language-select').value;
+        const category = document.getElementById('category-select').value;
+        const codeLanguage = document.getElementById('code-language-select').value;
+        const difficulty = document.getElementById('difficulty-select').value;
+        const band = difficulty === 'any' ? '' : `&difficulty=${difficulty}`;
+
+        // Timed tests ask for continuous text so fast typists can be topped up via the cursor
+        if (this.testMode === 'code') {
+            return `type=code&code_language=${codeLanguage}&random=${this.randomMode}&duration=${this.testDuration}&continuous=true&tokens=true${band}`;
+        }
+        const continuous = this.testMode === 'time';
+        const generator = this.randomMode && this.naturalMode ? '&generator=markov' : '';
+        const practice = this.practiceMode && this.userId ? `&practice=true&user=${this.userId}` : '';
+        return `type=text&language=${language}&category=${category}&random=${this.randomMode}&duration=${this.testDuration}&continuous=${continuous}${generator}${practice}${band}`;
+    }
+
+    async fetchTextBatch(query) {
+        const response = await fetch(`/api/text/batch?count=${this.textQueueSize}&${query}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const data = await response.json();
+        return data.texts || [];
+    }
+
+    async prefetchTexts(query) {
+        if (this.textPrefetch) return;
+
+        this.textPrefetch = this.fetchTextBatch(query);
+        try {
+            const texts = await this.textPrefetch;
+            if (this.textQueueQuery === query) {
+                this.textQueue.push(...texts);
+            }
+        } catch (error) {
+            console.error('Error prefetching texts:', error);
+        } finally {
+            this.textPrefetch = null;
+        }
+    }
+
+    async loadMoreText() {
+        if (this.moreTextRequest) return;
+
+        const cursor = this.textCursor;
+        const tokens = this.currentContentType === 'code' ? '&tokens=true' : '';
+        this.moreTextRequest = fetch(`/api/text/more?cursor=${encodeURIComponent(cursor)}${tokens}`);
+        try {
+            const response = await this.moreTextRequest;
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const data = await response.json();
+
+            // Ignore late replies for a text that has since been replaced
+            if (this.textCursor === cursor && !this.isTestComplete()) {
+                this.currentText += data.text;
+                this.charClasses = this.charClasses.concat(this.expandTokens(data.tokens));
+                this.textCursor = data.cursor;
+                this.renderText();
+            }
+        } catch (error) {
+            console.error('Error loading more text:', error);
+        } finally {
+            this.moreTextRequest = null;
+        }
+    }
+
+    expandTokens(runs) {
+        // [class, length, class, length, ...] -> one 'tok-<class>' name per character
+        const classes = [];
+        if (!runs) return classes;
+        for (let i = 0; i < runs.length; i += 2) {
+            const name = ` tok-${this.tokenClasses[runs[i]]}`;
+            for (let j = 0; j < runs[i + 1]; j++) {
+                classes.push(name);
+            }
+        }
+        return classes;
+    }
+
     formatText(text) {
         if (this.currentContentType === 'code') {
             return text;
@@ -470,6 +782,17 @@ class TypingTest {
         this.lastTypingTime = null;
         this.currentWpm = 0;
         this.currentIndentLevel = 0;
+        this.keystrokeDeltas = [];
+        this.keystrokeKeys = [];
+        this.lastKeystrokeTime = null;
+        this.previousInput = '';
+        this.longestInput = 0;
+
+        if (this.replay) {
+            // Stops the playback loop and brings back the text the replay replaced
+            this.currentText = this.replay.previousText;
+            this.replay = null;
+        }
 
         if (this.timer) {
             clearInterval(this.timer);
@@ -514,8 +837,9 @@ class TypingTest {
         const inputValue = this.textInput.value;
         let html = '';
 
+        const charClasses = this.charClasses;
         chars.forEach((char, index) => {
-            let className = 'char';
+            let className = 'char' + (charClasses[index] || '');
 
             if (index < inputValue.length) {
                 className += inputValue[index] === char ? ' correct' : ' incorrect';
@@ -555,6 +879,8 @@ class TypingTest {
             return;
         }
 
+        this.recordKeystrokes(inputValue);
+
         // Reset errors and recalculate based on current input
         this.errors = 0;
         for (let i = 0; i < inputValue.length; i++) {
@@ -577,16 +903,66 @@ class TypingTest {
         this.totalChars = inputValue.length;
         this.updateTypingStats();
 
+        if (this.textCursor && this.currentText.length - inputValue.length < this.continueThreshold) {
+            this.loadMoreText();
+        }
+
         const progress = this.currentText.length > 0 ? Math.round((inputValue.length / this.currentText.length) * 100) : 0;
         this.updateProgress(progress);
 
         if (inputValue.length === this.currentText.length) {
             this.completeTest();
+        } else if (this.race) {
+            this.reportRaceProgress(false);
         }
 
         this.renderText();
     }
 
+    recordKeystrokes(inputValue) {
+        // Diff against the previous value: removed characters log as backspaces, added ones as their codes
+        const previous = this.previousInput;
+        const limit = Math.min(previous.length, inputValue.length);
+        let common = 0;
+        while (common < limit && previous[common] === inputValue[common]) common++;
+
+        const now = Date.now();
+        const since = now - (this.lastKeystrokeTime || this.startTime || now);
+        let delta = Math.min(since, 0xFFFF);
+        for (let i = previous.length; i > common; i--) {
+            this.keystrokeDeltas.push(delta);
+            this.keystrokeKeys.push(8);
+            delta = 0;
+        }
+        for (let i = common; i < inputValue.length; i++) {
+            this.keystrokeDeltas.push(delta);
+            this.keystrokeKeys.push(inputValue.charCodeAt(i));
+            delta = 0;
+        }
+        this.lastKeystrokeTime = now;
+        this.previousInput = inputValue;
+        this.longestInput = Math.max(this.longestInput, inputValue.length);
+    }
+
+    encodeKeystrokes() {
+        // u8 version, u32 count, then u16 deltas and u16 keys, all little-endian (see keystroke_analysis.py)
+        const count = this.keystrokeDeltas.length;
+        const view = new DataView(new ArrayBuffer(5 + 4 * count));
+        view.setUint8(0, 1);
+        view.setUint32(1, count, true);
+        for (let i = 0; i < count; i++) {
+            view.setUint16(5 + 2 * i, this.keystrokeDeltas[i], true);
+            view.setUint16(5 + 2 * (count + i), this.keystrokeKeys[i], true);
+        }
+
+        const bytes = new Uint8Array(view.buffer);
+        let binary = '';
+        for (let i = 0; i < bytes.length; i += 0x8000) {
+            binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+        }
+        return btoa(binary);
+    }
+
     handleKeyDown(e) {
         if (this.isTestComplete()) return;
 
@@ -716,6 +1092,215 @@ class TypingTest {
         const accuracy = this.calculateAccuracy();
         
         this.showResults(wpm, accuracy, timeTaken);
+        this.submitResult(wpm, accuracy, timeTaken);
+        if (this.race) {
+            this.reportRaceProgress(true);
+        }
+    }
+
+    async submitResult(wpm, accuracy, timeTaken) {
+        const result = {
+            wpm: wpm,
+            accuracy: accuracy,
+            time_taken: timeTaken,
+            characters_typed: this.totalChars,
+            errors: this.errors,
+            test_type: this.testMode,
+            content_type: this.currentContentType || 'text',
+            language: document.getElementById('language-select').value,
+            category: this.testMode === 'code'
+                ? document.getElementById('code-language-select').value
+                : document.getElementById('category-select').value,
+            duration: this.testMode === 'words' ? 0 : this.testDuration,
+            user: this.userId,
+            // Makes resending safe: the server saves a key once however often it arrives
+            idempotency_key: this.randomId()
+        };
+
+        if (this.keystrokeDeltas.length > 0) {
+            result.keystrokes = this.encodeKeystrokes();
+            result.text = this.currentText.slice(0, this.longestInput);
+        }
+
+        try {
+            let response;
+            try {
+                response = await fetch('/api/result', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify(result)
+                });
+            } catch (error) {
+                response = null;
+            }
+            if (!response || response.status >= 500) {
+                // Offline or the server is struggling: keep the result and upload it with the next batch
+                this.storePendingResults(this.loadPendingResults().concat([result]));
+                throw new Error(response ? `HTTP error! status: ${response.status}` : 'Network error');
+            }
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const data = await response.json();
+            this.showPercentile(data.percentiles);
+            if (data.result && data.result.replay) {
+                this.replayResultId = data.result.id;
+                document.getElementById('watchReplayBtn').classList.remove('hidden');
+            }
+            if (this.practiceMode) {
+                this.textQueue = []; // Prefetched drills predate this result's mistakes
+            }
+            this.flushPendingResults();
+        } catch (error) {
+            console.error('Error saving result:', error);
+        }
+    }
+
+    async createRace() {
+        try {
+            const response = await fetch('/api/races', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ query: this.buildTextQuery() })
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            await this.enterRace(await response.json());
+        } catch (error) {
+            console.error('Error creating race:', error);
+        }
+    }
+
+    async joinRace(roomId) {
+        try {
+            const response = await fetch(`/api/races/${encodeURIComponent(roomId)}/join`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({})
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            await this.enterRace(await response.json());
+        } catch (error) {
+            console.error('Error joining race:', error);
+        }
+    }
+
+    async enterRace(data) {
+        this.leaveRace();
+        this.race = { room: data.room, slot: data.slot, token: data.token, names: data.state.names, players: {} };
+
+        // Every player asks for the same seeded text
+        const response = await fetch(`/api/text?${data.text_query}`);
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        this.applyText(await response.json());
+        this.textInput.disabled = true; // Until the countdown ends
+
+        const link = `${window.location.origin}${window.location.pathname}?race=${data.room}`;
+        document.getElementById('raceLink').textContent = link;
+        document.getElementById('raceStartBtn').style.display = data.slot === 0 ? '' : 'none';
+        document.getElementById('racePanel').style.display = 'block';
+
+        this.raceEvents = new EventSource(`/api/races/${data.room}/events`);
+        this.raceEvents.addEventListener('state', (e) => {
+            const state = JSON.parse(e.data);
+            this.race.names = state.names;
+            state.players.forEach(player => this.race.players[player[0]] = player);
+            if (state.start_at) {
+                this.onRaceStart(state.start_at);
+            }
+            this.renderRacePlayers();
+        });
+        this.raceEvents.addEventListener('join', (e) => {
+            const player = JSON.parse(e.data);
+            this.race.names[player.slot] = player.name;
+            this.renderRacePlayers();
+        });
+        this.raceEvents.addEventListener('start', (e) => this.onRaceStart(JSON.parse(e.data).start_at));
+        this.raceEvents.addEventListener('progress', (e) => {
+            JSON.parse(e.data).players.forEach(player => this.race.players[player[0]] = player);
+            this.renderRacePlayers();
+        });
+        this.renderRacePlayers();
+    }
+
+    leaveRace() {
+        if (this.raceEvents) {
+            this.raceEvents.close();
+            this.raceEvents = null;
+        }
+        if (this.raceCountdown) {
+            clearInterval(this.raceCountdown);
+            this.raceCountdown = null;
+        }
+        this.race = null;
+        document.getElementById('racePanel').style.display = 'none';
+    }
+
+    async startRace() {
+        if (!this.race) return;
+        try {
+            await fetch(`/api/races/${this.race.room}/start`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ token: this.race.token })
+            });
+        } catch (error) {
+            console.error('Error starting race:', error);
+        }
+    }
+
+    onRaceStart(startAt) {
+        if (!this.race || this.race.startAt) return;
+        this.race.startAt = startAt;
+        document.getElementById('raceStartBtn').style.display = 'none';
+        const status = document.getElementById('raceStatus');
+        const tick = () => {
+            const remaining = Math.ceil((startAt - Date.now()) / 1000);
+            if (remaining > 0) {
+                status.textContent = `Starting in ${remaining}...`;
+                return;
+            }
+            clearInterval(this.raceCountdown);
+            this.raceCountdown = null;
+            status.textContent = 'Go!';
+            this.restartTest();
+        };
+        this.raceCountdown = setInterval(tick, 100);
+        tick();
+    }
+
+    reportRaceProgress(force) {
+        const now = Date.now();
+        if (!this.race || !this.race.startAt || (!force && now - this.lastRaceReport < this.raceReportInterval)) {
+            return;
+        }
+        this.lastRaceReport = now;
+        const length = this.currentText.length;
+        const progress = length > 0 ? Math.floor((this.textInput.value.length / length) * 1000) : 0;
+        fetch(`/api/races/${this.race.room}/progress`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ token: this.race.token, progress: progress, wpm: this.currentWpm })
+        }).catch(error => console.error('Error reporting race progress:', error));
+    }
+
+    renderRacePlayers() {
+        if (!this.race) return;
+        const rows = this.race.names.map((name, slot) => {
+            const [, progress, wpm, place] = this.race.players[slot] || [slot, 0, 0, 0];
+            const label = slot === this.race.slot ? `${this.escapeHtml(name)} (you)` : this.escapeHtml(name);
+            return `<div class="race-player${slot === this.race.slot ? ' self' : ''}">
+                <span class="race-name">${place ? `#${place} ` : ''}${label}</span>
+                <div class="progress-bar"><div class="progress-fill" style="width: ${progress / 10}%"></div></div>
+                <span class="race-wpm">${wpm} WPM</span>
+            </div>`;
+        });
+        document.getElementById('racePlayers').innerHTML = rows.join('');
     }
 
     calculateWPM(timeTaken) {
@@ -821,14 +1406,81 @@ class TypingTest {
         document.getElementById('finalChars').textContent = this.totalChars;
         document.getElementById('finalErrors').textContent = this.errors;
         document.getElementById('finalTestType').textContent = this.testMode.charAt(0).toUpperCase() + this.testMode.slice(1);
+        document.getElementById('finalPercentile').textContent = '\u2014'; // Filled in once the result is saved
+        document.getElementById('watchReplayBtn').classList.add('hidden'); // Shown once the replay is stored
+        this.replayResultId = null;
         
         this.resultsModal.classList.add('show');
     }
 
+    showPercentile(percentiles) {
+        if (!percentiles || percentiles.count < 2) {
+            return; // Nobody else to compare against yet
+        }
+        document.getElementById('finalPercentile').textContent =
+            `${Math.round(percentiles.wpm)}% of typists (${percentiles.count.toLocaleString()} results)`;
+    }
+
     closeResultsModal() {
         this.resultsModal.classList.remove('show');
     }
 
+    async watchReplay() {
+        if (!this.replayResultId) return;
+        this.closeResultsModal();
+        // Chunks arrive as NDJSON lines: the text first, then the keystrokes in time order.
+        // Each chunk plays as soon as it arrives, so playback doesn't wait for the whole replay.
+        const replay = this.replay = { previousText: this.replay ? this.replay.previousText : this.currentText };
+        this.textInput.disabled = true;
+        this.textInput.value = '';
+        try {
+            const response = await fetch(`/api/replay/${this.replayResultId}`);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let typed = '';
+            let startedAt = null;
+            while (this.replay === replay) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                for (const line of lines.filter(Boolean)) {
+                    const message = JSON.parse(line);
+                    if (message.error) {
+                        throw new Error(message.error);
+                    }
+                    if (startedAt === null) {
+                        this.currentText = message.text;
+                        startedAt = performance.now();
+                        this.renderText();
+                        continue;
+                    }
+                    for (let i = 0; i < message.keys.length; i++) {
+                        const wait = startedAt + message.times[i] - performance.now();
+                        if (wait > 0) {
+                            await new Promise(resolve => setTimeout(resolve, wait));
+                        }
+                        if (this.replay !== replay) {
+                            reader.cancel();
+                            return;
+                        }
+                        const key = message.keys[i];
+                        typed = key === 8 ? typed.slice(0, -1) : typed + String.fromCodePoint(key);
+                        this.textInput.value = typed;
+                        this.renderText();
+                    }
+                }
+            }
+        } catch (error) {
+            console.error('Error playing replay:', error);
+        }
+    }
+
     shareResult() {
         const wpm = document.getElementById('finalWpm').textContent;
         const accuracy = document.getElementById('finalAccuracy').textContent;
@@ -0,0 +1,29 @@
+"""Shared test setup: the repository root on sys.path and a throwaway results database
+
+TYPEXI_DB_PATH is set before any test imports app, whose stores are opened lazily from it.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('TYPEXI_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='typexi-tests-'), 'results.sqlite3'))
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A fresh result store of its own, flushed and stopped after the test"""
+    from result_store import ResultStore
+    result_store = ResultStore(str(tmp_path / 'results.sqlite3'))
+    yield result_store
+    result_store.close()
+
+
+@pytest.fixture
+def client():
+    """A test client for the app, sharing the session's results database"""
+    import app as typexi
+    return typexi.app.test_client()
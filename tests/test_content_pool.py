@@ -0,0 +1,50 @@
+"""Content pool: requests pop pre-generated items, and one failing factory can't stop the refill worker"""
+import time
+
+from content_pool import ContentPool
+
+
+def counter():
+    state = {'next': 0}
+
+    def factory(count):
+        items = list(range(state['next'], state['next'] + count))
+        state['next'] += count
+        return items
+    return factory
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_get_many_pops_ready_items_and_generates_the_shortfall():
+    pool = ContentPool(depth=4, batch_size=2)
+    pool.register('a', counter())
+    pool.fill('a')
+    assert pool.get_many('a', 6, lambda count: ['inline'] * count) == [0, 1, 2, 3, 'inline', 'inline']
+    assert (pool.hits, pool.misses) == (4, 2)
+
+
+def test_a_failing_factory_does_not_starve_the_other_buckets():
+    pool = ContentPool(depth=4, batch_size=2, idle_interval=0.01)
+
+    def broken(count):
+        raise OSError('corpus went away')
+
+    pool.register(('broken',), broken)
+    pool.register(('fine',), counter())
+    pool.get(('fine',), lambda count: ['inline'] * count)
+    assert wait_for(lambda: pool.stats()['buckets']['fine'] == 4 and pool.errors >= 2)
+    assert pool._worker.is_alive()
+    # The broken bucket's requests still get items, generated inline
+    assert pool.get(('broken',), lambda count: ['inline'] * count) == 'inline'
+
+    # Once its factory recovers, the worker fills it too
+    pool._factories[('broken',)] = counter()
+    assert wait_for(lambda: pool.stats()['buckets']['broken'] == 4)
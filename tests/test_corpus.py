@@ -0,0 +1,103 @@
+"""Memory-mapped corpora: passages read back exactly, stale indexes are refused, and sampling leaves the heap flat"""
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+import corpus
+from conftest import ROOT
+
+WORDS = 'the quick brown fox jumps over a lazy dog while seven wizards quietly judge boxing matches'.split()
+
+# Runs in a fresh process so nothing the test session allocated muddies the numbers
+PROBE = '''
+import random, sys
+sys.path.insert(0, {root!r})
+import corpus
+
+def rss_anon_kib():
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('RssAnon:'))
+
+before = rss_anon_kib()
+if {mode!r} == 'mapped':
+    texts = corpus.Corpus({path!r})
+else:
+    with open({path!r}, encoding='utf-8') as f:
+        texts = [line.strip() for line in f if line.strip()]
+rng = random.Random(0)
+for _ in range(5000):
+    ' '.join(texts[i] for i in rng.sample(range(len(texts)), 5))
+print(rss_anon_kib() - before)
+'''
+
+
+def write_corpus(path, passages, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(passages):
+            f.write(' '.join(rng.choices(WORDS, k=16)) + '\n')
+    return str(path)
+
+
+def anon_growth_mib(mode, path):
+    code = PROBE.format(root=ROOT, mode=mode, path=path)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return int(output) / 1024
+
+
+def test_passages_round_trip(tmp_path):
+    passages = ['first passage', 'naïve café — ünïcödé 🎉', 'last one']
+    path = tmp_path / 'mixed.txt'
+    # Blank lines are not passages
+    path.write_text('first passage\n\n' + passages[1] + '\n   \n' + passages[2], encoding='utf-8')
+
+    assert corpus.build_index(str(path)) == 3
+    texts = corpus.Corpus(str(path))
+    assert len(texts) == 3
+    assert [texts[i] for i in range(3)] == passages
+    assert texts[-1] == 'last one'
+    assert len(texts.difficulty) == 3
+    with pytest.raises(IndexError):
+        texts[3]
+
+
+def test_stale_index_is_refused(tmp_path):
+    path = write_corpus(tmp_path / 'stale.txt', 10)
+    corpus.build_index(path)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('a passage added after the index was built\n')
+    with pytest.raises(ValueError, match='stale'):
+        corpus.Corpus(path)
+
+
+def test_missing_difficulty_index_is_rebuilt_in_process(tmp_path):
+    path = write_corpus(tmp_path / 'nodif.txt', 50)
+    corpus.build_index(path)
+    os.remove(path[:-len(corpus.TEXT_SUFFIX)] + corpus.DIFFICULTY_SUFFIX)
+    assert len(corpus.Corpus(path).difficulty) == 50
+
+
+@pytest.fixture(scope='module')
+def corpora(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('corpora')
+    paths = {}
+    for passages in (20000, 100000):
+        paths[passages] = write_corpus(directory / f'{passages}.txt', passages, seed=passages)
+        corpus.build_index(paths[passages])
+    return paths
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/status'), reason='RSS is read from /proc')
+def test_sampling_a_mapped_corpus_keeps_the_heap_flat(corpora):
+    small = anon_growth_mib('mapped', corpora[20000])
+    large = anon_growth_mib('mapped', corpora[100000])
+    loaded = anon_growth_mib('list', corpora[100000])
+
+    # Five times the passages barely moves the heap of the mapped corpus...
+    assert small < 4 and large < 4
+    assert large - small < 2
+    # ...while holding the same passages in a list costs the whole corpus
+    assert loaded > large + 8
@@ -0,0 +1,19 @@
+"""Word and sentence generators: sizes a client asks for are clamped, so one request stays short"""
+import app as typexi
+
+
+def test_random_words_are_clamped(client):
+    words = client.get('/api/random-words?count=50000000').get_json()['words']
+    assert len(words) == min(typexi.MAX_RANDOM_WORDS, len(typexi.get_word_pool('common')))
+    assert len(client.get('/api/random-words?count=-3').get_json()['words']) == 1
+
+
+def test_sentences_and_paragraphs_are_clamped(client):
+    sentence = client.get('/api/generate-sentence?min_words=50000000&max_words=50000000').get_json()['sentence']
+    assert len(sentence.split()) == typexi.MAX_SENTENCE_WORDS
+    paragraph = client.get('/api/generate-paragraph?sentences=50000000').get_json()['paragraph']
+    assert len(paragraph.split()) <= typexi.MAX_PARAGRAPH_SENTENCES * 20
+
+
+def test_a_size_that_is_not_a_number_is_a_400(client):
+    assert client.get('/api/random-words?count=lots').status_code == 400
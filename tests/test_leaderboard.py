@@ -0,0 +1,42 @@
+"""Leaderboards: ranking, window roll-over, and rebuilding past rows that aren't rankable"""
+from leaderboard import LeaderboardIndex, partition_of
+
+NOW = 1700000000
+
+
+def result(result_id, wpm, accuracy=95, timestamp=NOW - 60, **fields):
+    return dict({'id': result_id, 'wpm': wpm, 'accuracy': accuracy, 'timestamp': timestamp,
+                 'test_type': 'time', 'duration': 30, 'language': 'english'}, **fields)
+
+
+def test_ranks_by_wpm_then_accuracy_then_who_got_there_first():
+    index = LeaderboardIndex(k=3)
+    for row in (result(1, 80), result(2, 90, 90), result(3, 90, 99), result(4, 80, timestamp=NOW - 600),
+                result(5, 50)):
+        index.add(row, NOW)
+    assert [entry['id'] for entry in index.top(partition_of(result(0, 0)), now=NOW)] == [3, 2, 4]
+
+
+def test_results_outside_a_window_are_left_off_it():
+    index = LeaderboardIndex()
+    index.add(result(1, 80, timestamp=NOW - 10 * 86400), NOW)
+    partition = partition_of(result(0, 0))
+    assert [entry['id'] for entry in index.top(partition, 'all', now=NOW)] == [1]
+    assert index.top(partition, 'daily', now=NOW) == []
+
+
+def test_rebuild_skips_rows_that_are_not_rankable():
+    index = LeaderboardIndex()
+    rows = [result(1, 70), result(2, 'fast'), result(3, float('nan')), result(4, 90, timestamp='yesterday'),
+            result(5, 10 ** 30), result(6, [80]), result(7, 85)]
+    assert index.rebuild(rows, NOW) == 7
+    assert [entry['id'] for entry in index.top(partition_of(result(0, 0)), now=NOW)] == [7, 1]
+
+    # Rows the rebuild covered aren't counted twice when the live path sees them again
+    index.add(rows[0], NOW)
+    assert len(index.top(partition_of(result(0, 0)), now=NOW)) == 2
+
+
+def test_leaderboard_endpoint_refuses_unknown_windows(client):
+    assert client.get('/api/leaderboard?window=fortnightly').status_code == 400
+    assert client.get('/api/leaderboard?window=all').status_code == 200
@@ -0,0 +1,41 @@
+"""Race rooms: updates merge per tick, and rooms nobody touches expire even if nothing ever subscribed"""
+import pytest
+
+from races import COUNTDOWN, RaceHub
+
+
+def test_updates_between_ticks_reach_subscribers_once():
+    hub = RaceHub()
+    room, _, token = hub.create('', 'ada', now=0)
+    wakes = []
+    subscriber = hub.subscribe(room.id, lambda: wakes.append(1))
+    hub.start(room.id, token, now=0)
+    hub.tick(now=0.1)
+    subscriber.drain()
+    hub.update(room.id, token, 10, 50, now=COUNTDOWN + 1)
+    hub.update(room.id, token, 20, 55, now=COUNTDOWN + 1.05)
+    assert hub.tick(now=COUNTDOWN + 1.1) == 1
+    assert subscriber.drain().count(b'event: progress') == 1
+    assert hub.tick(now=COUNTDOWN + 1.2) == 0
+
+
+def test_rooms_without_subscribers_expire_when_rooms_are_created():
+    hub = RaceHub(max_rooms=2, ttl=600)
+    stale, _, _ = hub.create('', 'ada', now=0)
+    hub.create('', 'grace', now=100)
+    with pytest.raises(ValueError):
+        hub.create('', 'alan', now=200)
+    # No tick ever ran; creating a room past the first room's TTL still clears it out
+    hub.create('', 'alan', now=700)
+    assert stale.id not in hub.rooms
+    assert len(hub.rooms) == 2
+
+
+def test_expiry_closes_subscribed_streams():
+    hub = RaceHub(ttl=600)
+    room, _, _ = hub.create('', 'ada', now=0)
+    subscriber = hub.subscribe(room.id, lambda: None)
+    hub.tick(now=601)
+    assert subscriber.closed
+    with pytest.raises(KeyError):
+        hub.join(room.id, 'grace', now=602)
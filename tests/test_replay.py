@@ -0,0 +1,190 @@
+"""Keystroke replays: logs survive encode/decode exactly, chunks are selected by time, and corrupt blobs are refused"""
+import json
+import random
+
+import pytest
+
+import app as typexi
+import keystroke_analysis
+import replay
+
+TEXT = 'The quick brown fox jumps over the lazy dog. Ünïcödé and 𝔞𝔰𝔱𝔯𝔞𝔩 too.'
+
+
+def random_log(rng, keystrokes, text=TEXT):
+    """Mostly the expected characters, with typos, backspaces (also on an empty input), bursts and long pauses"""
+    deltas, keys = [], []
+    position = 0
+    for _ in range(keystrokes):
+        roll = rng.random()
+        if roll < 0.1:
+            deltas.append(0)
+        elif roll < 0.15:
+            deltas.append(rng.randint(1000, 600000))
+        else:
+            deltas.append(rng.randint(40, 400))
+        roll = rng.random()
+        if roll < 0.1:
+            keys.append(replay.BACKSPACE)
+            position = max(position - 1, 0)
+        elif roll < 0.2 or position >= len(text):
+            keys.append(rng.choice([ord('x'), ord('é'), 0x1F600, 0x10FFFF]))
+            position += 1
+        else:
+            keys.append(ord(text[position]))
+            position += 1
+    return deltas, keys
+
+
+def times_and_keys(blob):
+    recording, chunks = replay.decode(blob)
+    times, keys = [], []
+    for chunk in chunks:
+        times.extend(chunk['times'])
+        keys.extend(chunk['keys'])
+    return recording, times, keys
+
+
+@pytest.mark.parametrize('chunk_ms', [1, 250, 5000, replay.CHUNK_MS, 10 ** 9])
+def test_random_logs_round_trip(chunk_ms):
+    rng = random.Random(chunk_ms)
+    for _ in range(20):
+        deltas, keys = random_log(rng, rng.randint(1, 400))
+        blob = replay.encode(deltas, keys, TEXT, chunk_ms)
+        recording, times, decoded = times_and_keys(blob)
+
+        elapsed, expected_times = 0, []
+        for delta in deltas:
+            elapsed += delta
+            expected_times.append(elapsed)
+        assert decoded == keys
+        assert times == expected_times
+        assert recording.text == TEXT
+        assert recording.keystrokes == len(keys)
+        assert recording.duration_ms == elapsed
+        assert sum(chunk.count for chunk in recording.chunks) == len(keys)
+
+
+def test_a_log_starting_with_backspaces_round_trips():
+    deltas, keys = [0, 5, 5, 300], [replay.BACKSPACE, replay.BACKSPACE, ord('T'), replay.BACKSPACE]
+    _, times, decoded = times_and_keys(replay.encode(deltas, keys, TEXT))
+    assert decoded == keys
+    assert times == [0, 5, 10, 310]
+
+
+def test_an_empty_log_has_no_chunks():
+    recording, times, keys = times_and_keys(replay.encode([], [], TEXT))
+    assert (recording.keystrokes, recording.duration_ms, recording.chunks) == (0, 0, [])
+    assert times == keys == []
+    assert recording.select(0, 1000) == []
+
+
+def test_the_header_parses_from_a_prefix_alone():
+    rng = random.Random(1)
+    deltas, keys = random_log(rng, 300)
+    blob = replay.encode(deltas, keys, TEXT, 2000)
+    head = blob[:replay.Replay.header_size(blob[:replay.PREFIX.size])]
+    recording = replay.Replay.parse(head)
+    assert len(recording.chunks) > 1
+    assert recording.chunks[-1].offset + recording.chunks[-1].size == len(blob)
+
+    # Any one chunk decodes from its own bytes
+    chunk = recording.chunks[len(recording.chunks) // 2]
+    decoded = recording.decode_chunk(chunk, blob[chunk.offset:chunk.offset + chunk.size])
+    assert decoded['keys'] == keys[chunk.first:chunk.first + chunk.count]
+
+
+def test_select_returns_the_chunks_overlapping_a_range():
+    deltas = [0] + [100] * 99  # 100 keystrokes at 0, 100, ... 9900 ms
+    keys = [ord(TEXT[i % len(TEXT)]) for i in range(100)]
+    recording = replay.Replay.parse(replay.encode(deltas, keys, TEXT, 1000))
+    assert [(chunk.start_ms, chunk.end_ms) for chunk in recording.chunks[:2]] == [(0, 1000), (1000, 2000)]
+    assert recording.chunks[-1].end_ms == recording.duration_ms + 1
+
+    assert recording.select() == recording.chunks
+    assert [chunk.start_ms for chunk in recording.select(1500, 3000)] == [1000, 2000]
+    assert [chunk.start_ms for chunk in recording.select(2000, 2001)] == [2000]
+    assert [chunk.start_ms for chunk in recording.select(9900)] == [9000]
+    assert recording.select(10000) == []
+
+
+def test_not_a_replay_is_refused():
+    with pytest.raises(ValueError):
+        replay.Replay.header_size(b'TXRPL')
+    with pytest.raises(ValueError):
+        replay.Replay.parse(b'NOTARPLY' + bytes(64))
+
+
+def test_truncated_and_corrupt_blobs_raise_value_error():
+    rng = random.Random(2)
+    deltas, keys = random_log(rng, 200)
+    blob = replay.encode(deltas, keys, TEXT, 3000)
+    size = replay.Replay.header_size(blob)
+
+    for cut in (replay.PREFIX.size, replay.PREFIX.size + 1, size // 2, size - 1):
+        with pytest.raises(ValueError):
+            replay.Replay.parse(blob[:cut])
+
+    recording = replay.Replay.parse(blob)
+    for chunk in recording.chunks:
+        data = blob[chunk.offset:chunk.offset + chunk.size]
+        with pytest.raises(ValueError):
+            recording.decode_chunk(chunk, data[:len(data) // 2])
+        with pytest.raises(ValueError):
+            recording.decode_chunk(chunk, b'\xff' * len(data))
+    with pytest.raises(ValueError):
+        for _ in replay.decode(blob[:-1])[1]:
+            pass
+
+
+def submit_with_replay(client, text, deltas, keys):
+    response = client.post('/api/result', json={
+        'wpm': 60, 'accuracy': 100, 'time_taken': sum(deltas) / 1000, 'text': text,
+        'keystrokes': keystroke_analysis.encode_log(deltas, keys),
+    })
+    assert response.status_code == 200
+    return response.get_json()['result']['id']
+
+
+def test_replay_endpoint_streams_the_requested_chunks(client):
+    text = 'the quick brown fox jumps over the lazy dog ' * 10
+    deltas = [0] + [180 + i * 37 % 60 for i in range(len(text) - 1)]
+    keys = [ord(char) for char in text]
+    result_id = submit_with_replay(client, text, deltas, keys)
+
+    lines = [json.loads(line) for line in client.get(f'/api/replay/{result_id}').data.splitlines()]
+    header, chunks = lines[0], lines[1:]
+    assert (header['id'], header['text'], header['keystrokes']) == (result_id, text, len(keys))
+    assert len(chunks) == len(header['chunks']) > 1
+    assert [key for chunk in chunks for key in chunk['keys']] == keys
+
+    start, end = header['chunks'][1][0], header['chunks'][1][1]
+    lines = client.get(f'/api/replay/{result_id}?from={start}&to={end}').data.splitlines()
+    assert [json.loads(line)['start_ms'] for line in lines[1:]] == [start]
+
+
+def test_replay_endpoint_errors(client):
+    assert client.get('/api/replay/999999').status_code == 404
+    assert client.get('/api/replay/1?from=-1').status_code == 400
+    assert client.get('/api/replay/1?from=500&to=500').status_code == 400
+    assert client.get('/api/replay/1?from=soon').status_code == 400
+
+
+def test_replay_endpoint_reports_a_corrupt_replay(client):
+    store = typexi.get_result_store()
+    unreadable = store.save({'wpm': 60, 'timestamp': 1700000000}, b'TXRPL001' + bytes(8))
+    response = client.get(f'/api/replay/{unreadable}')
+    assert response.status_code == 500
+    assert 'error' in response.get_json()
+
+    # A corrupt chunk is only found once the stream has started, so the stream ends with an error line
+    deltas = [0] + [150] * 199
+    keys = [ord(TEXT[i % len(TEXT)]) for i in range(200)]
+    blob = bytearray(replay.encode(deltas, keys, TEXT, 5000))
+    last = replay.Replay.parse(bytes(blob)).chunks[-1]
+    blob[last.offset:last.offset + last.size] = b'\xff' * last.size
+    damaged = store.save({'wpm': 60, 'timestamp': 1700000000}, bytes(blob))
+    lines = [json.loads(line) for line in client.get(f'/api/replay/{damaged}').data.splitlines()]
+    assert lines[0]['keystrokes'] == 200
+    assert 'error' in lines[-1]
+    assert all('keys' in line for line in lines[1:-1])
@@ -0,0 +1,121 @@
+"""Idempotent submissions: a key is saved once however often, and in whatever batches, it is retried"""
+import uuid
+
+import pytest
+
+import app as typexi
+import idempotency
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def result(key=None, **fields):
+    data = {'wpm': 72, 'accuracy': 96.5, 'time_taken': 30, 'test_type': 'time', 'duration': 30}
+    data.update(fields)
+    if key is not None:
+        data['idempotency_key'] = key
+    return data
+
+
+def post_batch(client, items):
+    return client.post('/api/results/batch', json={'results': items})
+
+
+@pytest.mark.parametrize('value', [None, '', 42, ['key'], 'k' * (idempotency.MAX_KEY_LENGTH + 1)])
+def test_parse_key_refuses_what_is_not_a_sane_string(value):
+    with pytest.raises(ValueError):
+        idempotency.parse_key(value)
+
+
+def test_parse_key_accepts_a_string():
+    assert idempotency.parse_key('k' * idempotency.MAX_KEY_LENGTH) == 'k' * idempotency.MAX_KEY_LENGTH
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = idempotency.BloomFilter(1000)
+    keys = [new_key() for _ in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    assert sum(new_key() in bloom for _ in range(10000)) < 100
+
+
+def test_recent_keys_evict_from_the_lru_but_not_the_filter():
+    recent = idempotency.RecentKeys(capacity=4, lru_size=2)
+    keys = [new_key() for _ in range(6)]
+    for result_id, key in enumerate(keys):
+        recent.add(key, result_id)
+    assert recent.get(keys[0]) is None
+    assert recent.get(keys[5]) == 5
+    # Two generations of four keys cover all six
+    assert all(recent.might_contain(key) for key in keys)
+    assert recent.stats()['rotations'] == 1
+
+
+def test_batch_reports_each_item(client):
+    keys = [new_key() for _ in range(3)]
+    response = post_batch(client, [
+        result(keys[0]),
+        result(keys[1], wpm='fast'),
+        result(),
+        'not an object',
+        result(keys[2]),
+        result(keys[0]),
+    ])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [outcome['status'] for outcome in body['results']] == [
+        'created', 'error', 'error', 'error', 'created', 'duplicate']
+    assert body['results'][5]['id'] == body['results'][0]['id']
+    assert (body['created'], body['duplicates'], body['errors']) == (2, 1, 3)
+    assert typexi.get_result_store().ids_for_keys(keys) == {
+        keys[0]: body['results'][0]['id'], keys[2]: body['results'][4]['id']}
+
+
+def test_a_retried_batch_gets_the_same_ids(client):
+    items = [result(new_key(), wpm=wpm) for wpm in (50, 60, 70)]
+    first = post_batch(client, items).get_json()
+    retry = post_batch(client, items).get_json()
+    assert [outcome['status'] for outcome in first['results']] == ['created'] * 3
+    assert [outcome['status'] for outcome in retry['results']] == ['duplicate'] * 3
+    assert [outcome['id'] for outcome in retry['results']] == [outcome['id'] for outcome in first['results']]
+
+
+def test_a_retry_that_fell_out_of_memory_is_found_in_the_store(client, monkeypatch):
+    item = result(new_key())
+    created = post_batch(client, [item]).get_json()['results'][0]
+    monkeypatch.setattr(typexi, '_recent_keys', idempotency.RecentKeys(capacity=100, lru_size=1))
+    retry = post_batch(client, [item]).get_json()['results'][0]
+    assert (retry['status'], retry['id']) == ('duplicate', created['id'])
+
+
+def test_a_repeat_of_a_failed_item_fails_too(client):
+    key = new_key()
+    outcomes = post_batch(client, [result(key, accuracy=float('inf')), result(key)]).get_json()['results']
+    assert [outcome['status'] for outcome in outcomes] == ['error', 'error']
+    assert typexi.get_result_store().ids_for_keys([key]) == {}
+
+
+@pytest.mark.parametrize('body', [{'results': []}, {'results': 'all of them'}, {},
+                                  {'results': [result(new_key())] * (typexi.MAX_BATCH_RESULTS + 1)}])
+def test_batch_refuses_what_is_not_a_sized_list(client, body):
+    assert client.post('/api/results/batch', json=body).status_code == 400
+
+
+def test_keyed_result_is_saved_once(client):
+    item = result(new_key(), wpm=81)
+    first = client.post('/api/result', json=item).get_json()
+    retry = client.post('/api/result', json=item).get_json()
+    assert (first['duplicate'], retry['duplicate']) == (False, True)
+    assert retry['result'] == first['result']
+    assert retry['message'] == 'Result already saved'
+
+
+@pytest.mark.parametrize('fields', [{'wpm': 'fast'}, {'accuracy': True}, {'time_taken': 1e300},
+                                    {'errors': [1]}, {'test_type': 5}])
+def test_keyed_result_with_a_bad_field_is_refused_and_not_stored(client, fields):
+    key = new_key()
+    assert client.post('/api/result', json=result(key, **fields)).status_code == 400
+    assert typexi.get_result_store().ids_for_keys([key]) == {}
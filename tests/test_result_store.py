@@ -0,0 +1,52 @@
+"""Result validation and the group-commit writer: bad input is refused, and a bad row fails only its own submission"""
+import sqlite3
+
+import pytest
+
+import app as typexi
+
+
+@pytest.mark.parametrize('fields', [{'wpm': 'fast'}, {'wpm': True}, {'accuracy': float('nan')},
+                                    {'time_taken': float('inf')}, {'errors': 10 ** 30}, {'characters_typed': [1]},
+                                    {'language': 5}, {'duration': {'s': 30}}])
+def test_build_result_refuses_what_is_not_a_number_or_label(fields):
+    data = dict({'wpm': 72, 'accuracy': 96.5, 'time_taken': 30}, **fields)
+    with pytest.raises(ValueError):
+        typexi.build_result(data)
+
+
+def test_build_result_refuses_what_is_not_an_object():
+    with pytest.raises(ValueError):
+        typexi.build_result(['wpm', 72])
+
+
+def test_build_result_defaults_missing_numbers_to_zero():
+    result = typexi.build_result({'wpm': 72.5, 'accuracy': 96})
+    assert (result['wpm'], result['accuracy'], result['time_taken'], result['errors']) == (72.5, 96, 0, 0)
+
+
+def test_unsaved_invalid_result_is_a_400(client):
+    response = client.post('/api/result', json={'wpm': 'fast', 'accuracy': 96})
+    assert response.status_code == 400
+    assert 'wpm' in response.get_json()['error']
+
+
+def row(wpm):
+    return {'wpm': wpm, 'timestamp': 1700000000}
+
+
+def test_a_row_that_cannot_be_bound_fails_only_its_own_submission(store):
+    good = store.submit_many([row(60), row(61)], ['good-1', 'good-2'])
+    bad = store.submit_many([row(62), row(object())], ['bad-1', 'bad-2'])
+    unstamped = store.submit_many([row(64), {'wpm': 65}], ['unstamped-1', 'unstamped-2'])
+    single = store.submit(row(63))
+
+    assert [inserted for _, inserted in good.result(10)] == [True, True]
+    with pytest.raises((TypeError, ValueError)):
+        bad.result(10)
+    with pytest.raises(sqlite3.IntegrityError):
+        unstamped.result(10)
+    assert store.get(single.result(10))['wpm'] == 63
+    # Each failed submission's first row was rolled back with it
+    assert set(store.ids_for_keys(['good-1', 'good-2', 'bad-1', 'bad-2', 'unstamped-1', 'unstamped-2'])) == {
+        'good-1', 'good-2'}
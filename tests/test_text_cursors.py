@@ -0,0 +1,32 @@
+"""Continuous-text cursors: seeded continuations are cacheable, practice ones never are"""
+import app as typexi
+
+
+def first_cursor(client, query):
+    response = client.get(f'/api/text?continuous=true&{query}')
+    assert response.status_code == 200
+    return response.get_json()['cursor']
+
+
+def test_seeded_continuations_are_immutable_and_repeatable(client):
+    cursor = first_cursor(client, 'seed=42')
+    first = client.get(f'/api/text/more?cursor={cursor}')
+    again = client.get(f'/api/text/more?cursor={cursor}')
+    assert first.headers['Cache-Control'] == typexi.SEEDED_CACHE_CONTROL
+    assert first.headers['ETag'] == again.headers['ETag']
+    assert first.get_json() == again.get_json()
+    assert client.get(f'/api/text/more?cursor={cursor}',
+                      headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+
+def test_practice_continuations_are_never_cached(client):
+    cursor = first_cursor(client, 'practice=true')
+    response = client.get(f'/api/text/more?cursor={cursor}')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert 'ETag' not in response.headers
+    assert response.get_json()['text']
+
+
+def test_a_bad_cursor_is_a_400(client):
+    assert client.get('/api/text/more?cursor=not-a-cursor').status_code == 400
@@ -0,0 +1,187 @@
+"""Word lists and the registry of precompiled word pools used by the text generators"""
+import random
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence
+
+import startup
+from difficulty import BANDS, DifficultyIndex
+
+# NumPy is optional; the pure-Python path produces the same kind of output. In lazy startup mode
+# importing it costs more than it saves on a single text, so generation only uses it once
+# something else (keystroke verification) has loaded it.
+np = startup.optional_module('numpy')
+
+
+COMMON_WORDS = [
+    'the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i', 'it', 'for', 'not', 'on', 'with', 
+    'he', 'as', 'you', 'do', 'at', 'this', 'but', 'his', 'by', 'from', 'they', 'we', 'say', 'her', 
+    'she', 'or', 'an', 'will', 'my', 'one', 'all', 'would', 'there', 'their', 'what', 'so', 'up', 
+    'out', 'if', 'about', 'who', 'get', 'which', 'go', 'me', 'when', 'make', 'can', 'like', 'time', 
+    'no', 'just', 'him', 'know', 'take', 'people', 'into', 'year', 'your', 'good', 'some', 'could', 
+    'them', 'see', 'other', 'than', 'then', 'now', 'look', 'only', 'come', 'its', 'over', 'think', 
+    'also', 'back', 'after', 'use', 'two', 'how', 'our', 'work', 'first', 'well', 'way', 'even', 
+    'new', 'want', 'because', 'any', 'these', 'give', 'day', 'most', 'us'
+]
+
+TECH_WORDS = [
+    'algorithm', 'database', 'function', 'variable', 'class', 'object', 'method', 'interface', 
+    'protocol', 'framework', 'library', 'module', 'package', 'dependency', 'configuration', 
+    'deployment', 'server', 'client', 'network', 'encryption', 'authentication', 'authorization', 
+    'session', 'cache', 'memory', 'processor', 'storage', 'bandwidth', 'latency', 'scalability', 
+    'performance', 'optimization', 'debugging', 'testing', 'integration', 'monitoring', 'logging', 
+    'analytics', 'machine', 'learning', 'artificial', 'intelligence', 'neural', 'data', 'science', 
+    'statistics', 'probability', 'cloud', 'virtualization', 'container', 'microservice', 'api', 
+    'rest', 'graphql', 'websocket', 'http', 'https'
+]
+
+PROGRAMMING_WORDS = [
+    'function', 'variable', 'constant', 'array', 'object', 'class', 'method', 'property', 
+    'parameter', 'argument', 'return', 'void', 'null', 'undefined', 'boolean', 'integer', 
+    'float', 'string', 'character', 'pointer', 'loop', 'condition', 'statement', 'expression', 
+    'operator', 'assignment', 'comparison', 'logical', 'bitwise', 'arithmetic', 'scope', 
+    'namespace', 'module', 'import', 'export', 'require', 'include', 'extend', 'implement', 
+    'inherit', 'override', 'overload', 'polymorphism', 'encapsulation', 'abstraction', 
+    'inheritance', 'composition', 'aggregation', 'association', 'dependency'
+]
+
+
+SENTENCE_ENDINGS = ('.', '!', '?', '...')
+
+# Fewest words a difficulty band of a pool may hold, so its sentences don't turn into a handful of repeats
+MIN_BAND_WORDS = 24
+
+
+class WordPool:
+    """An immutable word list compiled once: capitalized forms, optional frequency weights and cumulative weights
+
+    The NumPy copies used by bulk generation are built the first time they are needed.
+    Pools that are registered or loaded with a language are also split into
+    difficulty bands, each a pool of its own (see index_bands).
+    """
+
+    __slots__ = ('name', 'words', 'capitalized', 'weights', 'cum_weights', 'bands',
+                 '_np_words', '_np_capitalized', '_np_cum')
+
+    def __init__(self, name: str, words: Sequence[str], weights: Optional[Sequence[float]] = None):
+        if weights is not None and len(weights) != len(words):
+            raise ValueError(f'Word pool {name!r} has {len(words)} words but {len(weights)} weights')
+        self.name = name
+        self.words = tuple(words)
+        self.capitalized = tuple(word.capitalize() for word in self.words)
+        self.weights = tuple(weights) if weights is not None else None
+        self.cum_weights = tuple(accumulate(self.weights)) if self.weights is not None else None
+        self.bands: Dict[str, WordPool] = {}
+        self._np_words = self._np_capitalized = self._np_cum = None
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def index_bands(self) -> 'WordPool':
+        """Score every word once and keep a sub-pool per difficulty band, weights included"""
+        index = DifficultyIndex.of(self.words)
+        for band in BANDS:
+            ids = sorted(index.band_ids(band, MIN_BAND_WORDS))
+            weights = [self.weights[i] for i in ids] if self.weights is not None else None
+            self.bands[band] = WordPool(f'{self.name}#{band}', [self.words[i] for i in ids], weights)
+        return self
+
+    def band(self, band: Optional[str]) -> 'WordPool':
+        """The pool restricted to a difficulty band; the whole pool for no band or an unbanded pool"""
+        return self.bands.get(band, self) if band is not None else self
+
+    def numpy_arrays(self):
+        """Words, capitalized words and cumulative weights (or None) as NumPy arrays"""
+        if self._np_words is None:
+            self._np_capitalized = np.array(self.capitalized, dtype=object)
+            self._np_cum = np.array(self.cum_weights) if self.cum_weights is not None else None
+            self._np_words = np.array(self.words, dtype=object)  # Set last: it marks the arrays as built
+        return self._np_words, self._np_capitalized, self._np_cum
+
+    def sample(self, k: int, rng=None) -> List[str]:
+        """Draw k words (with replacement) honoring the pool's weights"""
+        rng = rng or random
+        return rng.choices(self.words, cum_weights=self.cum_weights, k=k)
+
+    def sample_indices(self, k: int, rng=None) -> List[int]:
+        rng = rng or random
+        return rng.choices(range(len(self.words)), cum_weights=self.cum_weights, k=k)
+
+
+_POOLS: Dict[str, WordPool] = {}
+
+
+def register_pool(name: str, words: Sequence[str], weights: Optional[Sequence[float]] = None) -> WordPool:
+    """Compile a word list into a pool and make it available by name"""
+    pool = _POOLS[name] = WordPool(name, words, weights).index_bands()
+    return pool
+
+
+def get_word_pool(name: str) -> WordPool:
+    """Look up a pool by category, falling back to common words like the endpoints always have"""
+    return _POOLS.get(name) or _POOLS['common']
+
+
+def zipf_weights(count: int) -> List[float]:
+    """Frequency weights for a list sorted most-common first"""
+    return [1.0 / rank for rank in range(1, count + 1)]
+
+
+# Sentence pools mix category words with common words; the *_only pools back /api/random-words
+register_pool('common', COMMON_WORDS)
+register_pool('common_weighted', COMMON_WORDS, zipf_weights(len(COMMON_WORDS)))
+register_pool('tech', TECH_WORDS + COMMON_WORDS)
+register_pool('programming', PROGRAMMING_WORDS + COMMON_WORDS)
+register_pool('tech_only', TECH_WORDS)
+register_pool('programming_only', PROGRAMMING_WORDS)
+
+
+def generate_sentences(n: int, min_words: int = 5, max_words: int = 20, pool: Optional[WordPool] = None,
+                       rng: Optional[random.Random] = None) -> List[str]:
+    """Generate n sentences, drawing every length, word and ending for the whole batch at once
+
+    Unseeded calls use NumPy when it is loaded. Seeded calls (an explicit rng)
+    always take the pure-Python path so their output doesn't depend on NumPy.
+    """
+    pool = pool or _POOLS['common']
+    if n <= 0:
+        return []
+    if rng is None and startup.loaded(np):
+        return _generate_sentences_numpy(n, min_words, max_words, pool)
+
+    rng = rng or random
+    lengths = rng.choices(range(min_words, max_words + 1), k=n)
+    indices = pool.sample_indices(sum(lengths), rng)
+    endings = rng.choices(SENTENCE_ENDINGS, k=n)
+
+    words, capitalized = pool.words, pool.capitalized
+    sentences = []
+    start = 0
+    for length, ending in zip(lengths, endings):
+        end = start + length
+        first = capitalized[indices[start]]
+        rest = ' '.join([words[i] for i in indices[start + 1:end]])
+        sentences.append((first + ' ' + rest if rest else first) + ending)
+        start = end
+    return sentences
+
+
+def _generate_sentences_numpy(n: int, min_words: int, max_words: int, pool: WordPool) -> List[str]:
+    np_words, np_capitalized, np_cum = pool.numpy_arrays()
+    gen = np.random.default_rng()
+    lengths = gen.integers(min_words, max_words + 1, size=n)
+    total = int(lengths.sum())
+    if np_cum is not None:
+        indices = np.searchsorted(np_cum, gen.random(total) * np_cum[-1], side='right')
+    else:
+        indices = gen.integers(0, len(pool.words), size=total)
+    endings = gen.integers(0, len(SENTENCE_ENDINGS), size=n).tolist()
+
+    words = np_words[indices]
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    words[starts] = np_capitalized[indices[starts]]
+    words = words.tolist()
+
+    sentences = []
+    for start, length, ending in zip(starts.tolist(), lengths.tolist(), endings):
+        sentences.append(' '.join(words[start:start + length]) + SENTENCE_ENDINGS[ending])
+    return sentences